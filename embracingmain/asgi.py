@@ -2,6 +2,8 @@
 ASGI config for embracingmain project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+Requests are routed through ``embracingmain.asgi_urls`` so the public pages are
+served by the async views in ``main/async_views.py``.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
@@ -9,8 +11,20 @@ https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 
 import os
 
-from django.core.asgi import get_asgi_application
+import django
+from django.core.handlers.asgi import ASGIHandler
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'embracingmain.settings')
 
-application = get_asgi_application()
+ASGI_URLCONF = 'embracingmain.asgi_urls'
+
+
+class AsyncViewsASGIHandler(ASGIHandler):
+    async def get_response_async(self, request):
+        request.urlconf = ASGI_URLCONF
+        return await super().get_response_async(request)
+
+
+django.setup(set_prefix=False)
+application = AsyncViewsASGIHandler()
+
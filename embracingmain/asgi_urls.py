@@ -0,0 +1,18 @@
+"""
+URL configuration used under ASGI: the async versions of the public views in
+main/async_views.py take precedence over their sync counterparts, everything
+else is routed as in embracingmain/urls.py.
+"""
+from django.urls import path
+
+from main import async_views
+
+from .urls import urlpatterns as sync_urlpatterns
+
+urlpatterns = [
+    path('', async_views.home, name='home'),
+    path('blog/', async_views.blog, name='blog'),
+    path('blog/<slug:slug>/', async_views.blog_single, name='post_detail'),
+    path('sitemap.xml', async_views.sitemap, name='sitemap'),
+    path('sitemap-<int:section>.xml', async_views.sitemap_section, name='sitemap_section'),
+] + sync_urlpatterns
@@ -58,8 +58,10 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'main.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
-    'whitenoise.middleware.WhiteNoiseMiddleware',
+    # WhiteNoise, async-capable so the ASGI app stays async (main/middleware.py)
+    'main.middleware.WhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -74,7 +76,8 @@ ROOT_URLCONF = 'embracingmain.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # DjangoTemplates plus render timing for main/metrics.py
+        'BACKEND': 'main.metrics.TimedDjangoTemplates',
         'DIRS': [],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -180,6 +183,71 @@ CLOUDINARY_STORAGE = {
 }
 
 
+# Uploaded images are downscaled and re-encoded before storage (main/images.py)
+IMAGE_UPLOAD_MAX_DIMENSION = 1920
+IMAGE_UPLOAD_JPEG_QUALITY = 82
+
+# Gallery thumbnails are requested at this size; full size only in the lightbox
+GALLERY_PAGE_SIZE = 12
+GALLERY_THUMBNAIL_SIZE = 600
+
+# Comments rendered with a post; the rest load a page at a time
+COMMENTS_PAGE_SIZE = 20
+# Related posts shown on a post page (precomputed by main/related.py)
+RELATED_POSTS_COUNT = 3
+# Comments accepted per client IP per window (main/throttle.py)
+COMMENT_THROTTLE_RATE = 5
+COMMENT_THROTTLE_WINDOW = 60
+# Proxies in front of the app that append to X-Forwarded-For (Render has one);
+# set 0 when clients connect directly
+TRUSTED_PROXY_COUNT = int(os.environ.get('TRUSTED_PROXY_COUNT', 1))
+# The proxy terminates TLS and says so in X-Forwarded-Proto, so the absolute
+# URLs pages print (share links, the sitemap) keep the https scheme
+if TRUSTED_PROXY_COUNT:
+    SECURE_PROXY_SSL_HEADER = ('HTTP_X_FORWARDED_PROTO', 'https')
+# How often manage.py run_scheduler publishes due drafts (main/scheduler.py),
+# and the public address whose pages it pre-warms in the page cache
+PUBLISH_CHECK_SECONDS = 60
+SITE_URL = 'https://embracingthegirlchild.org.ng'
+
+
+# Cache
+# File-based so every gunicorn worker shares the same page cache and
+# invalidation versions (see main/pagecache.py).
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / 'var' / 'cache',
+        'OPTIONS': {
+            'MAX_ENTRIES': 10000,
+        },
+    }
+}
+
+PAGE_CACHE_TIMEOUT = 60 * 10
+# The deployed code, part of every page cache key and ETag (main/pagecache.py,
+# main/conditional.py) so pages rendered by an older deploy are not reused.
+# Render sets RENDER_GIT_COMMIT; elsewhere set SITE_VERSION on each deploy.
+SITE_VERSION = os.environ.get('SITE_VERSION') or os.environ.get('RENDER_GIT_COMMIT', '')
+PAGINATOR_COUNT_TIMEOUT = 60 * 60
+# URLs per sitemap file; past this sitemap.xml becomes an index (main/sitemap.py)
+SITEMAP_MAX_URLS = 50000
+
+
+# Buffered Post.views counting (see main/viewcounter.py)
+VIEW_COUNTER_SPOOL_DIR = BASE_DIR / 'var' / 'views'
+VIEW_COUNTER_FLUSH_HITS = 200
+VIEW_COUNTER_FLUSH_SECONDS = 30
+
+
+# Per-route request metrics, served at /metrics (see main/metrics.py)
+METRICS_DIR = BASE_DIR / 'var' / 'metrics'
+METRICS_FLUSH_SECONDS = 10
+# /metrics answers staff and scrapers sending 'Authorization: Bearer <token>'
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -1,5 +1,7 @@
 from django.contrib import admin
-from .models import Post, Comment
+from .forms import GalleryImageForm
+from .models import Post, Comment, GalleryImage
+from . import search
 
 # Register your models here.
 
@@ -8,8 +10,23 @@ class PostAdmin(admin.ModelAdmin):
     list_filter = ('created_at', 'author')  # Sidebar filters
     search_fields = ('title', 'content')    # Search bar functionality
     prepopulated_fields = {'slug': ('title',)}  # Auto-fill slug from title
+    readonly_fields = ('views', 'comment_count')  # Kept by F() updates, never saved from here
     ordering = ('-created_at',)
 
+    def get_search_results(self, request, queryset, search_term):
+        # Use the full-text index instead of LIKE '%term%' scans
+        if not search_term:
+            return super().get_search_results(request, queryset, search_term)
+        return search.filter_posts(queryset, search_term), False
+
+
+class GalleryImageAdmin(admin.ModelAdmin):
+    form = GalleryImageForm
+    list_display = ('title', 'category', 'position', 'width', 'height', 'created_at')
+    list_filter = ('category',)
+    list_editable = ('position',)
+
 
 admin.site.register(Post , PostAdmin)
 admin.site.register(Comment)
+admin.site.register(GalleryImage, GalleryImageAdmin)
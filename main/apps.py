@@ -1,6 +1,16 @@
 from django.apps import AppConfig
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_migrate
 
 
 class MainConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'main'
+
+    def ready(self):
+        from . import signals  # noqa: F401
+        from .metrics import install_query_timer
+        from .search import install_index
+
+        post_migrate.connect(install_index, sender=self)
+        connection_created.connect(install_query_timer)
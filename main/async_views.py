@@ -0,0 +1,55 @@
+"""
+Async versions of the busiest public views, served when the site runs under
+ASGI (see embracingmain/asgi.py and embracingmain/asgi_urls.py).
+
+Queries use Django's async ORM. Template rendering (which builds the
+Cloudinary image URLs) stays synchronous and runs in a worker thread, so the
+event loop is never blocked on it.
+"""
+from asgiref.sync import sync_to_async
+from django.shortcuts import aget_object_or_404, render
+
+from .conditional import conditional_page
+from .models import Post
+from .pagecache import POSTS, RELATED, cache_public_page, post_tag
+from .related import related_posts
+from .sitemap import aresponse as sitemap_aresponse
+from .viewcounter import count_post_view
+from .views import blog_paginator, blog_validators, comment_paginator, detail_queryset, post_validators
+
+arender = sync_to_async(render)
+
+
+@cache_public_page(POSTS)
+async def home(request):
+    post_list = [post async for post in Post.published.for_listing()[:3]]
+    return await arender(request, 'index.html', {'posts': post_list})
+
+
+@conditional_page(blog_validators)
+@cache_public_page(POSTS)
+async def blog(request):
+    paginator = blog_paginator()
+    page_obj = await paginator.apage(after=request.GET.get('after'), before=request.GET.get('before'))
+    return await arender(request, 'blog.html', {'posts': page_obj.object_list, 'page_obj': page_obj, 'paginator': paginator})
+
+
+@count_post_view
+@conditional_page(post_validators)
+@cache_public_page(post_tag('{slug}'), RELATED)
+async def blog_single(request, slug):
+    post = await aget_object_or_404(detail_queryset(await request.auser()), slug=slug)
+    comments = await comment_paginator(post).apage(after=request.GET.get('after'), before=request.GET.get('before'))
+    return await arender(request, 'single-blog.html', {
+        'post': post,
+        'comments': comments,
+        'related_posts': [related async for related in related_posts(post)],
+    })
+
+
+async def sitemap(request):
+    return await sitemap_aresponse(request)
+
+
+async def sitemap_section(request, section):
+    return await sitemap_aresponse(request, section)
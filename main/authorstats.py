@@ -0,0 +1,131 @@
+"""
+Materialized per-author dashboard statistics (the AuthorStats model).
+
+Every write path adjusts the author's row in place with F() expressions, so
+concurrent writers never overwrite each other: the Post and Comment signals
+(main/signals.py), the view counter (main/viewcounter.py) and bulk actions
+(main/bulk.py). A missing row is built from the posts on first use. Writes
+that bypass those paths (bulk_create, raw SQL) leave the rows stale until
+``manage.py rebuild_author_stats`` recomputes them.
+"""
+from collections import Counter, defaultdict
+
+from django.db import transaction
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import Coalesce
+
+from .models import AuthorStats, Post
+
+
+def contribution(status, category, views=0, comments=0):
+    """What one post adds to its author's row."""
+    return {
+        'posts': 1,
+        AuthorStats.status_field(status): 1,
+        AuthorStats.category_field(category): 1,
+        'views': views,
+        'comments': comments,
+    }
+
+
+def difference(new, old):
+    return {field: new.get(field, 0) - old.get(field, 0) for field in new.keys() | old.keys()}
+
+
+def negate(deltas):
+    return {field: -delta for field, delta in deltas.items()}
+
+
+def adjust(author_id, deltas, build_missing=True):
+    """
+    Add ``{field: delta}`` to one author's row. Deletes pass
+    ``build_missing=False``: a missing row is then left for ``for_author``
+    to build, as the author may be being deleted too.
+    """
+    deltas = {field: delta for field, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    if not AuthorStats.objects.filter(pk=author_id).update(**{
+        field: F(field) + delta for field, delta in deltas.items()
+    }) and build_missing:
+        # No row yet: build it from the posts, which already include this change
+        rebuild([author_id])
+
+
+def adjust_many(deltas_by_author, build_missing=True):
+    for author_id, deltas in deltas_by_author.items():
+        adjust(author_id, deltas, build_missing)
+
+
+def add_views(hits_by_author):
+    """Add ``{author_id: hits}`` to the authors' views."""
+    adjust_many({author_id: {'views': hits} for author_id, hits in hits_by_author.items()})
+
+
+def _aggregates():
+    uncategorized = Q(category__isnull=True) | Q(category='')
+    return {
+        'posts': Count('pk'),
+        'views': Coalesce(Sum('views'), 0),
+        'comments': Coalesce(Sum('comment_count'), 0),
+        **{
+            AuthorStats.status_field(status): Count('pk', filter=Q(status=status))
+            for status, _ in Post.STATUS_CHOICES
+        },
+        **{
+            AuthorStats.category_field(category): Count('pk', filter=Q(category=category))
+            for category, _ in Post.CATEGORY_CHOICES
+        },
+        AuthorStats.category_field(None): Count('pk', filter=uncategorized),
+    }
+
+
+def rebuild(author_ids=None):
+    """
+    Recompute the rows of ``author_ids`` (default: every author with posts)
+    from the posts in one grouped query. Returns the number of rows stored.
+    """
+    posts = Post.objects.order_by()
+    stale = AuthorStats.objects.all()
+    if author_ids is not None:
+        posts = posts.filter(author_id__in=author_ids)
+        stale = stale.filter(pk__in=author_ids)
+    rows = [
+        AuthorStats(author_id=row.pop('author'), **row)
+        for row in posts.values('author').annotate(**_aggregates())
+    ]
+    if author_ids is not None:
+        # Named authors without posts get a row of zeros
+        rows += [AuthorStats(author_id=pk) for pk in set(author_ids) - {row.author_id for row in rows}]
+    with transaction.atomic():
+        stale.delete()
+        AuthorStats.objects.bulk_create(rows)
+    return len(rows)
+
+
+def for_author(author):
+    """``author``'s AuthorStats in one primary-key lookup (built on first use)."""
+    stats = AuthorStats.objects.filter(pk=author.pk).first()
+    if stats is None:
+        rebuild([author.pk])
+        stats = AuthorStats.objects.get(pk=author.pk)
+    return stats
+
+
+def bulk_deltas(rows, changes=None):
+    """
+    ``{author_id: deltas}`` for posts ``rows`` (with author_id, status,
+    category, views and comment_count) being deleted, or updated with
+    ``changes`` (a dict of status and/or category).
+    """
+    deltas = defaultdict(Counter)
+    for row in rows:
+        before = contribution(row.status, row.category, row.views, row.comment_count)
+        if changes is None:
+            deltas[row.author_id].update(negate(before))
+        else:
+            after = contribution(
+                changes.get('status', row.status), changes.get('category', row.category), row.views, row.comment_count,
+            )
+            deltas[row.author_id].update(difference(after, before))
+    return deltas
@@ -0,0 +1,208 @@
+"""
+Small helpers shared by the ``bench_*`` management commands.
+"""
+import asyncio
+import itertools
+import os
+import random
+import statistics
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.db import connection, connections
+from django.utils import timezone
+
+
+def percentile(samples, pct):
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def summarize(latencies, elapsed):
+    return {
+        'requests': len(latencies),
+        'rps': len(latencies) / elapsed if elapsed else 0.0,
+        'mean_ms': statistics.fmean(latencies) * 1000 if latencies else 0.0,
+        'p50_ms': percentile(latencies, 50) * 1000,
+        'p95_ms': percentile(latencies, 95) * 1000,
+        'p99_ms': percentile(latencies, 99) * 1000,
+    }
+
+
+def run_load(make_call, total, concurrency):
+    """
+    Run ``total`` calls spread over ``concurrency`` threads.
+
+    ``make_call`` is invoked once per thread and must return a zero-argument
+    callable that performs one request (so each thread can own its own
+    test Client). Returns the ``summarize`` dict.
+    """
+    latencies = []
+    lock = threading.Lock()
+    per_thread = max(1, total // concurrency)
+
+    def worker():
+        call = make_call()
+        local = []
+        try:
+            for _ in range(per_thread):
+                start = time.perf_counter()
+                call()
+                local.append(time.perf_counter() - start)
+        finally:
+            connections.close_all()
+        with lock:
+            latencies.extend(local)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for future in [pool.submit(worker) for _ in range(concurrency)]:
+            future.result()
+    return summarize(latencies, time.perf_counter() - start)
+
+
+def run_load_async(make_call, total, concurrency):
+    """
+    Like ``run_load``, but ``concurrency`` coroutines share one event loop and
+    ``make_call`` returns a zero-argument coroutine function.
+    """
+    latencies = []
+    per_task = max(1, total // concurrency)
+
+    async def worker():
+        call = make_call()
+        for _ in range(per_task):
+            start = time.perf_counter()
+            await call()
+            latencies.append(time.perf_counter() - start)
+
+    async def main():
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+
+    start = time.perf_counter()
+    asyncio.run(main())
+    return summarize(latencies, time.perf_counter() - start)
+
+
+def format_row(label, result):
+    return (
+        f"{label:<28} {result['requests']:>7} req  {result['rps']:>9.1f} req/s  "
+        f"p50 {result['p50_ms']:>7.2f}ms  p95 {result['p95_ms']:>7.2f}ms  p99 {result['p99_ms']:>7.2f}ms"
+    )
+
+
+@contextmanager
+def temporary_database(on_disk=False):
+    """
+    Run the block against a throwaway copy of the schema (in-memory for
+    SQLite) so benchmarks can seed large datasets without touching real data.
+
+    Concurrent writers fail at once on SQLite's shared in-memory database
+    ("database table is locked"), so load tests that write pass
+    ``on_disk=True`` to use a temporary file. Its transactions take the write
+    lock up front (IMMEDIATE) so concurrent writers wait for each other
+    instead of failing on a lock upgrade.
+    """
+    settings_dict = connection.settings_dict
+    old_name = settings_dict['NAME']
+    old_test = dict(settings_dict.get('TEST') or {})
+    old_options = dict(settings_dict.get('OPTIONS') or {})
+    tmpdir = None
+    if on_disk and connection.vendor == 'sqlite':
+        tmpdir = tempfile.TemporaryDirectory()
+        settings_dict['TEST'] = {**old_test, 'NAME': os.path.join(tmpdir.name, 'bench.sqlite3')}
+        settings_dict['OPTIONS'] = {**old_options, 'transaction_mode': 'IMMEDIATE', 'timeout': 30}
+    connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+    try:
+        yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        settings_dict['TEST'], settings_dict['OPTIONS'] = old_test, old_options
+        if tmpdir:
+            tmpdir.cleanup()
+
+
+VOCABULARY = (
+    'girl child education school rights legal law justice court abuse survivor '
+    'support community health hygiene menstrual awareness advocacy campaign '
+    'outreach volunteer mentor career empowerment family violence protection '
+    'policy nigeria abuja state women youth story success initiative program '
+    'training workshop counseling rehabilitation representation public '
+    'sensitization scholarship teacher parent safety equality future dream'
+).split()
+# Pad the vocabulary with pronounceable filler words and draw from it with a
+# Zipf distribution so term frequencies look like real prose.
+_SYLLABLES = ['ka', 'lo', 'mi', 'ne', 'ru', 'sa', 'ti', 'vo', 'de', 'ba', 'go', 'ye']
+VOCABULARY += [a + b + c for a in _SYLLABLES for b in _SYLLABLES for c in _SYLLABLES][:3000]
+# Cumulative, so choices() does not re-sum 3000 weights on every call
+_CUM_WEIGHTS = list(itertools.accumulate(1 / (rank + 1) for rank in range(len(VOCABULARY))))
+
+
+def lorem(rng, words):
+    return ' '.join(rng.choices(VOCABULARY, cum_weights=_CUM_WEIGHTS, k=words)).capitalize() + '.'
+
+
+def seed_posts(count, authors=1, batch_size=2000, seed=0):
+    """
+    Bulk insert ``count`` posts spread over the last few years. Every post
+    gets an image name (the list templates build its Cloudinary URL).
+    """
+    from .models import Post, make_excerpt
+
+    rng = random.Random(seed)
+    users = [
+        User.objects.create(username=f'bench-author-{i}') for i in range(authors)
+    ]
+    categories = [choice for choice, _ in Post.CATEGORY_CHOICES]
+    statuses = [choice for choice, _ in Post.STATUS_CHOICES]
+    now = timezone.now()
+
+    def build(i):
+        content = lorem(rng, rng.randint(40, 900))
+        return Post(
+            title=f'{lorem(rng, rng.randint(3, 9))} {i}',
+            slug=f'benchmark-post-{i}',
+            content=content,
+            excerpt=make_excerpt(content),
+            category=rng.choice(categories),
+            status=rng.choice(statuses),
+            author=users[i % authors],
+            image='post_images/benchmark.jpg',
+            created_at=now - timedelta(minutes=i * rng.randint(1, 5)),
+        )
+
+    for start in range(0, count, batch_size):
+        Post.objects.bulk_create([build(i) for i in range(start, min(start + batch_size, count))])
+    return users
+
+
+def seed_comments(per_post, batch_size=5000, seed=0):
+    """Bulk insert about ``per_post`` comments on every post and set comment_count."""
+    from .models import Comment, Post
+
+    rng = random.Random(seed)
+    counts = {}
+    batch = []
+    for pk in Post.objects.values_list('pk', flat=True).iterator():
+        counts[pk] = rng.randint(0, per_post * 2)
+        batch += [Comment(post_id=pk, name='Reader', body=lorem(rng, rng.randint(5, 60))) for _ in range(counts[pk])]
+        if len(batch) >= batch_size:
+            Comment.objects.bulk_create(batch)
+            batch = []
+    Comment.objects.bulk_create(batch)
+
+    by_count = {}
+    for pk, n in counts.items():
+        by_count.setdefault(n, []).append(pk)
+    for n, pks in by_count.items():
+        for start in range(0, len(pks), 500):
+            Post.objects.filter(pk__in=pks[start:start + 500]).update(comment_count=n)
+    return sum(counts.values())
@@ -0,0 +1,94 @@
+"""
+Bulk dashboard actions on a selection of one author's posts.
+
+Every action is a fixed number of set-based queries however many posts are
+selected: one UPDATE for publish, archive and recategorize, and for delete
+per BATCH_SIZE posts one DELETE of their comments and a queryset
+``delete()`` of the posts, which cascades to their related rows. The delete
+receivers in main/signals.py are muted, so what they would do once per post
+happens once here: the page cache tags are bumped together, AuthorStats gets
+one UPDATE per author and previous/next links are recomputed with
+``relink``. Past RELINK_LIMIT posts ``link_all`` and the RELATED tag (on
+every post page) take over, so the work stops growing with the selection.
+"""
+from django.db import transaction
+from django.utils import timezone
+
+from . import authorstats, pagecache, related, signals
+from .models import Comment, Post
+
+ACTIONS = ('publish', 'archive', 'recategorize', 'delete')
+BATCH_SIZE = 500
+# relink costs a few queries per post; past this many link_all is cheaper
+RELINK_LIMIT = 20
+
+
+def _batches(items):
+    for start in range(0, len(items), BATCH_SIZE):
+        yield items[start:start + BATCH_SIZE]
+
+
+def _delete(pks):
+    with signals.muted():
+        for batch in _batches(pks):
+            # Comment has delete receivers, so the collector would load every
+            # comment to send them; they are muted, so one DELETE does instead
+            Comment.objects.filter(post_id__in=batch)._raw_delete(Comment.objects.db)
+            # The collector takes the related rows with the posts and clears
+            # the neighbours' previous/next links (relink resets them)
+            Post.objects.filter(pk__in=batch).delete()
+
+
+def apply(posts, action, category=None):
+    """
+    Run ``action`` on the ``posts`` queryset and return the number of posts
+    changed. Posts already in the requested state are left alone.
+    """
+    if action == 'recategorize':
+        posts = posts.exclude(category=category) if category else posts.exclude(category__isnull=True)
+    elif action != 'delete':
+        posts = posts.exclude(status={'publish': 'published', 'archive': 'archived'}[action])
+    rows = list(posts.order_by().values_list(
+        'pk', 'slug', 'author_id', 'status', 'category', 'views', 'comment_count', 'previous_post_id', 'next_post_id',
+        named=True,
+    ))
+    if not rows:
+        return 0
+    pks = [row.pk for row in rows]
+    # Read before a delete removes the RelatedPost rows (and always, so the
+    # number of queries does not depend on the selection)
+    showing = related.pages_showing(posts.values('pk'))
+
+    with transaction.atomic():
+        if action == 'delete':
+            _delete(pks)
+            authorstats.adjust_many(authorstats.bulk_deltas(rows), build_missing=False)
+        else:
+            changes = {
+                'publish': {'status': 'published'},
+                'archive': {'status': 'archived'},
+                'recategorize': {'category': category},
+            }[action]
+            for batch in _batches(pks):
+                Post.objects.filter(pk__in=batch).update(**changes, updated_at=timezone.now())
+            authorstats.adjust_many(authorstats.bulk_deltas(rows, changes))
+
+    if len(rows) > RELINK_LIMIT:
+        # One tag covers every post page, rather than one write per post
+        stale = [pagecache.POSTS, pagecache.RELATED]
+    else:
+        stale = [pagecache.POSTS, *(pagecache.post_tag(row.slug) for row in rows), *showing]
+    # Publishing an unpublished post, or deleting or archiving a published
+    # one, changes who the published posts' neighbours are
+    moved = [row for row in rows if (row.status == 'published') != (action == 'publish')]
+    if action != 'recategorize' and moved:
+        if len(moved) > RELINK_LIMIT:
+            # Any post page may show a changed previous/next link
+            related.link_all()
+            stale.append(pagecache.RELATED)
+        else:
+            remaining = [] if action == 'delete' else [row.pk for row in moved]
+            neighbours = {pk for row in moved for pk in (row.previous_post_id, row.next_post_id)}
+            related.relink(*remaining, *(neighbours - set(pks)))
+    pagecache.invalidate(*stale)
+    return len(rows)
@@ -0,0 +1,75 @@
+"""
+Conditional GET (ETag / Last-Modified) for the public blog pages.
+
+``conditional_page(validators)`` runs ``validators(request, **kwargs)`` (one
+small query, see main/views.py) before the view and the page cache. It returns
+``(parts, last_modified)``, or None to let the view answer (e.g. with a 404).
+``parts`` is everything the page depends on; its hash is the ETag, so an
+unchanged page gets a 304 without being looked up or rendered.
+
+The ETag also covers SITE_VERSION, so after a deploy that changes templates
+or views every page is fetched again instead of revalidating the old markup.
+Nothing else is per visitor: the public pages hold no CSRF token (the comment
+form posts to a csrf_exempt view), so every visitor, and any shared cache in
+between, gets the same ETag for the same page. Logged-in users and non-GET
+requests are never answered with 304, as with the page cache.
+"""
+import hashlib
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+
+
+def _validators(request, parts, last_modified):
+    raw = '|'.join(map(str, [settings.SITE_VERSION, *parts]))
+    etag = '"%s"' % hashlib.md5(raw.encode()).hexdigest()
+    return etag, int(last_modified.timestamp()) if last_modified else None
+
+
+def _stamp(response, etag, last_modified):
+    if response.status_code == 200 and not response.cookies:
+        response.headers.setdefault('ETag', etag)
+        if last_modified:
+            response.headers.setdefault('Last-Modified', http_date(last_modified))
+    return response
+
+
+def conditional_page(validators):
+    def decorator(view):
+        if iscoroutinefunction(view):
+            compute = sync_to_async(validators)
+
+            @wraps(view)
+            async def async_wrapper(request, *args, **kwargs):
+                if request.method not in ('GET', 'HEAD') or (await request.auser()).is_authenticated:
+                    return await view(request, *args, **kwargs)
+                found = await compute(request, **kwargs)
+                if found is None:
+                    return await view(request, *args, **kwargs)
+                etag, last_modified = _validators(request, *found)
+                response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+                if response is None:
+                    response = await view(request, *args, **kwargs)
+                return _stamp(response, etag, last_modified)
+
+            return async_wrapper
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD') or request.user.is_authenticated:
+                return view(request, *args, **kwargs)
+            found = validators(request, **kwargs)
+            if found is None:
+                return view(request, *args, **kwargs)
+            etag, last_modified = _validators(request, *found)
+            response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+            if response is None:
+                response = view(request, *args, **kwargs)
+            return _stamp(response, etag, last_modified)
+
+        return wrapper
+
+    return decorator
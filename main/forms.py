@@ -1,19 +1,61 @@
 from django import forms
-from .models import Post, Comment
+from django.core.files.uploadedfile import UploadedFile
+from django.utils import timezone
+from .images import preprocess_image
+from .models import Post, Comment, GalleryImage
 
 class PostForm(forms.ModelForm):
     class Meta:
         model = Post
-        fields = ['title', 'content' , 'image', 'category', 'status']
+        fields = ['title', 'content' , 'image', 'category', 'status', 'publish_at']
         widgets = {
             'title': forms.TextInput(attrs={'class': 'form-control'}),
             'content': forms.Textarea(attrs={'class': 'form-control'}),
             'image': forms.ClearableFileInput(attrs={'class': 'form-control-file'}),
             'category': forms.Select(attrs={'class': 'form-control'}),
             'status': forms.Select(attrs={'class': 'form-control'}),
+            'publish_at': forms.DateTimeInput(
+                attrs={'class': 'form-control', 'type': 'datetime-local'}, format='%Y-%m-%dT%H:%M'
+            ),
         }
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.image_report = None
+
+    def clean_image(self):
+        image = self.cleaned_data.get('image')
+        # Only new uploads are processed; False (cleared) and the existing
+        # stored file pass straight through.
+        if isinstance(image, UploadedFile):
+            image, self.image_report = preprocess_image(image)
+        return image
+
+    def clean(self):
+        cleaned_data = super().clean()
+        # A post scheduled for later stays a draft until main/scheduler.py publishes it
+        publish_at = cleaned_data.get('publish_at')
+        if publish_at and publish_at > timezone.now():
+            # self.instance still holds the stored post here
+            if self.instance.status == 'published' and self.instance.pk:
+                self.add_error('publish_at', 'This post is already published; unpublish it before scheduling it.')
+            else:
+                cleaned_data['status'] = 'draft'
+        return cleaned_data
+
 class CommentForm(forms.ModelForm):
     class Meta:
         model = Comment
         fields = ['name', 'body']
+
+
+class GalleryImageForm(forms.ModelForm):
+    class Meta:
+        model = GalleryImage
+        fields = ['title', 'category', 'image', 'position', 'created_at']
+
+    def clean_image(self):
+        image = self.cleaned_data.get('image')
+        if isinstance(image, UploadedFile):
+            image, _ = preprocess_image(image)
+        return image
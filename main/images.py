@@ -0,0 +1,109 @@
+"""
+Upload-time image preprocessing.
+
+Phone photos arrive as multi-megabyte JPEGs with EXIF orientation flags and
+GPS/camera metadata. Before an upload reaches MediaCloudinaryStorage it is
+rotated upright, stripped of metadata (the ICC colour profile is kept),
+downscaled to IMAGE_UPLOAD_MAX_DIMENSION and re-encoded: JPEG at
+IMAGE_UPLOAD_JPEG_QUALITY, or optimised PNG when the image has transparency.
+Animated images, clean files that re-encoding would only make larger, and
+files Pillow cannot read (ImageField validation rejects those in the forms)
+are passed through untouched.
+"""
+import logging
+import time
+from io import BytesIO
+from pathlib import Path
+
+import cloudinary
+from django.conf import settings
+from django.core.files.uploadedfile import InMemoryUploadedFile
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+logger = logging.getLogger(__name__)
+
+
+def _has_alpha(image):
+    return image.mode in ('RGBA', 'LA', 'PA') or (image.mode == 'P' and 'transparency' in image.info)
+
+
+def preprocess_image(upload, max_dimension=None, quality=None):
+    """
+    Return ``(file, report)`` where ``file`` is a new in-memory upload ready
+    for storage and ``report`` describes the bytes saved.
+    """
+    max_dimension = max_dimension or settings.IMAGE_UPLOAD_MAX_DIMENSION
+    quality = quality or settings.IMAGE_UPLOAD_JPEG_QUALITY
+    started = time.perf_counter()
+
+    upload.seek(0)
+    try:
+        original = Image.open(upload)
+    except UnidentifiedImageError:
+        upload.seek(0)
+        return upload, None
+    with original:
+        if getattr(original, 'is_animated', False):
+            upload.seek(0)
+            return upload, None
+        icc_profile = original.info.get('icc_profile')
+        has_metadata = bool(original.getexif()) or 'xmp' in original.info
+        original_size = original.size
+        image = ImageOps.exif_transpose(original)
+        image.thumbnail((max_dimension, max_dimension), Image.Resampling.LANCZOS)
+
+        buffer = BytesIO()
+        if _has_alpha(image):
+            image.save(buffer, 'PNG', optimize=True, icc_profile=icc_profile)
+            extension, content_type = 'png', 'image/png'
+        else:
+            image.convert('RGB').save(
+                buffer, 'JPEG', quality=quality, optimize=True, progressive=True, icc_profile=icc_profile
+            )
+            extension, content_type = 'jpg', 'image/jpeg'
+
+    size = buffer.tell()
+    if size >= upload.size and not has_metadata and image.size == original_size:
+        # Already small, clean and within bounds: re-encoding would only grow it
+        upload.seek(0)
+        return upload, None
+    buffer.seek(0)
+    processed = InMemoryUploadedFile(
+        buffer, 'image', f'{Path(upload.name).stem}.{extension}', content_type, size, None
+    )
+    report = {
+        'name': processed.name,
+        'original_bytes': upload.size,
+        'processed_bytes': size,
+        'bytes_saved': upload.size - size,
+        'dimensions': image.size,
+        'elapsed_ms': round((time.perf_counter() - started) * 1000, 1),
+    }
+    logger.info(
+        'Preprocessed upload %s: %d -> %d bytes (%d saved) at %dx%d in %.1fms',
+        processed.name, report['original_bytes'], size, report['bytes_saved'],
+        *report['dimensions'], report['elapsed_ms'],
+    )
+    return processed, report
+
+
+def dominant_color(image_file):
+    """Average colour of an image as '#rrggbb', used as a loading placeholder."""
+    image_file.seek(0)
+    with Image.open(image_file) as image:
+        image.draft('RGB', (64, 64))  # JPEG decoders can skip most of the work
+        red, green, blue = image.convert('RGB').resize((1, 1), Image.Resampling.BOX).getpixel((0, 0))
+    image_file.seek(0)
+    return f'#{red:02x}{green:02x}{blue:02x}'
+
+
+def cloudinary_url(storage, name, **transformation):
+    """
+    URL for a stored Cloudinary image with an on-the-fly transformation, e.g.
+    ``cloudinary_url(storage, name, width=600, height=600, crop='fill')``.
+    Quality and format are negotiated per browser unless given.
+    """
+    transformation.setdefault('quality', 'auto')
+    transformation.setdefault('fetch_format', 'auto')
+    public_id = storage._prepend_prefix(name)
+    return cloudinary.CloudinaryImage(public_id).build_url(secure=True, **transformation)
@@ -0,0 +1,104 @@
+import asyncio
+import sys
+from io import BytesIO
+
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+
+from embracingmain.asgi import application as asgi_application
+from main.benchmark import format_row, run_load, run_load_async, seed_posts, temporary_database
+from main.models import Post
+
+HOST = 'testserver'
+
+
+def wsgi_call(application, path, errors):
+    environ = {
+        'REQUEST_METHOD': 'GET', 'PATH_INFO': path, 'QUERY_STRING': '', 'SCRIPT_NAME': '',
+        'SERVER_NAME': HOST, 'SERVER_PORT': '80', 'SERVER_PROTOCOL': 'HTTP/1.1', 'HTTP_HOST': HOST,
+        'wsgi.version': (1, 0), 'wsgi.url_scheme': 'http', 'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True, 'wsgi.multiprocess': False, 'wsgi.run_once': False,
+    }
+
+    def start_response(status, headers, exc_info=None):
+        if not status.startswith('200'):
+            errors.append(status)
+
+    def call():
+        response = application(dict(environ, **{'wsgi.input': BytesIO()}), start_response)
+        for _chunk in response:
+            pass
+        response.close()
+
+    return call
+
+
+def asgi_call(application, path, errors):
+    scope = {
+        'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET',
+        'scheme': 'http', 'path': path, 'raw_path': path.encode(), 'query_string': b'', 'root_path': '',
+        'headers': [(b'host', HOST.encode())], 'server': (HOST, 80), 'client': ('127.0.0.1', 0),
+    }
+
+    async def call():
+        requested = False
+
+        async def receive():
+            nonlocal requested
+            if not requested:
+                requested = True
+                return {'type': 'http.request', 'body': b'', 'more_body': False}
+            await asyncio.Future()  # the client never disconnects early
+
+        async def send(message):
+            if message['type'] == 'http.response.start' and message['status'] != 200:
+                errors.append(message['status'])
+
+        await application(scope, receive, send)
+
+    return call
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare requests/s and latency of the sync (WSGI) and async (ASGI) public '
+        'views at increasing concurrency, in process, on a seeded throwaway database.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--posts', type=int, default=1000)
+        parser.add_argument('--requests', type=int, default=1000)
+        parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 32, 128])
+        parser.add_argument(
+            '--page-cache', action='store_true',
+            help='Keep the page cache on (by default every request renders the view).',
+        )
+
+    def handle(self, *args, **options):
+        overrides = {'ALLOWED_HOSTS': [HOST]}
+        if not options['page_cache']:
+            overrides['CACHES'] = {'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}}
+
+        with temporary_database(on_disk=True), override_settings(**overrides):
+            self.stdout.write(f"Seeding {options['posts']} posts...")
+            seed_posts(options['posts'])
+            Post.objects.update(status='published')
+            slug = Post.objects.values_list('slug', flat=True).first()
+            routes = ['/', '/blog/', f'/blog/{slug}/', '/sitemap.xml']
+            wsgi_application = WSGIHandler()
+
+            for path in routes:
+                self.stdout.write(self.style.MIGRATE_HEADING(path))
+                for concurrency in options['concurrency']:
+                    errors = []
+                    wsgi = run_load(
+                        lambda: wsgi_call(wsgi_application, path, errors), options['requests'], concurrency
+                    )
+                    asgi = run_load_async(
+                        lambda: asgi_call(asgi_application, path, errors), options['requests'], concurrency
+                    )
+                    self.stdout.write(format_row(f'  WSGI concurrency={concurrency}', wsgi))
+                    self.stdout.write(format_row(f'  ASGI concurrency={concurrency}', asgi))
+                    if errors:
+                        self.stderr.write(self.style.ERROR(f'  {len(errors)} non-200 response(s): {errors[0]}'))
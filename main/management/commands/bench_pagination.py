@@ -0,0 +1,51 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.core.paginator import Paginator
+
+from main.benchmark import seed_posts, temporary_database
+from main.models import Post
+from main.pagination import KeysetPaginator, encode_cursor
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare OFFSET pagination with keyset pagination at increasing page '
+        'depth on a seeded throwaway database.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--posts', type=int, default=100_000)
+        parser.add_argument('--per-page', type=int, default=6)
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--pages', type=int, nargs='+', default=[1, 10, 100, 1000, 10000])
+
+    def handle(self, *args, **options):
+        per_page = options['per_page']
+        with temporary_database():
+            self.stdout.write(f"Seeding {options['posts']} posts...")
+            seed_posts(options['posts'])
+            qs = Post.objects.all()
+
+            self.stdout.write(f"{'page':>8} {'offset (ms)':>12} {'keyset (ms)':>12}")
+            for number in options['pages']:
+                if (number - 1) * per_page >= options['posts']:
+                    continue
+                cursor = None
+                if number > 1:
+                    # Cursor a reader would hold after reaching page ``number - 1``
+                    cursor = encode_cursor(qs.order_by('-created_at', '-id')[(number - 1) * per_page - 1])
+
+                offset = self._time(
+                    lambda: list(Paginator(qs, per_page).page(number).object_list), options['repeat']
+                )
+                keyset = self._time(
+                    lambda: list(KeysetPaginator(qs, per_page).page(after=cursor)), options['repeat']
+                )
+                self.stdout.write(f'{number:>8} {offset:>12.2f} {keyset:>12.2f}')
+
+    def _time(self, fn, repeat):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            fn()
+        return (time.perf_counter() - start) / repeat * 1000
@@ -0,0 +1,49 @@
+from unittest import mock
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import F
+from django.test import Client
+from django.urls import reverse
+
+from main.benchmark import format_row, run_load
+from main.models import Post
+from main.viewcounter import view_buffer
+
+
+class Command(BaseCommand):
+    help = (
+        'Measure blog_single read throughput at increasing concurrency with the '
+        'buffered view counter, against a per-hit UPDATE baseline.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--slug', help='Post to hit (defaults to the newest post).')
+        parser.add_argument('--requests', type=int, default=400)
+        parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 4, 16])
+
+    def handle(self, *args, **options):
+        post = Post.objects.filter(slug=options['slug']) if options['slug'] else Post.objects.all()
+        post = post.first()
+        if post is None:
+            raise CommandError('No post to benchmark; create one or pass --slug.')
+        url = reverse('post_detail', args=[post.slug])
+
+        def make_call():
+            client = Client()
+            return lambda: client.get(url)
+
+        def per_hit_update(slug):
+            Post.objects.filter(slug=slug).update(views=F('views') + 1)
+
+        modes = [('buffered', None), ('per-hit UPDATE', per_hit_update)]
+        for label, replacement in modes:
+            self.stdout.write(self.style.MIGRATE_HEADING(label))
+            for concurrency in options['concurrency']:
+                if replacement is None:
+                    result = run_load(make_call, options['requests'], concurrency)
+                else:
+                    with mock.patch.object(view_buffer, 'record', replacement):
+                        result = run_load(make_call, options['requests'], concurrency)
+                self.stdout.write(format_row(f'  concurrency={concurrency}', result))
+
+        view_buffer.flush()
@@ -0,0 +1,189 @@
+import json
+import platform
+import subprocess
+from collections import namedtuple
+from datetime import datetime, timezone as dt_timezone
+from pathlib import Path
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import reverse
+
+from main import urls as main_urls
+from main.benchmark import VOCABULARY, format_row, run_load, seed_comments, seed_posts, temporary_database
+from main.models import GalleryImage, Post
+from main.pagination import encode_cursor
+
+Route = namedtuple('Route', 'label url_name path method data headers', defaults=('get', None, None))
+AJAX = {'HTTP_X_REQUESTED_WITH': 'XMLHttpRequest'}
+# Set as METRICS_TOKEN while benchmarking, so the run can scrape /metrics
+METRICS_TOKEN = 'bench-routes'
+
+
+def build_routes(author):
+    """One or more requests for every URL name in main/urls.py."""
+    post = Post.objects.filter(author=author, status='published').first() or Post.objects.filter(author=author).first()
+    # A cursor halfway through the blog listing
+    cursor = encode_cursor(Post.objects.all()[Post.objects.count() // 2])
+    first_comment = post.comments.first()
+    comments_cursor = f"?after={encode_cursor(first_comment, 'created_on')}" if first_comment else ''
+    new_post = {'title': 'Load test post', 'content': 'Body of a load test post.', 'status': 'draft', 'category': 'education'}
+    # A dashboard page of posts; after the first request only the table is re-rendered
+    bulk = {'action': 'recategorize', 'category': 'awareness',
+            'ids': list(Post.objects.filter(author=author).values_list('pk', flat=True)[:10])}
+    return [
+        Route('home', 'home', reverse('home')),
+        Route('about', 'about', reverse('about')),
+        Route('gallery', 'gallery', reverse('gallery')),
+        Route('gallery images API', 'gallery_images', reverse('gallery_images') + '?category=events'),
+        Route('videos', 'videos', reverse('videos')),
+        Route('contact', 'contact', reverse('contact')),
+        Route('blog', 'blog', reverse('blog')),
+        Route('blog (middle page)', 'blog', reverse('blog') + f'?after={cursor}'),
+        Route('blog search', 'post_search', reverse('post_search') + f'?q={VOCABULARY[0]}+{VOCABULARY[1]}'),
+        Route('blog_single', 'post_detail', reverse('post_detail', args=[post.slug])),
+        Route('post_comments (page 2)', 'post_comments', reverse('post_comments', args=[post.slug]) + comments_cursor),
+        Route('post_comment AJAX submit', 'post_comment', reverse('post_comment', args=[post.slug]), 'post',
+              {'name': 'Load tester', 'body': 'A load test comment.'}, AJAX),
+        Route('login', 'login', reverse('login')),
+        Route('logout (+ force_login)', 'logout', reverse('logout')),
+        Route('dashboard', 'dashboard', reverse('dashboard')),
+        Route('dashboard AJAX fragment', 'dashboard', reverse('dashboard') + '?status=published', headers=AJAX),
+        Route('post_new form', 'post_new', reverse('post_new')),
+        Route('post_new AJAX submit', 'post_new', reverse('post_new'), 'post', new_post, AJAX),
+        Route('post_bulk recategorize', 'post_bulk', reverse('post_bulk'), 'post', bulk, AJAX),
+        Route('post_edit form', 'post_edit', reverse('post_edit', args=[post.slug])),
+        Route('post_delete confirm', 'post_delete', reverse('post_delete', args=[post.slug])),
+        Route('sitemap', 'sitemap', reverse('sitemap')),
+        Route('sitemap section', 'sitemap_section', reverse('sitemap_section', args=[1])),
+        Route('metrics', 'metrics', reverse('metrics'), headers={'HTTP_AUTHORIZATION': f'Bearer {METRICS_TOKEN}'}),
+    ]
+
+
+def check_coverage(routes):
+    names = {pattern.name for pattern in main_urls.urlpatterns if pattern.name}
+    missing = names - {route.url_name for route in routes}
+    if missing:
+        raise CommandError(f'No benchmark request for: {", ".join(sorted(missing))}')
+
+
+def run_routes(routes, author, requests, concurrency):
+    """Drive each route and return one result dict per route."""
+    results = []
+    for route in routes:
+        errors = []
+
+        def make_call(route=route, errors=errors):
+            client = Client()
+            client.force_login(author)
+
+            def call():
+                if route.url_name == 'logout':
+                    client.force_login(author)
+                response = getattr(client, route.method)(route.path, route.data, **(route.headers or {}))
+                if response.status_code >= 400:
+                    errors.append(response.status_code)
+
+            return call
+
+        result = run_load(make_call, requests, concurrency)
+        results.append({'label': route.label, 'route': route.url_name, 'path': route.path,
+                        'method': route.method.upper(), 'errors': len(errors), **result})
+    return results
+
+
+def git_commit():
+    try:
+        out = subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR, capture_output=True, text=True, check=True
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return out.stdout.strip()
+
+
+class Command(BaseCommand):
+    help = (
+        'Load-test every route in main/urls.py against seeded throwaway databases of '
+        'increasing size and write the results to a JSON file.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[100, 10_000, 100_000], help='Posts per dataset.')
+        parser.add_argument('--posts-per-author', type=int, default=500)
+        parser.add_argument('--comments-per-post', type=int, default=3)
+        parser.add_argument('--requests', type=int, default=200, help='Requests per route.')
+        parser.add_argument('--concurrency', type=int, default=8)
+        parser.add_argument(
+            '--page-cache', action='store_true',
+            help='Keep the page cache on (by default every request renders the view).',
+        )
+        parser.add_argument('--output', help='JSON results file (default var/bench/routes-<time>-<commit>.json).')
+        parser.add_argument('--compare', help='Earlier results file to print the change against.')
+
+    def handle(self, *args, **options):
+        # Every request comes from one address, so lift the comment throttle
+        overrides = {'ALLOWED_HOSTS': ['testserver'], 'COMMENT_THROTTLE_RATE': 10 ** 9, 'METRICS_TOKEN': METRICS_TOKEN}
+        if not options['page_cache']:
+            overrides['CACHES'] = {'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}}
+
+        commit = git_commit()
+        report = {
+            'commit': commit,
+            'created_at': datetime.now(dt_timezone.utc).isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'database': settings.DATABASES['default']['ENGINE'],
+            'requests': options['requests'],
+            'concurrency': options['concurrency'],
+            'page_cache': options['page_cache'],
+            'results': [],
+        }
+
+        for size in options['sizes']:
+            with temporary_database(on_disk=True), override_settings(**overrides):
+                authors = max(1, size // options['posts_per_author'])
+                self.stdout.write(self.style.MIGRATE_HEADING(f'{size} posts, {authors} author(s)'))
+                users = seed_posts(size, authors=authors)
+                comments = seed_comments(options['comments_per_post'])
+                GalleryImage.objects.bulk_create(
+                    GalleryImage(title=f'Image {i}', category='events', image=f'gallery/benchmark-{i}.jpg',
+                                 width=800, height=600, placeholder_color='#888888', position=i)
+                    for i in range(40)
+                )
+                self.stdout.write(f'  seeded {comments} comments')
+
+                routes = build_routes(users[0])
+                check_coverage(routes)
+                for result in run_routes(routes, users[0], options['requests'], options['concurrency']):
+                    report['results'].append({'posts': size, **result})
+                    line = format_row(f"  {result['label']}", result)
+                    if result['errors']:
+                        line += self.style.ERROR(f"  {result['errors']} error(s)")
+                    self.stdout.write(line)
+
+        output = Path(options['output'] or settings.BASE_DIR / 'var' / 'bench' / (
+            f"routes-{datetime.now():%Y%m%d-%H%M%S}-{commit or 'nogit'}.json"
+        ))
+        output.parent.mkdir(parents=True, exist_ok=True)
+        output.write_text(json.dumps(report, indent=2))
+        self.stdout.write(self.style.SUCCESS(f'Wrote {output}'))
+
+        if options['compare']:
+            self.compare(json.loads(Path(options['compare']).read_text()), report)
+
+    def compare(self, before, after):
+        previous = {(row['posts'], row['label']): row for row in before['results']}
+        self.stdout.write(self.style.MIGRATE_HEADING(f"Change since {before.get('commit') or before['created_at']}"))
+        for row in after['results']:
+            old = previous.get((row['posts'], row['label']))
+            if not old or not old['rps'] or not old['p95_ms']:
+                continue
+            rps = (row['rps'] / old['rps'] - 1) * 100
+            p95 = (row['p95_ms'] / old['p95_ms'] - 1) * 100
+            line = f"  {row['posts']:>7} posts  {row['label']:<28} req/s {rps:+7.1f}%  p95 {p95:+7.1f}%"
+            # Flag anything more than 20% slower
+            self.stdout.write(self.style.ERROR(line) if rps < -20 or p95 > 20 else line)
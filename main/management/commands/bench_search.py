@@ -0,0 +1,48 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from main import search
+from main.benchmark import VOCABULARY, percentile, seed_posts, temporary_database
+from main.models import Post
+
+
+class Command(BaseCommand):
+    help = 'Measure full-text search latency against LIKE scans on a seeded throwaway database.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--posts', type=int, default=100_000)
+        parser.add_argument('--queries', type=int, default=50)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        with temporary_database():
+            self.stdout.write(f"Seeding {options['posts']} posts...")
+            seed_posts(options['posts'], seed=options['seed'])
+            queries = [' '.join(rng.sample(VOCABULARY, rng.randint(1, 3))) for _ in range(options['queries'])]
+            published = Post.objects.filter(status='published')
+
+            def like(query):
+                qs = published
+                for word in query.split():
+                    qs = qs.filter(Q(title__icontains=word) | Q(content__icontains=word))
+                return list(qs[:30])
+
+            runs = [
+                ('fts ranked + snippets', lambda q: search.search_posts(q, published)),
+                ('fts dashboard filter', lambda q: list(search.filter_posts(published, q)[:10])),
+                ('LIKE scan', like),
+            ]
+            for label, fn in runs:
+                latencies = []
+                for query in queries:
+                    start = time.perf_counter()
+                    fn(query)
+                    latencies.append(time.perf_counter() - start)
+                self.stdout.write(
+                    f'{label:<24} p50 {percentile(latencies, 50) * 1000:8.2f}ms  '
+                    f'p95 {percentile(latencies, 95) * 1000:8.2f}ms'
+                )
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from main.viewcounter import drain_spool, spool_dir
+
+
+class Command(BaseCommand):
+    help = 'Apply buffered Post.views hits from the worker spool files to the database.'
+
+    def handle(self, *args, **options):
+        written = drain_spool()
+        self.stdout.write(self.style.SUCCESS(f'Flushed {written} view(s) from {spool_dir()}'))
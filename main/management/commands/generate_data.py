@@ -0,0 +1,177 @@
+import math
+import multiprocessing
+import random
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+
+import django
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections, transaction
+from django.utils import timezone
+from django.utils.text import slugify
+
+from main.authorstats import rebuild as rebuild_author_stats
+from main.benchmark import lorem
+from main.models import Comment, Post, make_excerpt
+
+STATUS_WEIGHTS = {'published': 70, 'draft': 22, 'archived': 8}
+# None stands for posts saved without a category
+CATEGORY_WEIGHTS = {
+    'education': 25, 'awareness': 20, 'advocacy': 15, 'success': 12,
+    'legal': 10, 'activism': 8, None: 10,
+}
+
+
+def lognormal_words(rng, median, sigma, low, high):
+    return max(low, min(high, int(rng.lognormvariate(math.log(median), sigma))))
+
+
+@contextmanager
+def raw_timestamps():
+    """Let bulk_create keep the generated updated_at/created_on values."""
+    fields = [Post._meta.get_field('updated_at'), Comment._meta.get_field('created_on')]
+    saved = [(field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, (auto_now, auto_now_add) in zip(fields, saved):
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+def generate_chunk(job):
+    """
+    Insert posts ``start`` to ``end - 1`` and their comments in one
+    transaction. The random stream depends only on the seed and the chunk, so
+    the output is the same however many processes run.
+    """
+    chunk, start, end, options = job
+    rng = random.Random(f"{options['seed']}:{chunk}")
+    author_ids = options['author_ids']
+    now, span = options['now'], timedelta(days=365 * options['years'])
+    statuses, status_weights = zip(*STATUS_WEIGHTS.items())
+    categories, category_weights = zip(*CATEGORY_WEIGHTS.items())
+
+    if connection.vendor == 'sqlite' and connection.settings_dict['OPTIONS'].get('transaction_mode') != 'IMMEDIATE':
+        # With several writer processes a deferred transaction can deadlock on
+        # its lock upgrade and fail at once; IMMEDIATE ones queue for the lock.
+        connection.close()
+        connection.settings_dict['OPTIONS'] = {
+            **connection.settings_dict['OPTIONS'], 'transaction_mode': 'IMMEDIATE', 'timeout': 120,
+        }
+
+    posts, comment_counts = [], []
+    for i in range(start, end):
+        title = lorem(rng, rng.randint(3, 10)).rstrip('.')
+        content = '\n\n'.join(
+            lorem(rng, lognormal_words(rng, 60, 0.5, 10, 300))
+            for _ in range(max(1, lognormal_words(rng, 400, 0.6, 30, 6000) // 60))
+        )
+        # Squaring a uniform draw puts more posts in recent months
+        created_at = now - span * rng.random() ** 2
+        status = rng.choices(statuses, status_weights)[0]
+        comments = min(500, int(rng.expovariate(1 / options['comments_per_post']))) if status == 'published' else 0
+        comment_counts.append(comments)
+        posts.append(Post(
+            title=title,
+            slug=f"{slugify(title)[:60].rstrip('-')}-{options['run']}-{i}",
+            content=content,
+            excerpt=make_excerpt(content),
+            category=rng.choices(categories, category_weights)[0],
+            status=status,
+            views=int(rng.lognormvariate(4, 1.5)) if status == 'published' else 0,
+            comment_count=comments,
+            author_id=rng.choice(author_ids),
+            created_at=created_at,
+            updated_at=created_at + timedelta(hours=rng.random() * 48),
+        ))
+
+    with raw_timestamps(), transaction.atomic():
+        Post.objects.bulk_create(posts, batch_size=options['batch_size'])
+        batch = []
+        total_comments = 0
+        for post, count in zip(posts, comment_counts):
+            for _ in range(count):
+                batch.append(Comment(
+                    post_id=post.pk,
+                    name=lorem(rng, rng.randint(1, 2)).rstrip('.').title(),
+                    body=lorem(rng, lognormal_words(rng, 25, 0.8, 2, 400)),
+                    created_on=min(now, post.created_at + timedelta(hours=rng.expovariate(1 / 72))),
+                ))
+            if len(batch) >= options['batch_size']:
+                Comment.objects.bulk_create(batch)
+                total_comments += len(batch)
+                batch = []
+        Comment.objects.bulk_create(batch)
+        total_comments += len(batch)
+    return end - start, total_comments
+
+
+class Command(BaseCommand):
+    help = 'Bulk-generate realistic synthetic posts and comments for scale testing.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--posts', type=int, default=100_000)
+        parser.add_argument('--comments-per-post', type=float, default=4.0, help='Mean comments per published post.')
+        parser.add_argument('--authors', type=int, default=50)
+        parser.add_argument('--years', type=float, default=5, help='Spread created_at over this many years.')
+        parser.add_argument('--batch-size', type=int, default=2000)
+        parser.add_argument('--chunk-size', type=int, default=10_000, help='Posts per transaction (and per job).')
+        parser.add_argument('--processes', type=int, default=1)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        run = f"g{options['seed']}"
+        if Post.objects.filter(slug__contains=f'-{run}-').exists():
+            raise CommandError(f"Data for seed {options['seed']} already exists; pass a different --seed.")
+
+        authors = [
+            User(username=f'{run}-author-{i}', first_name=f'Author {i}', password='!')
+            for i in range(options['authors'])
+        ]
+        User.objects.bulk_create(authors, ignore_conflicts=True)
+        author_ids = list(User.objects.filter(username__startswith=f'{run}-author-').values_list('pk', flat=True))
+
+        shared = {
+            'seed': options['seed'], 'run': run, 'author_ids': author_ids, 'now': timezone.now(),
+            'years': options['years'], 'comments_per_post': options['comments_per_post'],
+            'batch_size': options['batch_size'],
+        }
+        size = options['chunk_size']
+        jobs = [
+            (chunk, start, min(start + size, options['posts']), shared)
+            for chunk, start in enumerate(range(0, options['posts'], size))
+        ]
+
+        started = time.perf_counter()
+        done_posts = done_comments = 0
+
+        def report(result):
+            nonlocal done_posts, done_comments
+            done_posts += result[0]
+            done_comments += result[1]
+            elapsed = time.perf_counter() - started
+            self.stdout.write(
+                f'{done_posts}/{options["posts"]} posts, {done_comments} comments  '
+                f'({(done_posts + done_comments) / elapsed:,.0f} rows/s)'
+            )
+
+        if options['processes'] > 1:
+            # Each process opens its own connection; spawned ones (Windows) also set Django up
+            connections.close_all()
+            with multiprocessing.Pool(options['processes'], initializer=django.setup) as pool:
+                for result in pool.imap_unordered(generate_chunk, jobs):
+                    report(result)
+        else:
+            for job in jobs:
+                report(generate_chunk(job))
+
+        # bulk_create sends no signals, so the dashboard totals are recomputed
+        rebuild_author_stats(author_ids)
+        self.stdout.write(self.style.SUCCESS(
+            f'Generated {done_posts} posts and {done_comments} comments by {len(author_ids)} authors '
+            f'in {time.perf_counter() - started:.1f}s'
+        ))
@@ -0,0 +1,51 @@
+from django.contrib.staticfiles import finders
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management.base import BaseCommand, CommandError
+
+from main.images import preprocess_image
+from main.models import GalleryImage
+
+# The images that used to be hardcoded in gallery.html
+STATIC_GALLERY = [
+    ('images/image22.jpg', 'Launch Event', 'events'),
+    ('images/image33.jpg', 'Launch Event', 'events'),
+    ('images/image11.jpg', 'Launch Event', 'events'),
+    ('images/items.jpg', 'Launch Event', 'events'),
+    ('images/outreach.jpg', 'Launch Event', 'events'),
+    ('images/essay.jpg', 'Launch Event', 'events'),
+    ('images/buns.jpg', 'Launch Event', 'events'),
+    ('images/fakelife.jpg', 'Launch Event', 'events'),
+    ('images/market.jpg', 'Launch Event', 'events'),
+    ('images/blog/pad.jpg', 'School Visit - Nasarawa', 'school-visits'),
+    ('images/blog/image6.jpg', 'Sanitary Towels Drive', 'campaigns'),
+    ('images/blog/image5.jpg', 'Community Awareness', 'awareness'),
+    ('images/blog/image7.jpg', 'Volunteer Training', 'events'),
+    ('images/blog/recent2.jpg', 'Career Guidance Session', 'school-visits'),
+    ('images/blog/recent3.jpg', 'Legal Aid Outreach', 'campaigns'),
+    ('images/blog/recent4.jpg', 'Public Sensitization', 'awareness'),
+    ('images/blog/recent5.jpg', 'Fundraising Gala', 'events'),
+]
+
+
+class Command(BaseCommand):
+    help = 'Create GalleryImage rows (uploading to media storage) for the original static gallery images.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help='Import even if gallery images already exist.')
+
+    def handle(self, *args, **options):
+        if GalleryImage.objects.exists() and not options['force']:
+            raise CommandError('Gallery already has images; pass --force to import anyway.')
+
+        for position, (path, title, category) in enumerate(STATIC_GALLERY):
+            source = finders.find(path)
+            if source is None:
+                self.stderr.write(self.style.WARNING(f'Skipping {path}: not found in static files'))
+                continue
+            with open(source, 'rb') as f:
+                upload = SimpleUploadedFile(path.rsplit('/', 1)[-1], f.read(), 'image/jpeg')
+            upload, report = preprocess_image(upload)
+            image = GalleryImage(title=title, category=category, position=position, image=upload)
+            image.save()
+            saved = report['bytes_saved'] if report else 0
+            self.stdout.write(f'{path} -> {image.image.name} ({saved} bytes saved)')
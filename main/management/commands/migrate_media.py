@@ -0,0 +1,67 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils.module_loading import import_string
+
+from main.mediamigration import Manifest, default_sources, migrate_post_images
+from main.models import Post
+
+
+class Command(BaseCommand):
+    help = 'Upload local post images to media storage concurrently, resuming from a checkpoint manifest.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=8)
+        parser.add_argument(
+            '--manifest', default=str(settings.BASE_DIR / 'var' / 'media_migration.jsonl'),
+            help='Checkpoint file; uploads recorded here are not repeated.',
+        )
+        parser.add_argument(
+            '--source', action='append', dest='sources',
+            help='Directory to look for local images in (repeatable). Defaults to '
+                 + ', '.join(str(path) for path in default_sources()),
+        )
+        parser.add_argument(
+            '--storage',
+            help='Dotted path of a storage class to upload to instead of the Post.image storage, '
+                 'e.g. django.core.files.storage.FileSystemStorage for a dry run.',
+        )
+        parser.add_argument('--limit', type=int, help='Upload at most this many images.')
+        parser.add_argument('--progress-every', type=int, default=10)
+
+    def handle(self, *args, **options):
+        if options['storage']:
+            storage = import_string(options['storage'])()
+        else:
+            storage = Post._meta.get_field('image').storage
+        manifest = Manifest(options['manifest'])
+        every = options['progress_every']
+
+        def progress(stats, elapsed):
+            if stats['uploaded'] % every == 0:
+                self.stdout.write(
+                    f"{stats['uploaded']}/{stats['total']}  {stats['uploaded'] / elapsed:.1f} files/s  "
+                    f"{stats['bytes'] / elapsed / 1e6:.2f} MB/s"
+                )
+
+        self.stdout.write(f'Uploading to {type(storage).__name__} with {options["workers"]} worker(s)...')
+        stats = migrate_post_images(
+            storage, manifest, sources=options['sources'], workers=options['workers'],
+            limit=options['limit'], progress=progress,
+        )
+
+        for image, exc in stats['errors']:
+            self.stderr.write(self.style.ERROR(f'{image}: {exc}'))
+        elapsed = stats['elapsed'] or 1e-9
+        summary = (
+            f"Uploaded {stats['uploaded']} image(s), {stats['bytes'] / 1e6:.2f} MB in {stats['elapsed']:.1f}s "
+            f"({stats['uploaded'] / elapsed:.1f} files/s, {stats['bytes'] / elapsed / 1e6:.2f} MB/s). "
+            f"Already stored (deduplicated): {stats['deduplicated']}, "
+            f"already done: {stats['skipped']}, resumed: {stats['resumed']}, "
+            f"no local file: {stats['missing']}, failed: {stats['failed']}."
+        )
+        if stats['interrupted']:
+            self.stdout.write(self.style.WARNING(f'Interrupted. {summary} Run again to resume.'))
+        elif stats['failed']:
+            self.stdout.write(self.style.WARNING(summary))
+        else:
+            self.stdout.write(self.style.SUCCESS(summary))
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from main import pagecache
+
+CACHED_VIEWS = ['home', 'about', 'gallery', 'gallery_images', 'videos', 'contact', 'blog', 'blog_single']
+
+
+class Command(BaseCommand):
+    help = 'Show page cache hit/miss/bypass counters for the public views.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reset', action='store_true', help='Reset the counters after printing.')
+
+    def handle(self, *args, **options):
+        for name, counts in pagecache.stats(CACHED_VIEWS).items():
+            served = counts['hit'] + counts['miss']
+            ratio = counts['hit'] / served * 100 if served else 0.0
+            self.stdout.write(
+                f"{name:<12} hit {counts['hit']:>8}  miss {counts['miss']:>8}  "
+                f"bypass {counts['bypass']:>8}  hit ratio {ratio:5.1f}%"
+            )
+        if options['reset']:
+            pagecache.reset_stats(CACHED_VIEWS)
+            self.stdout.write(self.style.SUCCESS('Counters reset.'))
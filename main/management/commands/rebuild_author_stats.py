@@ -0,0 +1,17 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from main.authorstats import rebuild
+
+
+class Command(BaseCommand):
+    help = 'Recompute every author\'s AuthorStats row (dashboard totals) from their posts.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--author', type=int, action='append', dest='authors', help='Only this author id (repeatable).')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        rows = rebuild(options['authors'])
+        self.stdout.write(self.style.SUCCESS(f'Stored {rows} author stats rows in {time.perf_counter() - started:.1f}s'))
@@ -0,0 +1,26 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from main import pagecache
+from main.related import link_all, rebuild_related
+
+
+class Command(BaseCommand):
+    help = 'Recompute every published post\'s related posts (TF-IDF + category) and previous/next links.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--count', type=int, help='Related posts per post (default RELATED_POSTS_COUNT).')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        rows = rebuild_related(options['count'])
+        self.stdout.write(f'Stored {rows} related-post links in {time.perf_counter() - started:.1f}s')
+
+        started = time.perf_counter()
+        changed = link_all()
+        self.stdout.write(f'Updated previous/next on {changed} posts in {time.perf_counter() - started:.1f}s')
+
+        # Every detail page may show different related posts now
+        pagecache.invalidate(pagecache.RELATED)
+        self.stdout.write(self.style.SUCCESS('Done.'))
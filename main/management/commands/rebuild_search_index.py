@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from main.search import install_index, rebuild_index
+
+
+class Command(BaseCommand):
+    help = 'Recreate the post full-text index and its sync triggers, then reindex every post.'
+
+    def handle(self, *args, **options):
+        install_index()
+        rebuild_index()
+        self.stdout.write(self.style.SUCCESS('Search index rebuilt.'))
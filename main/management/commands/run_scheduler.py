@@ -0,0 +1,22 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from main.scheduler import build_scheduler, publish_due
+
+
+class Command(BaseCommand):
+    help = 'Publish scheduled drafts every PUBLISH_CHECK_SECONDS and pre-warm their pages (run one per site).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Publish whatever is due now and exit.')
+
+    def handle(self, *args, **options):
+        if options['once']:
+            slugs = publish_due()
+            self.stdout.write(self.style.SUCCESS(f'Published {len(slugs)} post(s)'))
+            return
+        self.stdout.write(f'Checking for scheduled posts every {settings.PUBLISH_CHECK_SECONDS}s; Ctrl+C to stop.')
+        try:
+            build_scheduler().start()
+        except (KeyboardInterrupt, SystemExit):
+            pass
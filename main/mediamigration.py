@@ -0,0 +1,231 @@
+"""
+Upload locally stored post images to the configured media storage.
+
+Local copies of uploads ended up in several directories over the life of the
+site, often under the name Django gave them plus or minus a random
+``_AbC1234`` suffix. The source directories are indexed once, uploads run on a
+bounded thread pool and every finished upload is appended to a JSON-lines
+manifest, so an interrupted run picks up where it stopped. Only the main thread
+touches the database.
+
+With a deduplicating storage (main/storage.py) the main thread hashes each
+file and claims an already stored copy before anything is queued; only the
+misses are uploaded, through ``storage.upload`` which does no database work,
+and recorded in the MediaAsset index once they finish. Files with the same
+bytes found in one run are uploaded once and share the result.
+"""
+import json
+import os
+import re
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from pathlib import Path
+
+from django.conf import settings
+from django.core.files import File
+
+from . import pagecache
+from .models import Post
+from .storage import DeduplicatingStorageMixin, content_digest
+
+SUFFIX_RE = re.compile(r'_[a-zA-Z0-9]{7}$')
+
+
+def default_sources():
+    return [
+        settings.BASE_DIR / 'media',
+        settings.BASE_DIR / 'post_images',
+        settings.BASE_DIR / 'blog_images',
+        settings.BASE_DIR / 'static' / 'media',
+    ]
+
+
+def _keys(filename):
+    stem, ext = os.path.splitext(filename)
+    return filename, SUFFIX_RE.sub('', stem) + ext
+
+
+def index_sources(directories):
+    """
+    Walk the source directories once and map both the exact file name and the
+    name without Django's random suffix to a local path. Earlier directories
+    and exact names win.
+    """
+    exact, stripped = {}, {}
+    for directory in directories:
+        for root, _dirs, files in os.walk(directory):
+            for filename in sorted(files):
+                name, base = _keys(filename)
+                path = os.path.join(root, filename)
+                exact.setdefault(name, path)
+                stripped.setdefault(base, path)
+    return exact, stripped
+
+
+def find_source(index, image_name):
+    exact, stripped = index
+    name, base = _keys(os.path.basename(image_name))
+    return exact.get(name) or stripped.get(base)
+
+
+class Manifest:
+    """Append-only record of finished uploads: one JSON object per line."""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.entries = {}
+        if self.path.exists():
+            with open(self.path) as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue  # a line cut short by the interruption
+                    self.entries[entry['pk']] = entry
+
+    def __contains__(self, pk):
+        return pk in self.entries
+
+    def get(self, pk):
+        return self.entries.get(pk)
+
+    def record(self, pk, source, name):
+        entry = {'pk': pk, 'source': source, 'name': name}
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.path, 'a') as f:
+            f.write(json.dumps(entry) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+        self.entries[pk] = entry
+
+
+def _upload(save, path, upload_to):
+    with open(path, 'rb') as f:
+        name = save(upload_to + os.path.basename(path), File(f))
+    return name, os.path.getsize(path)
+
+
+def _file_digest(path):
+    with open(path, 'rb') as f:
+        return content_digest(File(f))
+
+
+def migrate_post_images(storage, manifest, sources=None, workers=8, limit=None, progress=None):
+    """
+    Upload the local file behind every Post.image to ``storage`` and point the
+    post at the stored name. Returns a dict of counts, bytes and elapsed time.
+    ``progress`` is called with the running stats after each upload.
+    """
+    started = time.perf_counter()
+    index = index_sources(sources or default_sources())
+    upload_to = Post._meta.get_field('image').upload_to
+    stats = {
+        'uploaded': 0, 'deduplicated': 0, 'resumed': 0, 'skipped': 0, 'missing': 0, 'failed': 0, 'bytes': 0,
+        'errors': [],
+    }
+    touched = []
+    dedup = isinstance(storage, DeduplicatingStorageMixin)
+    save = storage.upload if dedup else storage.save
+    # digest -> posts waiting for the upload of the same bytes in this run
+    waiting = {}
+
+    pending = []
+    posts = Post.objects.exclude(image='').exclude(image__isnull=True).order_by('pk')
+    for pk, slug, image in posts.values_list('pk', 'slug', 'image'):
+        entry = manifest.get(pk)
+        if entry and image == entry['name']:
+            stats['skipped'] += 1
+        elif entry and image == entry['source']:
+            # Uploaded last time but interrupted before the row was updated
+            Post.objects.filter(pk=pk).update(image=entry['name'])
+            touched.append(slug)
+            stats['resumed'] += 1
+        else:
+            path = find_source(index, image)
+            if path is None:
+                stats['missing'] += 1
+            else:
+                pending.append((pk, slug, image, path))
+    if limit is not None:
+        pending = pending[:limit]
+    stats['total'] = len(pending)
+
+    def point(pk, slug, image, name):
+        manifest.record(pk, image, name)
+        Post.objects.filter(pk=pk).update(image=name)
+        touched.append(slug)
+
+    def reuse(pk, slug, image, name):
+        point(pk, slug, image, name)
+        stats['deduplicated'] += 1
+
+    def finish(future, pk, slug, image, digest):
+        sharing = waiting.pop(digest, [])
+        try:
+            name, size = future.result()
+        except Exception as exc:
+            for failed in [image, *(item[2] for item in sharing)]:
+                stats['failed'] += 1
+                stats['errors'].append((failed, exc))
+            return
+        if digest:
+            storage.record(digest, name, size)
+        point(pk, slug, image, name)
+        stats['uploaded'] += 1
+        stats['bytes'] += size
+        for item in sharing:
+            reuse(*item[:3], storage.claim(digest) or name)
+        if progress:
+            progress(stats, time.perf_counter() - started)
+
+    def submit(pool, pk, slug, image, path):
+        """
+        Queue an upload and return ``(future, in_flight entry)``, or None when
+        the bytes are already stored (the post is pointed at them now) or
+        already on their way up (it is pointed at them when they land).
+        """
+        digest = None
+        if dedup:
+            digest = _file_digest(path)
+            if digest in waiting:
+                waiting[digest].append((pk, slug, image))
+                return None
+            name = storage.claim(digest)
+            if name is not None:
+                reuse(pk, slug, image, name)
+                return None
+            waiting[digest] = []
+        return pool.submit(_upload, save, path, upload_to), (pk, slug, image, digest)
+
+    queue = iter(pending)
+    stats['interrupted'] = False
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        in_flight = {}
+        try:
+            while True:
+                # Keep a bounded number of uploads queued rather than submitting everything
+                while len(in_flight) < workers * 2:
+                    item = next(queue, None)
+                    if item is None:
+                        break
+                    queued = submit(pool, *item)
+                    if queued:
+                        in_flight[queued[0]] = queued[1]
+                if not in_flight:
+                    break
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    finish(future, *in_flight.pop(future))
+        except KeyboardInterrupt:
+            # Let running uploads finish and record them so the next run skips them
+            stats['interrupted'] = True
+            for future in in_flight:
+                future.cancel()
+            for future in wait(in_flight).done:
+                if not future.cancelled():
+                    finish(future, *in_flight[future])
+
+    if touched:
+        pagecache.invalidate(pagecache.POSTS, *(pagecache.post_tag(slug) for slug in touched))
+    stats['elapsed'] = time.perf_counter() - started
+    return stats
@@ -0,0 +1,324 @@
+"""
+Per-route request metrics in Prometheus text format.
+
+MetricsMiddleware times every request and files it under the resolved URL
+name: request count (by method and status), a latency histogram, database
+query count and time, template render time and response bytes. Queries are
+timed by an execute wrapper installed on every new connection and templates by
+the ``TimedDjangoTemplates`` backend; both add to the current request's record
+through a context variable, so they also see work done in sync_to_async
+threads under ASGI.
+
+Each worker process keeps its totals in memory and every METRICS_FLUSH_SECONDS
+writes a snapshot to its own file in METRICS_DIR (atomic replace, so a reader
+never sees half a file). ``/metrics`` sums the snapshots of all workers. When
+a worker flushes it adopts the snapshots of exited workers (their PID is no
+longer running) into its own totals and deletes their files, so counters do
+not go backwards when a worker is recycled and the directory holds about one
+file per live worker. METRICS_DIR must therefore be local to one machine.
+Liveness is not checked on Windows, where those files are kept.
+"""
+import atexit
+import json
+import os
+import threading
+import time
+import uuid
+from collections import defaultdict
+from contextvars import ContextVar
+from pathlib import Path
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.template.backends.django import DjangoTemplates, Template
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SNAPSHOT_SUFFIX = '.metrics.json'
+UNMATCHED = '<unmatched>'
+ROUTE_FIELDS = ('count', 'seconds', 'queries', 'query_seconds', 'template_seconds', 'bytes')
+
+_current = ContextVar('request_metrics', default=None)
+
+
+def metrics_dir():
+    return Path(getattr(settings, 'METRICS_DIR', settings.BASE_DIR / 'var' / 'metrics'))
+
+
+def _new_route():
+    route = dict.fromkeys(ROUTE_FIELDS, 0)
+    route['buckets'] = [0] * len(BUCKETS)
+    return route
+
+
+def _merge(requests, routes, snapshot):
+    """Add a snapshot's totals to ``requests`` and ``routes``."""
+    for route, method, status, count in snapshot['requests']:
+        requests[(route, method, status)] += count
+    for route, totals in snapshot['routes'].items():
+        merged = routes[route]
+        for field in ROUTE_FIELDS:
+            merged[field] += totals[field]
+        merged['buckets'] = [a + b for a, b in zip(merged['buckets'], totals['buckets'])]
+
+
+def _pid_running(pid):
+    if os.name == 'nt':
+        return True  # os.kill(pid, 0) would terminate the process there
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _read_snapshot(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+class Registry:
+    """One worker's cumulative totals."""
+
+    def __init__(self, flush_seconds=None):
+        self.flush_seconds = flush_seconds or getattr(settings, 'METRICS_FLUSH_SECONDS', 10)
+        self._requests = defaultdict(int)  # (route, method, status) -> count
+        self._routes = defaultdict(_new_route)
+        self._last_flush = time.monotonic()
+        self._lock = threading.Lock()
+        self._pid = None
+
+    def _snapshot_path(self, directory):
+        # A fresh name per process, so a recycled PID never overwrites (and
+        # shrinks) the totals of the worker that used it before
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._name = f'{self._pid}-{uuid.uuid4().hex}{SNAPSHOT_SUFFIX}'
+        return directory / self._name
+
+    def observe(self, route, method, status, seconds, record):
+        with self._lock:
+            self._requests[(route, method, str(status))] += 1
+            totals = self._routes[route]
+            totals['count'] += 1
+            totals['seconds'] += seconds
+            for field in ('queries', 'query_seconds', 'template_seconds', 'bytes'):
+                totals[field] += record[field]
+            for i, bound in enumerate(BUCKETS):
+                if seconds <= bound:
+                    totals['buckets'][i] += 1
+                    break
+            due = time.monotonic() - self._last_flush >= self.flush_seconds
+        if due:
+            self.flush()
+
+    def add_bytes(self, route, size):
+        with self._lock:
+            self._routes[route]['bytes'] += size
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'requests': [[*key, count] for key, count in self._requests.items()],
+                'routes': {route: dict(totals, buckets=list(totals['buckets'])) for route, totals in self._routes.items()},
+            }
+
+    def adopt_exited(self, directory):
+        """
+        Add the snapshots of workers that are no longer running to this
+        worker's totals. Returns the claimed files, to delete once this
+        worker's snapshot (which now includes them) is written.
+        """
+        own = self._snapshot_path(directory).name
+        claimed = []
+        for path in directory.glob(f'*{SNAPSHOT_SUFFIX}'):
+            pid = path.name.partition('-')[0]
+            if path.name == own or not pid.isdigit() or _pid_running(int(pid)):
+                continue
+            target = path.with_name(f'{path.name}.{uuid.uuid4().hex}.adopted')
+            try:
+                os.replace(path, target)
+            except FileNotFoundError:
+                continue  # adopted by another worker
+            claimed.append(target)
+            snapshot = _read_snapshot(target)
+            if snapshot is not None:
+                with self._lock:
+                    _merge(self._requests, self._routes, snapshot)
+        return claimed
+
+    def flush(self, directory=None):
+        """Write this worker's totals to its snapshot file."""
+        with self._lock:
+            self._last_flush = time.monotonic()
+        directory = Path(directory or metrics_dir())
+        if not directory.is_dir():
+            if not self._requests:
+                return
+            directory.mkdir(parents=True, exist_ok=True)
+        adopted = self.adopt_exited(directory)
+        snapshot = self.snapshot()
+        if snapshot['requests']:
+            path = self._snapshot_path(directory)
+            tmp = path.with_name(f'{path.name}.{threading.get_ident()}.tmp')
+            with open(tmp, 'w') as f:
+                json.dump(snapshot, f)
+            os.replace(tmp, path)
+        for path in adopted:
+            path.unlink(missing_ok=True)
+
+
+registry = Registry()
+
+
+def collect(directory=None):
+    """Sum the snapshots of every worker."""
+    requests = defaultdict(int)
+    routes = defaultdict(_new_route)
+    directory = Path(directory or metrics_dir())
+    for path in directory.glob(f'*{SNAPSHOT_SUFFIX}') if directory.is_dir() else ():
+        snapshot = _read_snapshot(path)
+        if snapshot is not None:
+            _merge(requests, routes, snapshot)
+    return requests, routes
+
+
+def _label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def render_prometheus(requests, routes):
+    lines = [
+        '# HELP http_requests_total Requests by URL name, method and status.',
+        '# TYPE http_requests_total counter',
+    ]
+    for (route, method, status), count in sorted(requests.items()):
+        lines.append(f'http_requests_total{{route="{_label(route)}",method="{method}",status="{status}"}} {count}')
+
+    lines += [
+        '# HELP http_request_duration_seconds Request latency by URL name.',
+        '# TYPE http_request_duration_seconds histogram',
+    ]
+    for route, totals in sorted(routes.items()):
+        name = _label(route)
+        cumulative = 0
+        for bound, count in zip(BUCKETS, totals['buckets']):
+            cumulative += count
+            lines.append(f'http_request_duration_seconds_bucket{{route="{name}",le="{bound}"}} {cumulative}')
+        lines.append(f'http_request_duration_seconds_bucket{{route="{name}",le="+Inf"}} {totals["count"]}')
+        lines.append(f'http_request_duration_seconds_sum{{route="{name}"}} {totals["seconds"]}')
+        lines.append(f'http_request_duration_seconds_count{{route="{name}"}} {totals["count"]}')
+
+    per_route = [
+        ('db_queries_total', 'queries', 'Database queries run while handling requests.'),
+        ('db_query_duration_seconds_total', 'query_seconds', 'Time spent in database queries.'),
+        ('template_render_seconds_total', 'template_seconds', 'Time spent rendering templates.'),
+        ('http_response_bytes_total', 'bytes', 'Response body bytes sent.'),
+    ]
+    for metric, field, help_text in per_route:
+        lines += [f'# HELP {metric} {help_text}', f'# TYPE {metric} counter']
+        for route, totals in sorted(routes.items()):
+            lines.append(f'{metric}{{route="{_label(route)}"}} {totals[field]}')
+    return '\n'.join(lines) + '\n'
+
+
+def record_query(execute, sql, params, many, context):
+    """Execute wrapper added to every connection (see MainConfig.ready)."""
+    record = _current.get()
+    if record is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        record['queries'] += 1
+        record['query_seconds'] += time.perf_counter() - start
+
+
+def install_query_timer(sender, connection, **kwargs):
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+class TimedTemplate(Template):
+    def render(self, context=None, request=None):
+        record = _current.get()
+        if record is None:
+            return super().render(context, request)
+        start = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            record['template_seconds'] += time.perf_counter() - start
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """The Django template backend, with render time added to the request's metrics."""
+
+    def from_string(self, template_code):
+        return TimedTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        template = super().get_template(template_name)
+        return TimedTemplate(template.template, self)
+
+
+def _route(request):
+    match = getattr(request, 'resolver_match', None)
+    return match.view_name if match and match.view_name else UNMATCHED
+
+
+def _counted_stream(chunks, route):
+    size = 0
+    try:
+        for chunk in chunks:
+            size += len(chunk)
+            yield chunk
+    finally:
+        registry.add_bytes(route, size)
+
+
+class MetricsMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def _start(self):
+        record = {'queries': 0, 'query_seconds': 0.0, 'template_seconds': 0.0, 'bytes': 0}
+        return record, _current.set(record), time.perf_counter()
+
+    def _finish(self, request, response, record, token, start):
+        _current.reset(token)
+        route = _route(request)
+        if response.streaming:
+            if not response.is_async:
+                response.streaming_content = _counted_stream(response.streaming_content, route)
+        else:
+            record['bytes'] = len(response.content)
+        registry.observe(route, request.method, response.status_code, time.perf_counter() - start, record)
+        return response
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        record, token, start = self._start()
+        response = self.get_response(request)
+        return self._finish(request, response, record, token, start)
+
+    async def __acall__(self, request):
+        record, token, start = self._start()
+        response = await self.get_response(request)
+        return self._finish(request, response, record, token, start)
+
+
+@atexit.register
+def _flush_on_exit():
+    registry.flush()
@@ -0,0 +1,37 @@
+"""
+WhiteNoise static file serving that also runs natively under ASGI.
+
+WhiteNoise's middleware is sync-only, so under ASGI Django would run every
+middleware and view below it in a worker thread and wrap the async views in
+async_to_sync: the async ORM path in main/async_views.py would never run on
+the event loop. This subclass is async-capable. Static files (a dictionary
+lookup, then a file response) are served from a worker thread; every other
+request goes straight on down the async middleware chain.
+"""
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from whitenoise.middleware import WhiteNoiseMiddleware as BaseWhiteNoiseMiddleware
+
+
+class WhiteNoiseMiddleware(BaseWhiteNoiseMiddleware):
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response=None, **kwargs):
+        super().__init__(get_response, **kwargs)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return super().__call__(request)
+
+    async def __acall__(self, request):
+        if self.autorefresh:
+            # Looks the path up on disk
+            static_file = await sync_to_async(self.find_file)(request.path_info)
+        else:
+            static_file = self.files.get(request.path_info)
+        if static_file is not None:
+            return await sync_to_async(self.serve)(static_file, request)
+        return await self.get_response(request)
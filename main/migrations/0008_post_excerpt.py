@@ -0,0 +1,37 @@
+# Generated by Django 5.2.6 on 2026-10-18 08:51
+
+from django.db import migrations, models
+from django.utils.text import Truncator
+
+
+BATCH_SIZE = 500
+
+
+def backfill_excerpt(apps, schema_editor):
+    Post = apps.get_model('main', 'Post')
+    batch = []
+    # Only one batch of posts is held in memory at a time
+    for post in Post.objects.only('pk', 'content').order_by('pk').iterator(chunk_size=BATCH_SIZE):
+        # Same rule as main.models.make_excerpt at the time of this migration
+        post.excerpt = Truncator(post.content or '').words(30)
+        batch.append(post)
+        if len(batch) == BATCH_SIZE:
+            Post.objects.bulk_update(batch, ['excerpt'])
+            batch = []
+    Post.objects.bulk_update(batch, ['excerpt'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0007_post_keyset_ordering'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='excerpt',
+            field=models.TextField(blank=True, editable=False),
+        ),
+        migrations.RunPython(backfill_excerpt, migrations.RunPython.noop),
+    ]
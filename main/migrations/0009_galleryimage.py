@@ -0,0 +1,32 @@
+# Generated by Django 5.2.6 on 2026-10-18 08:54
+
+import cloudinary_storage.storage
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0008_post_excerpt'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GalleryImage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('title', models.CharField(max_length=120)),
+                ('category', models.CharField(choices=[('events', 'Events'), ('campaigns', 'Campaigns'), ('school-visits', 'School Visits'), ('awareness', 'Awareness')], default='events', max_length=20)),
+                ('image', models.ImageField(height_field='height', storage=cloudinary_storage.storage.MediaCloudinaryStorage(), upload_to='gallery/', width_field='width')),
+                ('width', models.PositiveIntegerField(default=0, editable=False)),
+                ('height', models.PositiveIntegerField(default=0, editable=False)),
+                ('placeholder_color', models.CharField(blank=True, editable=False, max_length=7)),
+                ('position', models.PositiveIntegerField(default=0, help_text='Lower numbers are shown first.')),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'ordering': ['position', 'id'],
+            },
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.6 on 2026-10-18 08:59
+
+import main.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0009_galleryimage'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MediaAsset',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('digest', models.CharField(max_length=64, unique=True)),
+                ('name', models.CharField(db_index=True, max_length=255)),
+                ('size', models.PositiveIntegerField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='galleryimage',
+            name='image',
+            field=models.ImageField(height_field='height', storage=main.storage.DeduplicatingMediaCloudinaryStorage(), upload_to='gallery/', width_field='width'),
+        ),
+        migrations.AlterField(
+            model_name='post',
+            name='image',
+            field=models.ImageField(blank=True, null=True, storage=main.storage.DeduplicatingMediaCloudinaryStorage(), upload_to='post_images/'),
+        ),
+    ]
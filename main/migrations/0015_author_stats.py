@@ -0,0 +1,38 @@
+# Generated by Django 5.2.6 on 2026-10-18 09:37
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('main', '0013_sitemap_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AuthorStats',
+            fields=[
+                ('author', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='post_stats', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('posts', models.IntegerField(default=0)),
+                ('views', models.BigIntegerField(default=0)),
+                ('comments', models.BigIntegerField(default=0)),
+                ('draft_posts', models.IntegerField(default=0)),
+                ('published_posts', models.IntegerField(default=0)),
+                ('archived_posts', models.IntegerField(default=0)),
+                ('education_posts', models.IntegerField(default=0)),
+                ('legal_posts', models.IntegerField(default=0)),
+                ('success_posts', models.IntegerField(default=0)),
+                ('awareness_posts', models.IntegerField(default=0)),
+                ('activism_posts', models.IntegerField(default=0)),
+                ('advocacy_posts', models.IntegerField(default=0)),
+                ('uncategorized_posts', models.IntegerField(default=0)),
+            ],
+            options={
+                'verbose_name_plural': 'author stats',
+            },
+        ),
+    ]
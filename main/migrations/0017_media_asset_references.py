@@ -0,0 +1,33 @@
+# Generated by Django 5.2.6 on 2026-10-18 09:51
+
+from collections import Counter
+
+from django.db import migrations, models
+
+
+def count_references(apps, schema_editor):
+    MediaAsset = apps.get_model('main', 'MediaAsset')
+    references = Counter()
+    for model in (apps.get_model('main', 'Post'), apps.get_model('main', 'GalleryImage')):
+        owners = model.objects.exclude(image='').exclude(image__isnull=True).order_by().values('image')
+        references.update(dict(owners.annotate(count=models.Count('pk')).values_list('image', 'count')))
+    assets = list(MediaAsset.objects.only('pk', 'name'))
+    for asset in assets:
+        asset.references = max(references[asset.name], 1)
+    MediaAsset.objects.bulk_update(assets, ['references'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0016_published_manager'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='mediaasset',
+            name='references',
+            field=models.PositiveIntegerField(default=1),
+        ),
+        migrations.RunPython(count_references, migrations.RunPython.noop),
+    ]
@@ -1,18 +1,104 @@
-from django.db import models
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist
+from django.db import IntegrityError, connection, models, transaction
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import Coalesce
 from django.contrib.auth.models import User
-from django.utils.text import slugify
+from django.utils.text import Truncator, slugify
 from django.utils import timezone
-from cloudinary_storage.storage import MediaCloudinaryStorage
+
+from .images import cloudinary_url, dominant_color
+from .storage import DeduplicatingMediaCloudinaryStorage
+
+EXCERPT_WORDS = 30
+SLUG_SAVE_ATTEMPTS = 5
+SLUG_SCAN_CHUNK = 200
+
+
+def make_excerpt(content):
+    """The longest teaser any list template shows; they trim it further."""
+    return Truncator(content or '').words(EXCERPT_WORDS)
+
+
+def _slug_family(base):
+    """Match ``base`` and every ``base-...`` slug with a single index range."""
+    if connection.vendor == 'sqlite':
+        # BINARY collation: '.' sorts right after '-', so this range is exactly
+        # base and base-*, and it is served by the unique index on slug.
+        return Q(slug__gte=base, slug__lt=base + '.')
+    return Q(slug=base) | Q(slug__startswith=f'{base}-')
+
+
+def next_free_slug(base, taken):
+    """First of ``base``, ``base-1``, ``base-2``, ... that is not in ``taken``."""
+    if base not in taken:
+        return base
+    count = 1
+    while f'{base}-{count}' in taken:
+        count += 1
+    return f'{base}-{count}'
+
+
+class PostQuerySet(models.QuerySet):
+    def taken_slugs(self, bases):
+        """Existing slugs in the ``-N`` families of ``bases``, one query per chunk."""
+        bases = list(bases)
+        taken = set()
+        for start in range(0, len(bases), SLUG_SCAN_CHUNK):
+            family = Q()
+            for base in bases[start:start + SLUG_SCAN_CHUNK]:
+                family |= _slug_family(base)
+            taken.update(self.filter(family).order_by().values_list('slug', flat=True))
+        return taken
+
+    def assign_slugs(self, posts):
+        """
+        Fill in blank slugs for unsaved ``posts`` before a bulk_create, avoiding
+        both existing slugs and duplicates within the batch::
+
+            Post.objects.bulk_create(Post.objects.assign_slugs(posts))
+        """
+        pending = [(post, post.base_slug()) for post in posts if not post.slug]
+        taken = self.taken_slugs({base for _, base in pending})
+        for post, base in pending:
+            post.slug = next_free_slug(base, taken)
+            taken.add(post.slug)
+        return posts
+
+    def for_listing(self):
+        """Read model for list pages: never loads the full ``content`` body."""
+        return self.select_related('author').defer('content')
+
+    def stats(self):
+        """Post, view and comment totals for this queryset in one aggregate query."""
+        return self.aggregate(
+            total_posts=Count('pk'),
+            total_views=Coalesce(Sum('views'), 0),
+            total_comments=Coalesce(Sum('comment_count'), 0),
+        )
+
+    def author_stats(self, author):
+        return self.filter(author=author).stats()
+
+
+class PublishedManager(models.Manager):
+    """``Post.published``: the posts readers may see (backed by post_published_idx)."""
+
+    def get_queryset(self):
+        return super().get_queryset().filter(status='published')
+
 
 class Post(models.Model):
     title = models.CharField(max_length=200)
     slug = models.SlugField(unique=True, blank=True)
     content = models.TextField()
+    # Precomputed from content on save so list pages can defer the full body
+    excerpt = models.TextField(blank=True, editable=False)
     image = models.ImageField(
         upload_to='post_images/', 
         blank=True, 
         null=True,
-        storage=MediaCloudinaryStorage()
+        storage=DeduplicatingMediaCloudinaryStorage()
     )
     # new fields
     CATEGORY_CHOICES = [
@@ -32,27 +118,89 @@ class Post(models.Model):
     category = models.CharField(max_length=50, choices=CATEGORY_CHOICES, blank=True, null=True)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='draft')
     views = models.PositiveIntegerField(default=0)
+    # Maintained by the Comment signals in main/signals.py
+    comment_count = models.PositiveIntegerField(default=0, editable=False)
     pub_link = models.URLField(blank=True, null=True)
     author = models.ForeignKey(User, on_delete=models.CASCADE)
     created_at = models.DateTimeField(default=timezone.now)
     updated_at = models.DateTimeField(auto_now=True)
+    # A draft with publish_at goes live then (main/scheduler.py)
+    publish_at = models.DateTimeField(
+        null=True, blank=True, help_text='Publish this draft automatically at this time.'
+    )
+    # Neighbouring published posts, maintained by main/related.py
+    previous_post = models.ForeignKey(
+        'self', null=True, blank=True, editable=False, on_delete=models.SET_NULL, related_name='+'
+    )
+    next_post = models.ForeignKey(
+        'self', null=True, blank=True, editable=False, on_delete=models.SET_NULL, related_name='+'
+    )
+
+    objects = PostQuerySet.as_manager()
+    published = PublishedManager.from_queryset(PostQuerySet)()
+
+    # Left out of ordinary saves; see save()
+    COUNTER_FIELDS = ('views', 'comment_count')
 
     class Meta:
-        ordering = ['-created_at']
+        ordering = ['-created_at', '-id']
+        indexes = [
+            # Keyset pagination seeks on (created_at, id); see main/pagination.py
+            models.Index(fields=['-created_at', '-id'], name='post_created_id_idx'),
+            # Dashboard: one author's posts, optionally by status and category, newest first
+            models.Index(fields=['author', '-created_at', '-id'], name='post_author_created_idx'),
+            models.Index(fields=['author', 'status', '-created_at', '-id'], name='post_author_status_idx'),
+            models.Index(
+                fields=['author', 'status', 'category', '-created_at', '-id'], name='post_author_status_cat_idx'
+            ),
+            # Sitemap: published posts by id, their count, and the newest updated_at
+            models.Index(fields=['id'], condition=Q(status='published'), name='post_published_id_idx'),
+            models.Index(fields=['updated_at'], name='post_updated_idx'),
+            # Post.published newest first: public listings and previous/next links (main/related.py)
+            models.Index(
+                fields=['-created_at', '-id'], condition=Q(status='published'), name='post_published_idx'
+            ),
+            # Drafts waiting for main/scheduler.py
+            models.Index(fields=['publish_at'], condition=Q(publish_at__isnull=False), name='post_publish_at_idx'),
+        ]
 
     def __str__(self):
         return self.title
 
+    def base_slug(self):
+        return slugify(self.title) or 'post'
+
     def save(self, *args, **kwargs):
-        if not self.slug:
-            base_slug = slugify(self.title)
-            slug = base_slug
-            count = 1
-            while Post.objects.filter(slug=slug).exists():
-                slug = f'{base_slug}-{count}'
-                count += 1
-            self.slug = slug
-        super().save(*args, **kwargs)
+        if not self._state.adding and kwargs.get('update_fields') is None and not kwargs.get('force_insert'):
+            # Counters only change through F() updates; writing back the copy
+            # this instance was loaded with would undo any made since
+            deferred = self.get_deferred_fields()
+            kwargs['update_fields'] = [
+                field.attname for field in self._meta.concrete_fields
+                if not field.primary_key and field.attname not in deferred and field.name not in self.COUNTER_FIELDS
+            ]
+        # A listing instance (content deferred) cannot have changed content
+        if 'content' not in self.get_deferred_fields():
+            self.excerpt = make_excerpt(self.content)
+            update_fields = kwargs.get('update_fields')
+            if update_fields is not None and 'content' in update_fields:
+                kwargs['update_fields'] = {*update_fields, 'excerpt'}
+        if self.slug:
+            return super().save(*args, **kwargs)
+
+        base = self.base_slug()
+        for attempt in range(SLUG_SAVE_ATTEMPTS):
+            self.slug = next_free_slug(base, Post.objects.taken_slugs([base]))
+            try:
+                with transaction.atomic():
+                    return super().save(*args, **kwargs)
+            except IntegrityError:
+                # Retry only if a concurrent save took our slug first
+                lost_race = Post.objects.filter(slug=self.slug).exists()
+                self.slug = ''
+                if not lost_race or attempt == SLUG_SAVE_ATTEMPTS - 1:
+                    raise
+
 
 class Comment(models.Model):
     post = models.ForeignKey(Post, related_name='comments', on_delete=models.CASCADE)
@@ -62,7 +210,139 @@ class Comment(models.Model):
 
     class Meta:
         ordering = ['created_on']
+        indexes = [
+            # A post's comments in display order
+            models.Index(fields=['post', 'created_on'], name='comment_post_created_idx'),
+        ]
 
     def __str__(self):
         
         return f'Comment by {self.name}'
+
+
+class RelatedPost(models.Model):
+    """A post's most similar published posts, precomputed by main/related.py."""
+    post = models.ForeignKey(Post, related_name='related_links', on_delete=models.CASCADE)
+    related = models.ForeignKey(Post, related_name='linked_from', on_delete=models.CASCADE)
+    rank = models.PositiveSmallIntegerField()
+    score = models.FloatField()
+
+    class Meta:
+        constraints = [
+            # Also the index blog_single reads a post's related posts through
+            models.UniqueConstraint(fields=['post', 'rank'], name='relatedpost_post_rank_uniq'),
+        ]
+
+    def __str__(self):
+        return f'{self.post_id} -> {self.related_id} (#{self.rank})'
+
+
+class AuthorStats(models.Model):
+    """
+    An author's post counts by status and by category, total views and total
+    comments, kept current by main/authorstats.py.
+    """
+    author = models.OneToOneField(User, primary_key=True, related_name='post_stats', on_delete=models.CASCADE)
+    posts = models.IntegerField(default=0)
+    views = models.BigIntegerField(default=0)
+    comments = models.BigIntegerField(default=0)
+    # One column per Post.STATUS_CHOICES entry ...
+    draft_posts = models.IntegerField(default=0)
+    published_posts = models.IntegerField(default=0)
+    archived_posts = models.IntegerField(default=0)
+    # ... and per Post.CATEGORY_CHOICES entry, plus posts without a category
+    education_posts = models.IntegerField(default=0)
+    legal_posts = models.IntegerField(default=0)
+    success_posts = models.IntegerField(default=0)
+    awareness_posts = models.IntegerField(default=0)
+    activism_posts = models.IntegerField(default=0)
+    advocacy_posts = models.IntegerField(default=0)
+    uncategorized_posts = models.IntegerField(default=0)
+
+    class Meta:
+        verbose_name_plural = 'author stats'
+
+    def __str__(self):
+        return f'Stats for {self.author_id}'
+
+    @staticmethod
+    def status_field(status):
+        return f'{status}_posts'
+
+    @staticmethod
+    def category_field(category):
+        return f'{category or "uncategorized"}_posts'
+
+    def count(self, status=None, category=None):
+        """
+        Posts with ``status``, or with ``category``, or all of them. None when
+        both are given or either is unknown: the dashboard then counts rows.
+        """
+        if status and category:
+            return None
+        field = self.status_field(status) if status else self.category_field(category) if category else 'posts'
+        try:
+            return getattr(self, self._meta.get_field(field).attname)
+        except FieldDoesNotExist:
+            return None
+
+
+class MediaAsset(models.Model):
+    """Content hash of every stored upload, so identical files are stored once."""
+    digest = models.CharField(max_length=64, unique=True)
+    name = models.CharField(max_length=255, db_index=True)
+    size = models.PositiveIntegerField()
+    # Saves that returned this name; the file is deleted when the last one goes
+    references = models.PositiveIntegerField(default=1)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.name
+
+
+class GalleryImage(models.Model):
+    CATEGORY_CHOICES = [
+        ('events', 'Events'),
+        ('campaigns', 'Campaigns'),
+        ('school-visits', 'School Visits'),
+        ('awareness', 'Awareness'),
+    ]
+    title = models.CharField(max_length=120)
+    category = models.CharField(max_length=20, choices=CATEGORY_CHOICES, default='events')
+    image = models.ImageField(
+        upload_to='gallery/',
+        width_field='width',
+        height_field='height',
+        storage=DeduplicatingMediaCloudinaryStorage()
+    )
+    width = models.PositiveIntegerField(default=0, editable=False)
+    height = models.PositiveIntegerField(default=0, editable=False)
+    # Shown behind the thumbnail while it loads, e.g. '#a0522d'
+    placeholder_color = models.CharField(max_length=7, blank=True, editable=False)
+    position = models.PositiveIntegerField(default=0, help_text='Lower numbers are shown first.')
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        ordering = ['position', 'id']
+
+    def __str__(self):
+        return self.title
+
+    @property
+    def thumbnail_url(self):
+        size = settings.GALLERY_THUMBNAIL_SIZE
+        return cloudinary_url(self.image.storage, self.image.name, width=size, height=size, crop='fill')
+
+    @property
+    def full_url(self):
+        return cloudinary_url(self.image.storage, self.image.name, width=2048, height=2048, crop='limit')
+
+    @property
+    def cursor(self):
+        return f'{self.position}-{self.pk}'
+
+    def save(self, *args, **kwargs):
+        # Only a fresh upload is local; never download from Cloudinary here
+        if self.image and not self.image._committed:
+            self.placeholder_color = dominant_color(self.image)
+        super().save(*args, **kwargs)
@@ -0,0 +1,160 @@
+"""
+Full-page cache for the public views.
+
+Each cached view declares the tags its output depends on. A tag maps to a
+version number in the cache; the version is part of every page key, so bumping
+a tag (from the Post/Comment signals in main/signals.py) makes every page that
+depends on it miss on the next request without having to know its key.
+
+    POSTS          any page that lists posts (home, blog)
+    post:<slug>    the detail page for one post and its comments
+    GALLERY        the gallery page and its image API
+    RELATED        every detail page (bumped when related posts are rebuilt)
+
+Pages without tags (about, gallery, ...) only expire with PAGE_CACHE_TIMEOUT.
+Keys also hold SITE_VERSION, so a deploy never serves pages rendered by the
+previous code, and the host and path but not the scheme of the request.
+Authenticated users, non-GET requests and responses that set cookies (e.g. a
+CSRF token) always bypass the cache.
+"""
+import hashlib
+import time
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+
+POSTS = 'posts'
+GALLERY = 'gallery'
+RELATED = 'related'
+KEY_PREFIX = 'pagecache'
+STAT_EVENTS = ('hit', 'miss', 'bypass')
+
+
+def post_tag(slug):
+    return f'post:{slug}'
+
+
+def _version_key(tag):
+    return f'{KEY_PREFIX}:v:{tag}'
+
+
+def tag_versions(tags):
+    keys = [_version_key(tag) for tag in tags]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            # A fresh (or evicted) tag starts at "now", never at a value that
+            # older cached pages could have been stored under.
+            cache.add(key, time.time_ns(), None)
+            versions[key] = cache.get(key)
+    return [str(versions[key]) for key in keys]
+
+
+def invalidate(*tags):
+    cache.set_many({_version_key(tag): time.time_ns() for tag in tags}, None)
+
+
+def _count(view_name, event):
+    key = f'{KEY_PREFIX}:stats:{view_name}:{event}'
+    if not cache.add(key, 1, None):
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, 1, None)
+
+
+def stats(view_names):
+    """Return ``{view_name: {'hit': n, 'miss': n, 'bypass': n}}``."""
+    keys = {
+        f'{KEY_PREFIX}:stats:{name}:{event}': (name, event)
+        for name in view_names for event in STAT_EVENTS
+    }
+    found = cache.get_many(keys)
+    result = {name: dict.fromkeys(STAT_EVENTS, 0) for name in view_names}
+    for key, (name, event) in keys.items():
+        result[name][event] = found.get(key, 0)
+    return result
+
+
+def reset_stats(view_names):
+    cache.delete_many([
+        f'{KEY_PREFIX}:stats:{name}:{event}'
+        for name in view_names for event in STAT_EVENTS
+    ])
+
+
+def _page_key(view_name, request, tags):
+    # No scheme: the proxy in front may pass a page on as http or https, and
+    # the scheduler pre-warms it as SITE_URL (main/scheduler.py)
+    url = hashlib.md5(f'{request.get_host()}{request.get_full_path()}'.encode()).hexdigest()
+    versions = hashlib.md5('|'.join(tag_versions(tags)).encode()).hexdigest() if tags else '0'
+    return f'{KEY_PREFIX}:page:{view_name}:{settings.SITE_VERSION}:{url}:{versions}'
+
+
+def _lookup(view_name, request, tags, kwargs):
+    key = _page_key(view_name, request, [tag.format(**kwargs) for tag in tags])
+    response = cache.get(key)
+    if response is not None:
+        _count(view_name, 'hit')
+        response['X-Page-Cache'] = 'HIT'
+    return key, response
+
+
+def _store(view_name, key, request, response):
+    _count(view_name, 'miss')
+    if (
+        response.status_code == 200
+        and not response.streaming
+        and not response.cookies
+        and not request.META.get('CSRF_COOKIE_NEEDS_UPDATE')
+    ):
+        cache.set(key, response, settings.PAGE_CACHE_TIMEOUT)
+    response['X-Page-Cache'] = 'MISS'
+    return response
+
+
+def cache_public_page(*tags):
+    """
+    Cache a public view's response. ``tags`` may reference the view's URL
+    kwargs, e.g. ``cache_public_page(post_tag('{slug}'))``. Works on sync and
+    async views; for async views the cache I/O runs in a worker thread.
+    """
+    def decorator(view):
+        view_name = view.__name__
+
+        if iscoroutinefunction(view):
+            lookup = sync_to_async(_lookup, thread_sensitive=False)
+            store = sync_to_async(_store, thread_sensitive=False)
+            count = sync_to_async(_count, thread_sensitive=False)
+
+            @wraps(view)
+            async def async_wrapper(request, *args, **kwargs):
+                if request.method not in ('GET', 'HEAD') or (await request.auser()).is_authenticated:
+                    await count(view_name, 'bypass')
+                    return await view(request, *args, **kwargs)
+
+                key, response = await lookup(view_name, request, tags, kwargs)
+                if response is not None:
+                    return response
+                response = await view(request, *args, **kwargs)
+                return await store(view_name, key, request, response)
+
+            return async_wrapper
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD') or request.user.is_authenticated:
+                _count(view_name, 'bypass')
+                return view(request, *args, **kwargs)
+
+            key, response = _lookup(view_name, request, tags, kwargs)
+            if response is not None:
+                return response
+            response = view(request, *args, **kwargs)
+            return _store(view_name, key, request, response)
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,154 @@
+"""
+Keyset (cursor) pagination for Post listings and a post's comments.
+
+Django's Paginator runs COUNT(*) and then OFFSET n on every page, so deep
+pages get slower the further a reader goes. KeysetPaginator instead seeks to
+the row after (or before) an opaque cursor built from ``(created_at, id)``,
+the same key as ``Post.Meta.ordering``, which is served by the
+``post_created_id_idx`` index at any depth. CommentPaginator does the same
+oldest first on ``(created_on, id)`` within one post, served by
+``comment_post_created_idx``.
+
+The total count is optional; when asked for it is cached and invalidated
+together with the listing pages (see main/pagecache.py).
+"""
+import base64
+import binascii
+import hashlib
+from datetime import datetime
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Q
+from django.utils.functional import cached_property
+
+from . import pagecache
+
+MAX_PK = 2 ** 63
+
+def encode_cursor(obj, field='created_at'):
+    raw = f'{getattr(obj, field).isoformat()}|{obj.pk}'
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def _seek(qs, field, value, pk, newer=False):
+    # The leading range on the timestamp alone is what lets SQLite seek into
+    # the index; the OR only breaks ties between equal timestamps.
+    if newer:
+        return qs.filter(**{f'{field}__gte': value}).filter(Q(**{f'{field}__gt': value}) | Q(id__gt=pk))
+    return qs.filter(**{f'{field}__lte': value}).filter(Q(**{f'{field}__lt': value}) | Q(id__lt=pk))
+
+
+def decode_cursor(cursor):
+    """Return ``(created_at, pk)`` or ``None`` for a missing or malformed cursor."""
+    if not cursor:
+        return None
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        created_at, pk = base64.urlsafe_b64decode(padded).decode().split('|')
+        created_at, pk = datetime.fromisoformat(created_at), int(pk)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        return None
+    # Past a 64-bit integer the database would reject the query
+    if not 0 < pk < MAX_PK:
+        return None
+    return created_at, pk
+
+
+class KeysetPage:
+    def __init__(self, paginator, object_list, has_next, has_previous):
+        self.paginator = paginator
+        self.object_list = object_list
+        self.has_next = has_next
+        self.has_previous = has_previous
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    @property
+    def next_cursor(self):
+        return encode_cursor(self.object_list[-1], self.paginator.field) if self.has_next else None
+
+    @property
+    def previous_cursor(self):
+        return encode_cursor(self.object_list[0], self.paginator.field) if self.has_previous else None
+
+
+class KeysetPaginator:
+    """Newest first; ``after`` pages to older rows."""
+    field = 'created_at'
+    descending = True
+
+    def __init__(self, queryset, per_page, count_tags=(pagecache.POSTS,)):
+        self.queryset = queryset.order_by(*self.ordering)
+        self.per_page = per_page
+        self.count_tags = count_tags
+
+    @property
+    def ordering(self):
+        if self.descending:
+            return (f'-{self.field}', '-id')
+        return (self.field, 'id')
+
+    def _page_query(self, after, before):
+        """``(rows queryset, backwards, cursor)`` for a page request."""
+        cursor = decode_cursor(before)
+        if cursor:
+            value, pk = cursor
+            reverse = [key[1:] if key.startswith('-') else f'-{key}' for key in self.ordering]
+            qs = _seek(self.queryset, self.field, value, pk, newer=self.descending).order_by(*reverse)
+            return qs[:self.per_page + 1], True, cursor
+
+        cursor = decode_cursor(after)
+        qs = self.queryset
+        if cursor:
+            value, pk = cursor
+            qs = _seek(qs, self.field, value, pk, newer=not self.descending)
+        return qs[:self.per_page + 1], False, cursor
+
+    def _make_page(self, rows, backwards, cursor):
+        more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if backwards:
+            return KeysetPage(self, rows[::-1], True, more)
+        return KeysetPage(self, rows, more, cursor is not None)
+
+    def page(self, after=None, before=None):
+        """
+        Return the page of rows older than ``after`` or newer than ``before``.
+        With neither (or an invalid cursor) the first page is returned.
+        """
+        qs, backwards, cursor = self._page_query(after, before)
+        return self._make_page(list(qs), backwards, cursor)
+
+    def page_values(self, *fields, after=None, before=None):
+        """
+        ``values_list(*fields)`` of the rows ``page()`` would fetch (including
+        the one it looks ahead by), without building the page.
+        """
+        qs, _, _ = self._page_query(after, before)
+        return list(qs.values_list(*fields))
+
+    async def apage(self, after=None, before=None):
+        """Async version of ``page()``."""
+        qs, backwards, cursor = self._page_query(after, before)
+        return self._make_page([row async for row in qs], backwards, cursor)
+
+    @cached_property
+    def count(self):
+        """Total rows, cached until a Post changes (or PAGINATOR_COUNT_TIMEOUT)."""
+        sql = str(self.queryset.order_by().query)
+        versions = '|'.join(pagecache.tag_versions(self.count_tags))
+        key = 'paginator:count:' + hashlib.md5(f'{sql}|{versions}'.encode()).hexdigest()
+        return cache.get_or_set(
+            key, lambda: self.queryset.order_by().count(), settings.PAGINATOR_COUNT_TIMEOUT
+        )
+
+
+class CommentPaginator(KeysetPaginator):
+    """A post's comments, oldest first; ``after`` pages to newer comments."""
+    field = 'created_on'
+    descending = False
@@ -0,0 +1,209 @@
+"""
+Related posts and previous/next links for the detail page, precomputed so
+blog_single reads them with indexed lookups instead of scoring per request.
+
+Related posts are the RELATED_POSTS_COUNT published posts most similar to a
+post: cosine similarity of TF-IDF vectors over title and content (title words
+count TITLE_BOOST times), plus CATEGORY_BONUS when the categories match.
+Scoring every pair would be quadratic, so each post keeps only its
+TERMS_PER_POST heaviest terms and each term only its POSTINGS_PER_TERM
+heaviest posts; the candidates for a post are the posts sharing a kept term.
+``rebuild_related`` stores the result in RelatedPost; run it with
+``manage.py rebuild_related_posts`` (nightly, and after bulk imports).
+
+Scoring needs document frequencies over every published post, so saving a
+post does not rescore it: a new post shows no related posts, and an edited
+post keeps the ones it had, until the next rebuild. Related posts that are
+unpublished drop out at once (``related_posts`` reads Post.published), and
+saving or deleting a post invalidates the pages whose cards show it
+(``pages_showing``) and, since they print its title, the pages linking to it
+as previous/next (``pages_linking``).
+
+Post.previous_post / next_post follow published posts in (created_at, id)
+order. The rebuild sets them all and ``relink`` keeps them right when one
+post is saved or deleted (see main/signals.py).
+"""
+import heapq
+import math
+import re
+from collections import Counter, defaultdict
+from operator import itemgetter
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+
+from . import pagecache
+from .models import Post, RelatedPost
+from .pagination import _seek
+
+TITLE_BOOST = 3
+CATEGORY_BONUS = 0.1
+TERMS_PER_POST = 20
+POSTINGS_PER_TERM = 40
+BATCH_SIZE = 2000
+
+TOKEN_RE = re.compile(r'[a-z]{3,}')
+STOP_WORDS = frozenset('''
+    about after again all also and any are because been before being but can could did does doing down
+    during each few for from further had has have having her here hers herself him himself his how into
+    its itself just more most not now off once only other our ours out over own same she should some such
+    than that the their theirs them then there these they this those through too under until very was
+    were what when where which while who whom why will with would you your yours
+'''.split())
+
+
+def published():
+    return Post.published.all()
+
+
+def terms(title, content):
+    counts = Counter(word for word in TOKEN_RE.findall(content.lower()) if word not in STOP_WORDS)
+    for word in TOKEN_RE.findall(title.lower()):
+        if word not in STOP_WORDS:
+            counts[word] += TITLE_BOOST
+    return counts
+
+
+def _rows():
+    return published().order_by().values_list('pk', 'title', 'content', 'category').iterator(chunk_size=BATCH_SIZE)
+
+
+def _vectors():
+    """``(pks, categories, vectors)``: each vector is the post's heaviest terms, L2-normalised."""
+    # Two passes over the table so only document frequencies, not every
+    # post's full term counts, are held in memory
+    df = Counter()
+    total = 0
+    for _, title, content, _ in _rows():
+        df.update(terms(title, content).keys())
+        total += 1
+
+    pks, categories, vectors = [], [], []
+    for pk, title, content, category in _rows():
+        weights = {
+            term: (1 + math.log(count)) * (math.log((total + 1) / (df[term] + 1)) + 1)
+            for term, count in terms(title, content).items()
+        }
+        top = heapq.nlargest(TERMS_PER_POST, weights.items(), key=itemgetter(1))
+        norm = math.sqrt(sum(weight * weight for _, weight in top)) or 1.0
+        pks.append(pk)
+        categories.append(category)
+        vectors.append([(term, weight / norm) for term, weight in top])
+    return pks, categories, vectors
+
+
+def similar(pks, categories, vectors, count):
+    """Yield ``(pk, [(score, related pk), ...])`` with the ``count`` best matches of every post."""
+    postings = defaultdict(list)
+    for i, vector in enumerate(vectors):
+        for term, weight in vector:
+            postings[term].append((weight, i))
+    for term, posts in postings.items():
+        if len(posts) > POSTINGS_PER_TERM:
+            postings[term] = heapq.nlargest(POSTINGS_PER_TERM, posts)
+
+    for i, vector in enumerate(vectors):
+        scores = defaultdict(float)
+        for term, weight in vector:
+            for other_weight, j in postings[term]:
+                if j != i:
+                    scores[j] += weight * other_weight
+        if categories[i]:
+            for j in scores:
+                if categories[j] == categories[i]:
+                    scores[j] += CATEGORY_BONUS
+        best = heapq.nlargest(count, scores, key=scores.__getitem__)
+        yield pks[i], [(scores[j], pks[j]) for j in best]
+
+
+def rebuild_related(count=None):
+    """Recompute every published post's related posts. Returns the number of rows stored."""
+    count = count or settings.RELATED_POSTS_COUNT
+    rows = [
+        RelatedPost(post_id=pk, related_id=related_pk, rank=rank, score=score)
+        for pk, matches in similar(*_vectors(), count)
+        for rank, (score, related_pk) in enumerate(matches)
+    ]
+    with transaction.atomic():
+        RelatedPost.objects.all().delete()
+        RelatedPost.objects.bulk_create(rows, batch_size=BATCH_SIZE)
+    return len(rows)
+
+
+def link_all():
+    """Set previous/next on every post; only rows whose links change are written. Returns that count."""
+    order = list(published().order_by('created_at', 'id').values_list('pk', flat=True))
+    wanted = {
+        pk: (order[i - 1] if i else None, order[i + 1] if i + 1 < len(order) else None)
+        for i, pk in enumerate(order)
+    }
+    changed = []
+    current = Post.objects.order_by().values_list('pk', 'previous_post_id', 'next_post_id')
+    for pk, previous_id, next_id in current.iterator(chunk_size=BATCH_SIZE):
+        links = wanted.get(pk, (None, None))
+        if links != (previous_id, next_id):
+            changed.append(Post(pk=pk, previous_post_id=links[0], next_post_id=links[1]))
+    with transaction.atomic():
+        Post.objects.bulk_update(changed, ['previous_post', 'next_post'], batch_size=500)
+    return len(changed)
+
+
+def _neighbour(post, newer):
+    qs = _seek(published(), 'created_at', post.created_at, post.pk, newer=newer)
+    order = ('created_at', 'id') if newer else ('-created_at', '-id')
+    return qs.order_by(*order).values_list('pk', flat=True).first()
+
+
+def _update_links(pk, stale):
+    """Point post ``pk`` at its current neighbours; return them."""
+    post = Post.objects.filter(pk=pk).only('pk', 'slug', 'status', 'created_at', 'previous_post', 'next_post').first()
+    if post is None:
+        return ()
+    links = (None, None)
+    if post.status == 'published':
+        links = (_neighbour(post, newer=False), _neighbour(post, newer=True))
+    if links != (post.previous_post_id, post.next_post_id):
+        Post.objects.filter(pk=pk).update(previous_post_id=links[0], next_post_id=links[1])
+        stale.append(pagecache.post_tag(post.slug))
+    return [link for link in links if link]
+
+
+def relink(*pks):
+    """
+    Recompute previous/next for the given posts and for their new neighbours
+    (which now point back at them), then invalidate the cached pages of every
+    post whose links changed.
+    """
+    pks = {pk for pk in pks if pk}
+    stale, neighbours = [], set()
+    for pk in pks:
+        neighbours.update(_update_links(pk, stale))
+    for pk in neighbours - pks:
+        _update_links(pk, stale)
+    if stale:
+        pagecache.invalidate(*stale)
+
+
+def pages_showing(posts):
+    """Page cache tags of the posts that list any of ``posts`` (pks or a queryset) among their related posts."""
+    slugs = Post.objects.filter(related_links__related__in=posts).order_by().values_list('slug', flat=True).distinct()
+    return [pagecache.post_tag(slug) for slug in slugs]
+
+
+def pages_linking(posts):
+    """Page cache tags of the posts whose previous/next link points at any of ``posts`` (pks or a queryset)."""
+    slugs = (
+        Post.objects.filter(Q(previous_post__in=posts) | Q(next_post__in=posts))
+        .order_by().values_list('slug', flat=True).distinct()
+    )
+    return [pagecache.post_tag(slug) for slug in slugs]
+
+
+def related_posts(post):
+    """The stored related posts, best first, in one query on (post, rank)."""
+    return (
+        Post.published.for_listing()
+        .filter(linked_from__post=post)
+        .order_by('linked_from__rank')
+    )
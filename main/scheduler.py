@@ -0,0 +1,84 @@
+"""
+Scheduled publishing.
+
+A draft with ``publish_at`` goes live once that time has passed.
+``publish_due`` publishes every such draft with one bulk action (see
+main/bulk.py), dates it ``publish_at`` so it lists among the newest posts,
+and pre-warms the page cache for the home page, the first blog page and the
+new posts' pages, so the first readers after a publish are served cached
+pages instead of all rendering them at once.
+
+``manage.py run_scheduler`` runs ``publish_due`` every PUBLISH_CHECK_SECONDS
+with APScheduler. Run one scheduler per site, not one per web worker; on
+Render it is started next to gunicorn by render.yaml, as the pages it warms
+go to that instance's file-based cache.
+"""
+import logging
+from urllib.parse import urlsplit
+
+from apscheduler.schedulers.blocking import BlockingScheduler
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.db import close_old_connections, transaction
+from django.db.models import F
+from django.test import RequestFactory
+from django.urls import resolve, reverse
+from django.utils import timezone
+
+from . import bulk
+from .models import Post
+
+logger = logging.getLogger(__name__)
+
+
+def prewarm(slugs):
+    """Render the public pages a publish changed into the page cache, as an anonymous reader of SITE_URL would."""
+    site = urlsplit(settings.SITE_URL)
+    factory = RequestFactory(HTTP_HOST=site.netloc)
+    paths = [reverse('home'), reverse('blog'), *(reverse('post_detail', args=[slug]) for slug in slugs)]
+    for path in paths:
+        # HEAD is cached under the same key as GET, but is not counted as a post view
+        request = factory.head(path, secure=site.scheme == 'https')
+        request.user = AnonymousUser()
+        match = resolve(path)
+        match.func(request, *match.args, **match.kwargs)
+    return len(paths)
+
+
+def publish_due(now=None):
+    """Publish every draft whose ``publish_at`` has passed; return their slugs."""
+    due = Post.objects.filter(status='draft', publish_at__lte=now or timezone.now()).order_by()
+    pks = list(due.values_list('pk', flat=True))
+    if not pks:
+        return []
+    with transaction.atomic():
+        # Clearing publish_at keeps a post that is later unpublished from going live again
+        Post.objects.filter(pk__in=pks).update(created_at=F('publish_at'), publish_at=None)
+        bulk.apply(Post.objects.filter(pk__in=pks), 'publish')
+    slugs = list(Post.published.filter(pk__in=pks).values_list('slug', flat=True))
+    try:
+        prewarm(slugs)
+    except Exception:
+        # The posts are live either way; readers will render the pages instead
+        logger.exception('Pre-warming pages failed')
+    return slugs
+
+
+def run_publish_due():
+    # A long-running process must drop connections the database has timed out
+    close_old_connections()
+    try:
+        slugs = publish_due()
+        if slugs:
+            logger.info('Published %s', ', '.join(slugs))
+    finally:
+        close_old_connections()
+
+
+def build_scheduler():
+    scheduler = BlockingScheduler(timezone=settings.TIME_ZONE)
+    scheduler.add_job(
+        run_publish_due, 'interval', seconds=settings.PUBLISH_CHECK_SECONDS, id='publish_due',
+        next_run_time=timezone.now(), max_instances=1, coalesce=True,
+    )
+    return scheduler
@@ -0,0 +1,217 @@
+"""
+Full-text search over Post title and content.
+
+On SQLite the index is an FTS5 external-content table (``main_post_fts``)
+kept in sync with ``main_post`` by triggers, so every write path (save(),
+bulk_create(), queryset.update(), raw SQL) updates it. SQLite drops triggers
+when a migration remakes ``main_post``, so ``install_index`` runs on every
+post_migrate, recreates whatever is missing and rebuilds the index if it had
+to. On PostgreSQL the same API is served by django.contrib.postgres search.
+
+``main_post_fts`` stores porter stems, so whole words match their other
+forms but a half-typed word cannot be matched as a prefix of a stem
+("educati" is not a prefix of "educ"). The last word of a query is therefore
+completed from ``main_post_words``, an unstemmed index of the same text
+(``detail=none``: terms only, no positions), into up to PREFIX_COMPLETIONS
+whole words, which are then matched, stemmed, alongside the word itself.
+"""
+import re
+import unicodedata
+
+from django.db import connection, connections
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+from django.utils.html import escape
+
+from .models import Post
+
+FTS_TABLE = 'main_post_fts'
+WORDS_TABLE = 'main_post_words'
+WORDS_VOCAB = 'main_post_words_vocab'
+TITLE_WEIGHT = 10.0
+CONTENT_WEIGHT = 1.0
+SNIPPET_TOKENS = 24
+PREFIX_COMPLETIONS = 30
+
+# Control characters never appear in post text, so they are safe to use as
+# highlight markers before escaping and are then swapped for <mark> tags.
+MARK_START, MARK_END = '\x02', '\x03'
+
+_TABLES = {
+    FTS_TABLE: "title, content, content='main_post', content_rowid='id', tokenize='porter unicode61'",
+    WORDS_TABLE: "title, content, content='main_post', content_rowid='id', tokenize='unicode61', detail=none",
+}
+
+
+def _triggers(table):
+    return {
+        f'{table}_ai': f"""
+            CREATE TRIGGER IF NOT EXISTS {table}_ai AFTER INSERT ON main_post BEGIN
+                INSERT INTO {table}(rowid, title, content) VALUES (new.id, new.title, new.content);
+            END""",
+        f'{table}_ad': f"""
+            CREATE TRIGGER IF NOT EXISTS {table}_ad AFTER DELETE ON main_post BEGIN
+                INSERT INTO {table}({table}, rowid, title, content)
+                VALUES ('delete', old.id, old.title, old.content);
+            END""",
+        f'{table}_au': f"""
+            CREATE TRIGGER IF NOT EXISTS {table}_au AFTER UPDATE OF title, content ON main_post BEGIN
+                INSERT INTO {table}({table}, rowid, title, content)
+                VALUES ('delete', old.id, old.title, old.content);
+                INSERT INTO {table}(rowid, title, content) VALUES (new.id, new.title, new.content);
+            END""",
+    }
+
+
+def install_index(using='default', **kwargs):
+    """post_migrate handler: create the FTS tables and triggers if missing."""
+    conn = connections[using]
+    if conn.vendor != 'sqlite':
+        return
+    with conn.cursor() as cursor:
+        cursor.execute(
+            "SELECT name FROM sqlite_master WHERE name IN (%s, %s) OR (type = 'trigger' AND tbl_name = 'main_post')",
+            list(_TABLES),
+        )
+        existing = {row[0] for row in cursor.fetchall()}
+        for table, options in _TABLES.items():
+            cursor.execute(f"CREATE VIRTUAL TABLE IF NOT EXISTS {table} USING fts5({options})")
+            triggers = _triggers(table)
+            for sql in triggers.values():
+                cursor.execute(sql)
+            if not existing.issuperset([table, *triggers]):
+                cursor.execute(f"INSERT INTO {table}({table}) VALUES ('rebuild')")
+        cursor.execute(f"CREATE VIRTUAL TABLE IF NOT EXISTS {WORDS_VOCAB} USING fts5vocab({WORDS_TABLE}, 'row')")
+
+
+def rebuild_index(using='default'):
+    conn = connections[using]
+    if conn.vendor == 'sqlite':
+        with conn.cursor() as cursor:
+            for table in _TABLES:
+                cursor.execute(f"INSERT INTO {table}({table}) VALUES ('rebuild')")
+
+
+def _fold(word):
+    """``word`` as unicode61 indexes it: lower case, without diacritics."""
+    return ''.join(char for char in unicodedata.normalize('NFKD', word.lower()) if not unicodedata.combining(char))
+
+
+def completions(prefix):
+    """Up to PREFIX_COMPLETIONS indexed words starting with ``prefix``, from one range read of the vocabulary."""
+    prefix = _fold(prefix)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT term FROM {WORDS_VOCAB} WHERE term >= %s AND term < %s ORDER BY term LIMIT %s",
+            [prefix, prefix[:-1] + chr(ord(prefix[-1]) + 1), PREFIX_COMPLETIONS],
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+def match_expression(query):
+    """
+    Turn free text into a safe FTS5 MATCH expression: every word must match,
+    the last one also through the words it is the start of, so results
+    appear while the user is typing.
+    """
+    words = re.findall(r'\w+', query or '')
+    if not words:
+        return ''
+    terms = [f'"{word}"' for word in words]
+    last = dict.fromkeys([_fold(words[-1]), *completions(words[-1])])
+    terms[-1] = '(' + ' OR '.join(f'"{word}"' for word in last) + ')'
+    return ' AND '.join(terms)
+
+
+def _highlight(text):
+    return escape(text).replace(MARK_START, '<mark>').replace(MARK_END, '</mark>')
+
+
+def filter_posts(queryset, query):
+    """Restrict ``queryset`` to posts matching ``query``, keeping its ordering."""
+    if connection.vendor == 'sqlite':
+        expression = match_expression(query)
+        if not expression:
+            return queryset.none()
+        return queryset.filter(pk__in=RawSQL(
+            f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s', [expression]
+        ))
+    if connection.vendor == 'postgresql':
+        from django.contrib.postgres.search import SearchQuery, SearchVector
+        return queryset.annotate(
+            search_vector=SearchVector('title', 'content'),
+        ).filter(search_vector=SearchQuery(query, search_type='websearch'))
+    return queryset.filter(Q(title__icontains=query) | Q(content__icontains=query))
+
+
+def search_posts(query, queryset=None, limit=30):
+    """
+    Return up to ``limit`` posts from ``queryset`` ranked by relevance, each
+    with ``search_title`` and ``search_snippet`` HTML (matches in <mark>).
+    """
+    queryset = Post.objects.all() if queryset is None else queryset
+    if connection.vendor == 'sqlite':
+        expression = match_expression(query)
+        if not expression:
+            return []
+        ids_sql, ids_params = queryset.order_by().values('pk').query.sql_with_params()
+        with connection.cursor() as cursor:
+            # Rank first, then build highlights only for the rows that made
+            # the cut; snippet() is far too costly to run on every match.
+            # The unary + on rowid keeps SQLite from handing the IN list to
+            # FTS5 as a rowid constraint, which re-runs the MATCH per row.
+            cursor.execute(
+                f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s "
+                f"AND +rowid IN ({ids_sql}) "
+                f"ORDER BY bm25({FTS_TABLE}, %s, %s) LIMIT %s",
+                [expression, *ids_params, TITLE_WEIGHT, CONTENT_WEIGHT, limit],
+            )
+            ranked = [row[0] for row in cursor.fetchall()]
+            if not ranked:
+                return []
+            cursor.execute(
+                f"SELECT rowid, "
+                f"highlight({FTS_TABLE}, 0, %s, %s), "
+                f"snippet({FTS_TABLE}, 1, %s, %s, '…', %s) "
+                f"FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s "
+                f"AND +rowid IN ({', '.join(['%s'] * len(ranked))})",
+                [MARK_START, MARK_END, MARK_START, MARK_END, SNIPPET_TOKENS, expression, *ranked],
+            )
+            highlights = {row[0]: row[1:] for row in cursor.fetchall()}
+        posts = queryset.in_bulk(ranked)
+        results = []
+        for pk in ranked:
+            post = posts[pk]
+            title, snippet = highlights[pk]
+            post.search_title = _highlight(title)
+            post.search_snippet = _highlight(snippet)
+            results.append(post)
+        return results
+
+    if connection.vendor == 'postgresql':
+        from django.contrib.postgres.search import (
+            SearchHeadline, SearchQuery, SearchRank, SearchVector,
+        )
+        search_query = SearchQuery(query, search_type='websearch')
+        vector = SearchVector('title', weight='A') + SearchVector('content', weight='B')
+        options = {'start_sel': MARK_START, 'stop_sel': MARK_END}
+        results = list(
+            queryset.annotate(rank=SearchRank(vector, search_query))
+            .filter(rank__gt=0)
+            .annotate(
+                headline_title=SearchHeadline('title', search_query, highlight_all=True, **options),
+                headline_content=SearchHeadline('content', search_query, max_words=SNIPPET_TOKENS, **options),
+            )
+            .order_by('-rank')[:limit]
+        )
+        for post in results:
+            post.search_title = _highlight(post.headline_title)
+            post.search_snippet = _highlight(post.headline_content)
+        return results
+
+    results = list(filter_posts(queryset, query)[:limit])
+    for post in results:
+        post.search_title = escape(post.title)
+        post.search_snippet = escape(post.excerpt)
+    return results
+
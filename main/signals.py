@@ -0,0 +1,162 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from django.contrib.auth.models import User
+from django.db.models import F
+from django.db.models.signals import post_save, post_delete, pre_delete, pre_save
+from django.dispatch import receiver
+
+from . import authorstats, pagecache, related
+from .models import Post, Comment, GalleryImage
+
+_muted = ContextVar('signals_muted', default=False)
+
+
+@contextmanager
+def muted():
+    """
+    Skip the Post/Comment delete receivers below while deleting, for callers
+    that do their work once for the whole set instead (see main/bulk.py).
+    """
+    token = _muted.set(True)
+    try:
+        yield
+    finally:
+        _muted.reset(token)
+
+
+def unless_muted(handler):
+    @wraps(handler)
+    def wrapper(*args, **kwargs):
+        if not _muted.get():
+            handler(*args, **kwargs)
+    return wrapper
+
+
+# Counters are bumped with queryset.update() so Post.updated_at (auto_now)
+# is left alone and concurrent comments never overwrite each other.
+
+@receiver(post_save, sender=Comment)
+def increment_comment_count(sender, instance, created, **kwargs):
+    if created:
+        Post.objects.filter(pk=instance.post_id).update(comment_count=F('comment_count') + 1)
+
+
+@receiver(post_delete, sender=Comment)
+@unless_muted
+def decrement_comment_count(sender, instance, **kwargs):
+    Post.objects.filter(pk=instance.post_id, comment_count__gt=0).update(
+        comment_count=F('comment_count') - 1
+    )
+
+
+# Pages whose related-post cards or previous/next links show a post change
+# with it too. A deleted post's neighbours are relinked, which invalidates
+# their pages (see relink_deleted_post below).
+
+@receiver(post_save, sender=Post)
+def invalidate_post_pages(sender, instance, **kwargs):
+    pagecache.invalidate(
+        pagecache.POSTS, pagecache.post_tag(instance.slug),
+        *related.pages_showing([instance.pk]), *related.pages_linking([instance.pk]),
+    )
+
+
+@receiver(pre_delete, sender=Post)
+@unless_muted
+def remember_pages_showing(sender, instance, **kwargs):
+    # Read before the delete cascades to the RelatedPost rows that name them
+    instance._pages_showing = related.pages_showing([instance.pk])
+
+
+@receiver(post_delete, sender=Post)
+@unless_muted
+def invalidate_deleted_post_pages(sender, instance, **kwargs):
+    showing = instance.__dict__.pop('_pages_showing', [])
+    pagecache.invalidate(pagecache.POSTS, pagecache.post_tag(instance.slug), *showing)
+
+
+@receiver(post_save, sender=Post)
+def relink_saved_post(sender, instance, update_fields=None, **kwargs):
+    # The instance still holds the links it was loaded with, i.e. its old neighbours
+    if update_fields is None or {'status', 'created_at'} & set(update_fields):
+        related.relink(instance.pk, instance.previous_post_id, instance.next_post_id)
+
+
+@receiver(post_delete, sender=Post)
+@unless_muted
+def relink_deleted_post(sender, instance, **kwargs):
+    related.relink(instance.previous_post_id, instance.next_post_id)
+
+
+# AuthorStats (main/authorstats.py) follows Post.views and comment_count, so
+# a deleted post takes its comment_count with it and the comments it cascades
+# to are not counted off again. Deleting the author takes their row with it,
+# so nothing is counted off the posts and comments that cascade from that.
+
+def _cascades_from(origin, model):
+    return isinstance(origin, model) or getattr(origin, 'model', None) is model
+
+
+@receiver(pre_save, sender=Post)
+def remember_post_stats(sender, instance, update_fields=None, **kwargs):
+    fields = ('author_id', 'status', 'category', 'views', 'comment_count')
+    before = Post.objects.filter(pk=instance.pk).values(*fields).first() if instance.pk else None
+    if before is not None and update_fields is not None:
+        # Counters this save leaves alone are brought up to date, so the
+        # instance and the stats below see the stored values
+        for field in Post.COUNTER_FIELDS:
+            if field not in update_fields:
+                setattr(instance, field, before[field])
+    instance._stats_before = before
+
+
+@receiver(post_save, sender=Post)
+def update_author_stats(sender, instance, created, **kwargs):
+    before = instance.__dict__.pop('_stats_before', None)
+    after = authorstats.contribution(instance.status, instance.category, instance.views, instance.comment_count)
+    if created or before is None:
+        authorstats.adjust(instance.author_id, after)
+        return
+    old = authorstats.contribution(before['status'], before['category'], before['views'], before['comment_count'])
+    if before['author_id'] != instance.author_id:
+        authorstats.adjust(before['author_id'], authorstats.negate(old))
+        authorstats.adjust(instance.author_id, after)
+    else:
+        authorstats.adjust(instance.author_id, authorstats.difference(after, old))
+
+
+@receiver(post_delete, sender=Post)
+@unless_muted
+def remove_author_stats(sender, instance, origin=None, **kwargs):
+    if _cascades_from(origin, User):
+        return
+    authorstats.adjust(instance.author_id, authorstats.negate(
+        authorstats.contribution(instance.status, instance.category, instance.views, instance.comment_count)
+    ), build_missing=False)
+
+
+@receiver(post_save, sender=Comment)
+def count_author_comment(sender, instance, created, **kwargs):
+    if created:
+        authorstats.adjust(instance.post.author_id, {'comments': 1})
+
+
+@receiver(post_delete, sender=Comment)
+@unless_muted
+def uncount_author_comment(sender, instance, origin=None, **kwargs):
+    if _cascades_from(origin, Post) or _cascades_from(origin, User):
+        return
+    authorstats.adjust(instance.post.author_id, {'comments': -1}, build_missing=False)
+
+
+@receiver([post_save, post_delete], sender=Comment)
+@unless_muted
+def invalidate_comment_pages(sender, instance, **kwargs):
+    pagecache.invalidate(pagecache.post_tag(instance.post.slug))
+
+
+@receiver([post_save, post_delete], sender=GalleryImage)
+def invalidate_gallery_pages(sender, instance, **kwargs):
+    pagecache.invalidate(pagecache.GALLERY)
@@ -0,0 +1,219 @@
+"""
+sitemap.xml for crawlers.
+
+Only published posts are listed. Post URLs come from one reverse() per
+request (a template URL with each slug swapped in) and rows from a narrow
+``values_list`` iterator, so memory stays flat however many posts there are.
+Past SITEMAP_MAX_URLS entries sitemap.xml becomes a sitemap index pointing at
+``sitemap-<n>.xml`` sections of at most that many URLs each.
+
+Every document is cached under the POSTS page-cache tag, so any post change
+regenerates it; on a miss the XML is streamed to the client while it is
+being cached. Responses carry an ETag and a Last-Modified taken from the
+POSTS tag version, which every save, delete and bulk action bumps (a
+deleted post has no ``updated_at`` left to move), and a matching
+If-None-Match or If-Modified-Since gets a 304 without touching the posts.
+
+Sections are id ranges. The first id of every section is found once per
+POSTS version with one pass over the published-id index, so a late section
+is an indexed range read rather than an OFFSET over every earlier row.
+"""
+import hashlib
+import math
+from datetime import datetime, timezone as dt_timezone
+from itertools import islice
+from xml.sax.saxutils import escape
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Max
+from django.http import Http404, HttpResponse, StreamingHttpResponse
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from django.utils.functional import cached_property
+from django.utils.http import http_date
+
+from . import pagecache
+from .models import Post
+
+STATIC_PAGES = ('home', 'about', 'gallery', 'videos', 'contact', 'blog')
+CHUNK_ROWS = 1000
+CONTENT_TYPE = 'application/xml'
+SLUG_PLACEHOLDER = 'sitemap-slug'
+
+URLSET_START = '<?xml version="1.0" encoding="UTF-8"?>\n<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n'
+URLSET_END = '</urlset>\n'
+
+
+def published():
+    return Post.published.all()
+
+
+def section_bounds(section):
+    """Positions ``[start, stop)``, among the published posts by id, of urlset ``section``'s posts."""
+    size = settings.SITEMAP_MAX_URLS
+    return max(0, (section - 1) * size - len(STATIC_PAGES)), max(0, section * size - len(STATIC_PAGES))
+
+
+def summary(version):
+    """
+    ``{'posts': published posts, 'starts': {position: id}, 'last_modified': datetime}``
+    for the POSTS tag ``version``. ``starts`` maps the position of each
+    section's first post to its id. ``version`` is the time_ns of the last
+    post change (see main/pagecache.py), deletes and unpublishing included.
+    """
+    def compute():
+        size = settings.SITEMAP_MAX_URLS
+        starts, posts = {}, 0
+        # One pass over post_published_id_idx, reading only the ids
+        ids = published().order_by('id').values_list('id', flat=True).iterator(chunk_size=CHUNK_ROWS)
+        for posts, pk in enumerate(ids, 1):
+            if posts == 1 or (posts - 1 + len(STATIC_PAGES)) % size == 0:
+                starts[posts - 1] = pk
+        newest = Post.objects.aggregate(newest=Max('updated_at'))['newest']
+        # A cache that keeps nothing (DummyCache) has no version to read a time from
+        changed = datetime.fromtimestamp(int(version) / 1e9, dt_timezone.utc) if version.isdigit() else timezone.now()
+        return {'posts': posts, 'starts': starts, 'last_modified': max(filter(None, [newest, changed]))}
+    return cache.get_or_set(f'sitemap:summary:{version}', compute, settings.PAGE_CACHE_TIMEOUT)
+
+
+def section_count(posts):
+    return max(1, math.ceil((len(STATIC_PAGES) + posts) / settings.SITEMAP_MAX_URLS))
+
+
+class Document:
+    """One sitemap document: the index (section 0 when split) or a urlset (section 0 or 1 when not)."""
+
+    def __init__(self, request, section):
+        version = pagecache.tag_versions([pagecache.POSTS])[0]
+        info = summary(version)
+        self.request = request
+        self.sections = section_count(info['posts'])
+        self.starts = info['starts']
+        self.last_modified = info['last_modified']
+        self.is_index = section == 0 and self.sections > 1
+        if section > self.sections:
+            raise Http404('No such sitemap section')
+        self.section = max(section, 1)
+        site = hashlib.md5(request.build_absolute_uri('/').encode()).hexdigest()
+        self.key = f'sitemap:doc:{site}:{section}:{version}'
+        self.etag = '"%s"' % hashlib.md5(self.key.encode()).hexdigest()
+
+    def not_modified(self):
+        """A 304 response if the client's copy is current, else None."""
+        return get_conditional_response(self.request, etag=self.etag, last_modified=self._timestamp())
+
+    def _timestamp(self):
+        return int(self.last_modified.timestamp())
+
+    def finish(self, response):
+        response['ETag'] = self.etag
+        response['Last-Modified'] = http_date(self._timestamp())
+        return response
+
+    def index(self):
+        base = self.request.build_absolute_uri('/')[:-1]
+        lastmod = self.last_modified.astimezone(dt_timezone.utc).date()
+        lines = [
+            f'<sitemap><loc>{escape(base + reverse("sitemap_section", args=[n]))}</loc>'
+            f'<lastmod>{lastmod}</lastmod></sitemap>\n'
+            for n in range(1, self.sections + 1)
+        ]
+        return (
+            '<?xml version="1.0" encoding="UTF-8"?>\n'
+            '<sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n'
+            + ''.join(lines) + '</sitemapindex>\n'
+        )
+
+    def head(self):
+        """The opening tag and whichever static pages fall in this section."""
+        size = settings.SITEMAP_MAX_URLS
+        start = (self.section - 1) * size
+        pages = STATIC_PAGES[start:start + size]
+        return URLSET_START + ''.join(
+            f'<url><loc>{escape(self.request.build_absolute_uri(reverse(name)))}</loc></url>\n' for name in pages
+        )
+
+    def rows(self):
+        """``(slug, updated_at)`` of this section's posts, oldest id first, as an id range."""
+        start, stop = section_bounds(self.section)
+        if start == stop or start not in self.starts:
+            return published().none()
+        rows = published().filter(id__gte=self.starts[start])
+        if stop in self.starts:
+            rows = rows.filter(id__lt=self.starts[stop])
+        return rows.order_by('id').values_list('slug', 'updated_at')
+
+    @cached_property
+    def post_url(self):
+        """``(prefix, suffix)`` around the slug in an absolute post URL."""
+        template = escape(self.request.build_absolute_uri(reverse('post_detail', args=[SLUG_PLACEHOLDER])))
+        return tuple(template.split(SLUG_PLACEHOLDER))
+
+    def lines(self, rows):
+        prefix, suffix = self.post_url
+        return ''.join(
+            f'<url><loc>{prefix}{slug}{suffix}</loc><lastmod>{updated_at.date()}</lastmod></url>\n'
+            for slug, updated_at in rows
+        )
+
+    def stream(self):
+        """Yield the urlset in chunks and cache the whole document at the end."""
+        parts = [self.head()]
+        yield parts[-1]
+        batch = []
+        for row in self.rows().iterator(chunk_size=CHUNK_ROWS):
+            batch.append(row)
+            if len(batch) == CHUNK_ROWS:
+                parts.append(self.lines(batch))
+                yield parts[-1]
+                batch = []
+        parts.append(self.lines(batch) + URLSET_END)
+        yield parts[-1]
+        cache.set(self.key, ''.join(parts), settings.PAGE_CACHE_TIMEOUT)
+
+    async def astream(self):
+        """Async version of ``stream()``."""
+        head = await sync_to_async(self.head)()
+        parts = [head]
+        yield head
+        # values_list().aiterator() would run its query on the event loop, so
+        # the rows are fetched a chunk at a time in the worker thread instead
+        rows = await sync_to_async(lambda: self.rows().iterator(chunk_size=CHUNK_ROWS))()
+        fetch = sync_to_async(lambda: list(islice(rows, CHUNK_ROWS)))
+        while batch := await fetch():
+            parts.append(self.lines(batch))
+            yield parts[-1]
+        parts.append(URLSET_END)
+        yield parts[-1]
+        await cache.aset(self.key, ''.join(parts), settings.PAGE_CACHE_TIMEOUT)
+
+    def cached(self):
+        """The whole document as a plain response, if it is cached or small enough to build at once."""
+        body = cache.get(self.key)
+        if body is None and self.is_index:
+            body = self.index()
+            cache.set(self.key, body, settings.PAGE_CACHE_TIMEOUT)
+        if body is None:
+            return None
+        return HttpResponse(body, content_type=CONTENT_TYPE)
+
+
+def response(request, section=0):
+    doc = Document(request, section)
+    return doc.finish(
+        doc.not_modified() or doc.cached() or StreamingHttpResponse(doc.stream(), content_type=CONTENT_TYPE)
+    )
+
+
+async def aresponse(request, section=0):
+    """Async version of ``response()``; the cache and summary lookups run in a worker thread."""
+    doc = await sync_to_async(Document)(request, section)
+    not_modified = doc.not_modified()
+    if not_modified:
+        return doc.finish(not_modified)
+    return doc.finish(
+        await sync_to_async(doc.cached)() or StreamingHttpResponse(doc.astream(), content_type=CONTENT_TYPE)
+    )
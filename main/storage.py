@@ -0,0 +1,82 @@
+"""
+Content-addressed media storage.
+
+Re-uploading a file Django already stored used to create another copy under a
+suffixed name (``image3_0MwH2Vt.jpg``). These storages hash the content first
+and, when the same bytes were saved before, return the existing name from the
+local ``MediaAsset`` index without touching the backend.
+
+One stored file can therefore back several posts and gallery images. Each
+MediaAsset counts the saves that returned its name, and ``delete`` only
+removes the file when the last of them lets go.
+"""
+import hashlib
+
+from cloudinary_storage.storage import MediaCloudinaryStorage
+from django.db.models import F
+from django.utils.deconstruct import deconstructible
+
+
+def content_digest(content):
+    """SHA-256 of a Django File, leaving it rewound for the upload."""
+    digest = hashlib.sha256()
+    content.seek(0)
+    for chunk in content.chunks():
+        digest.update(chunk)
+    content.seek(0)
+    return digest.hexdigest()
+
+
+class DeduplicatingStorageMixin:
+    """
+    Mix into any Storage class to reuse stored files with identical content.
+
+    ``save`` is ``claim``, then on a miss ``upload`` and ``record``. Callers
+    that upload from worker threads (main/mediamigration.py) run the two
+    MediaAsset steps themselves on the main thread and only ``upload``, which
+    never touches the database, in the workers.
+    """
+
+    def save(self, name, content, max_length=None):
+        if content is None or not hasattr(content, 'chunks'):
+            return super().save(name, content, max_length)
+        digest = content_digest(content)
+        existing = self.claim(digest)
+        if existing is not None:
+            return existing
+        name = self.upload(name, content, max_length)
+        self.record(digest, name, content.size)
+        return name
+
+    def claim(self, digest):
+        """The stored name for ``digest`` with one more reference counted, or None if there is none."""
+        from .models import MediaAsset
+
+        existing = MediaAsset.objects.filter(digest=digest).values_list('name', flat=True).first()
+        # The update misses if the last reference was deleted in the meantime
+        if existing is not None and MediaAsset.objects.filter(digest=digest).update(references=F('references') + 1):
+            return existing
+        return None
+
+    def upload(self, name, content, max_length=None):
+        """Store ``content`` in the backend only, without the MediaAsset index."""
+        return super().save(name, content, max_length)
+
+    def record(self, digest, name, size):
+        """Index a file ``upload`` stored under ``name``."""
+        from .models import MediaAsset
+
+        MediaAsset.objects.get_or_create(digest=digest, defaults={'name': name, 'size': size})
+
+    def delete(self, name):
+        from .models import MediaAsset
+
+        if MediaAsset.objects.filter(name=name, references__gt=1).update(references=F('references') - 1):
+            return  # still used by another post or gallery image
+        MediaAsset.objects.filter(name=name).delete()
+        return super().delete(name)
+
+
+@deconstructible
+class DeduplicatingMediaCloudinaryStorage(DeduplicatingStorageMixin, MediaCloudinaryStorage):
+    pass
@@ -1,10 +1,41 @@
+from functools import lru_cache
+
 from django import template
-from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
 from django.templatetags.static import static
 from cloudinary_storage.storage import MediaCloudinaryStorage
 
 register = template.Library()
 
+# Distinct gallery paths are few; this bounds memory if templates ever feed
+# user-supplied paths through the filter.
+URL_CACHE_SIZE = 1024
+
+
+@lru_cache(maxsize=1)
+def get_media_storage():
+    """One shared storage instance instead of a new one per filter call."""
+    return MediaCloudinaryStorage()
+
+
+@lru_cache(maxsize=URL_CACHE_SIZE)
+def resolve_image_url(image_path):
+    # If it starts with 'media/post_images/', treat as a Cloudinary image
+    if image_path.startswith('media/post_images/'):
+        return get_media_storage().url(image_path.replace('media/', '', 1))
+
+    # Otherwise treat as static
+    return static(image_path)
+
+
+@receiver(setting_changed)
+def clear_image_url_cache(**kwargs):
+    # URLs depend on STATIC_URL, storage and Cloudinary settings
+    get_media_storage.cache_clear()
+    resolve_image_url.cache_clear()
+
+
 @register.filter
 def gallery_image_url(image_path):
     """
@@ -13,11 +44,4 @@ def gallery_image_url(image_path):
     """
     if not image_path:
         return ''
-        
-    # If it starts with 'media/post_images/', treat as a Cloudinary image
-    if image_path.startswith('media/post_images/'):
-        storage = MediaCloudinaryStorage()
-        return storage.url(image_path.replace('media/', '', 1))
-        
-    # Otherwise treat as static
-    return static(image_path)
\ No newline at end of file
+    return resolve_image_url(str(image_path))
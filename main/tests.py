@@ -1,3 +1,1501 @@
-from django.test import TestCase
+import base64
+import json
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from io import BytesIO, StringIO
+from collections import Counter
+from datetime import timedelta
+from pathlib import Path
+from unittest import mock, skipIf
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser, User
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.handlers.asgi import ASGIHandler
+from django.core.management import CommandError, call_command
+from django.core.files.storage import Storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.db.backends.utils import CursorWrapper
+from django.forms.models import model_to_dict
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image
+
+from . import authorstats, bulk, metrics, pagecache, related, scheduler, search, views
+from .benchmark import seed_comments, seed_posts
+from .forms import PostForm
+from .images import preprocess_image
+from .management.commands import bench_routes
+from .management.commands.bench_routes import build_routes, check_coverage, run_routes
+from .mediamigration import Manifest, migrate_post_images
+from .models import EXCERPT_WORDS, AuthorStats, Comment, GalleryImage, MediaAsset, Post, PostQuerySet, RelatedPost, make_excerpt
+from .pagination import CommentPaginator, KeysetPaginator, encode_cursor
+from .storage import DeduplicatingStorageMixin
+from .templatetags import gallery_tags
+from .templatetags.gallery_tags import gallery_image_url
+from .viewcounter import apply_counts, drain_spool, view_buffer
+
+# Keep pending view counts, metrics snapshots and cached pages of a
+# developer's or server's var/ directory out of the test run
+_var = tempfile.TemporaryDirectory()
+_isolated = override_settings(
+    VIEW_COUNTER_SPOOL_DIR=Path(_var.name) / 'views',
+    METRICS_DIR=Path(_var.name) / 'metrics',
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'tests'}},
+)
+
+
+def registry_patchers(registry):
+    """Patchers putting ``registry`` behind the metrics middleware and view."""
+    return [mock.patch.object(metrics, 'registry', registry), mock.patch.object(views, 'registry', registry)]
+
+
+_registry_patchers = registry_patchers(metrics.Registry())
+
+
+def setUpModule():
+    _isolated.enable()
+    for patcher in _registry_patchers:
+        patcher.start()
+
+
+def tearDownModule():
+    # What is left in memory would otherwise be written to var/ at exit
+    view_buffer.spill()
+    for patcher in _registry_patchers:
+        patcher.stop()
+    _isolated.disable()
+    _var.cleanup()
+
+
+class GalleryImageUrlTests(SimpleTestCase):
+    def setUp(self):
+        gallery_tags.clear_image_url_cache()
+
+    def test_static_and_media_paths(self):
+        self.assertEqual(gallery_image_url(''), '')
+        self.assertEqual(gallery_image_url('images/gallery/one.jpg'), '/static/images/gallery/one.jpg')
+        url = gallery_image_url('media/post_images/amaka.jpg')
+        self.assertIn('res.cloudinary.com', url)
+        self.assertIn('post_images/amaka.jpg', url)
+
+    def test_storage_is_built_once(self):
+        with mock.patch.object(gallery_tags, 'MediaCloudinaryStorage') as storage_cls:
+            storage_cls.return_value.url.side_effect = lambda name: f'https://cdn/{name}'
+            for i in range(50):
+                gallery_image_url(f'media/post_images/{i % 5}.jpg')
+        storage_cls.assert_called_once_with()
+        self.assertEqual(storage_cls.return_value.url.call_count, 5)
+
+    def test_cache_cleared_when_settings_change(self):
+        self.assertEqual(gallery_image_url('images/a.jpg'), '/static/images/a.jpg')
+        with override_settings(STATIC_URL='/assets/'):
+            self.assertEqual(gallery_image_url('images/a.jpg'), '/assets/images/a.jpg')
+        self.assertEqual(gallery_image_url('images/a.jpg'), '/static/images/a.jpg')
+
+    def test_1k_calls_match_uncached_urls(self):
+        paths = [f'media/post_images/image{i}.jpg' for i in range(20)]
+        paths += [f'images/gallery/image{i}.jpg' for i in range(20)]
+        calls = [paths[i % len(paths)] for i in range(1000)]
+
+        def uncached(path):
+            # The pre-memoization filter: new storage and URL build per call
+            if path.startswith('media/post_images/'):
+                return gallery_tags.MediaCloudinaryStorage().url(path.replace('media/', '', 1))
+            return gallery_tags.static(path)
+
+        self.assertEqual([gallery_image_url(path) for path in calls], [uncached(path) for path in calls])
+        info = gallery_tags.resolve_image_url.cache_info()
+        self.assertEqual((info.misses, info.hits), (len(paths), 1000 - len(paths)))
+
+
+class FakeStorage(Storage):
+    """In-memory stand-in for the Cloudinary storage."""
+
+    def __init__(self, fail=()):
+        self.files = {}
+        self.fail = set(fail)
+        self.lock = threading.Lock()
+
+    def _save(self, name, content):
+        if Path(name).name in self.fail:
+            raise OSError('upload failed')
+        with self.lock:
+            self.files[name] = content.read()
+        return name
+
+    def exists(self, name):
+        return name in self.files
+
+    def delete(self, name):
+        self.files.pop(name, None)
+
+
+class DeduplicatingFakeStorage(DeduplicatingStorageMixin, FakeStorage):
+    pass
+
+
+class DeduplicatingStorageTests(TestCase):
+    def setUp(self):
+        self.storage = DeduplicatingFakeStorage()
+        field = Post._meta.get_field('image')
+        patcher = mock.patch.object(field, 'storage', self.storage)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.author = User.objects.create_user('writer')
+
+    def create(self, title, content=b'same bytes'):
+        post = Post(title=title, content='Body', author=self.author)
+        post.image.save('photo.jpg', ContentFile(content), save=False)
+        post.save()
+        return post
+
+    def test_identical_uploads_are_stored_once(self):
+        with mock.patch.object(FakeStorage, '_save', autospec=True, side_effect=FakeStorage._save) as backend:
+            first, second = self.create('One'), self.create('Two')
+            other = self.create('Three', b'other bytes')
+        self.assertEqual(backend.call_count, 2)
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertNotEqual(other.image.name, first.image.name)
+        self.assertEqual(
+            list(MediaAsset.objects.order_by('pk').values_list('name', 'references')),
+            [(first.image.name, 2), (other.image.name, 1)],
+        )
+
+    def test_shared_file_kept_until_its_last_owner_lets_go(self):
+        first, second = self.create('One'), self.create('Two')
+        name = first.image.name
+        first.image.delete()
+        self.assertIn(name, self.storage.files)
+        self.assertEqual(MediaAsset.objects.get(name=name).references, 1)
+        self.assertEqual(Post.objects.get(pk=second.pk).image.name, name)
+
+        second.image.delete()
+        self.assertNotIn(name, self.storage.files)
+        self.assertFalse(MediaAsset.objects.exists())
+        # The same bytes uploaded again are stored afresh
+        self.assertIn(self.create('Three').image.name, self.storage.files)
+
+
+class MediaMigrationTests(TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.root = Path(tmp.name)
+        self.sources = [self.root / 'media', self.root / 'blog_images']
+        for directory in self.sources:
+            directory.mkdir()
+        self.manifest_path = self.root / 'manifest.jsonl'
+        self.author = User.objects.create_user('writer')
+
+    def post(self, image, **kwargs):
+        post = Post.objects.create(title=image, content='Body', author=self.author, **kwargs)
+        Post.objects.filter(pk=post.pk).update(image=image)
+        return post
+
+    def migrate(self, storage, **kwargs):
+        return migrate_post_images(storage, Manifest(self.manifest_path), sources=self.sources, workers=4, **kwargs)
+
+    def test_uploads_and_resumes_from_manifest(self):
+        (self.sources[0] / 'amaka.jpg').write_bytes(b'a')
+        (self.sources[1] / 'image3_0MwH2Vt.jpg').write_bytes(b'b')
+        first = self.post('post_images/amaka_OZyuZWz.jpg')
+        second = self.post('post_images/image3.jpg')
+        self.post('post_images/gone.jpg')
+
+        storage = FakeStorage()
+        stats = self.migrate(storage)
+        self.assertEqual((stats['uploaded'], stats['missing'], stats['bytes']), (2, 1, 2))
+        self.assertEqual(storage.files, {'post_images/amaka.jpg': b'a', 'post_images/image3_0MwH2Vt.jpg': b'b'})
+        first.refresh_from_db()
+        self.assertEqual(first.image.name, 'post_images/amaka.jpg')
+
+        # Uploaded but interrupted before the row was written
+        Post.objects.filter(pk=second.pk).update(image='post_images/image3.jpg')
+        storage = FakeStorage()
+        stats = self.migrate(storage)
+        self.assertEqual((stats['uploaded'], stats['skipped'], stats['resumed']), (0, 1, 1))
+        self.assertEqual(storage.files, {})
+        second.refresh_from_db()
+        self.assertEqual(second.image.name, 'post_images/image3_0MwH2Vt.jpg')
+
+    def test_failed_uploads_are_retried_next_run(self):
+        for i in range(20):
+            (self.sources[0] / f'img{i}.jpg').write_bytes(b'x' * i)
+            self.post(f'post_images/img{i}.jpg')
+
+        stats = self.migrate(FakeStorage(fail={'img3.jpg', 'img7.jpg'}))
+        self.assertEqual((stats['uploaded'], stats['failed']), (18, 2))
+
+        storage = FakeStorage()
+        stats = self.migrate(storage)
+        self.assertEqual((stats['uploaded'], stats['skipped']), (2, 18))
+        self.assertEqual(sorted(storage.files), ['post_images/img3.jpg', 'post_images/img7.jpg'])
+
+
+    def test_deduplicating_storage_is_indexed_from_the_main_thread(self):
+        for i, content in enumerate([b'same', b'same', b'other', b'same', b'stored']):
+            (self.sources[0] / f'img{i}.jpg').write_bytes(content)
+            self.post(f'post_images/img{i}.jpg')
+        storage = DeduplicatingFakeStorage()
+        storage.save('post_images/stored.jpg', ContentFile(b'stored'))
+
+        threads = set()
+        execute = CursorWrapper.execute
+
+        def record_thread(cursor, *args, **kwargs):
+            threads.add(threading.current_thread())
+            return execute(cursor, *args, **kwargs)
+
+        with mock.patch.object(CursorWrapper, 'execute', autospec=True, side_effect=record_thread):
+            stats = self.migrate(storage)
+        self.assertEqual(threads, {threading.main_thread()})
+        self.assertEqual((stats['uploaded'], stats['deduplicated'], stats['bytes']), (2, 3, 9))
+        self.assertEqual(sorted(storage.files), ['post_images/img0.jpg', 'post_images/img2.jpg', 'post_images/stored.jpg'])
+        self.assertEqual(
+            list(Post.objects.order_by('pk').values_list('image', flat=True)),
+            ['post_images/img0.jpg', 'post_images/img0.jpg', 'post_images/img2.jpg', 'post_images/img0.jpg',
+             'post_images/stored.jpg'],
+        )
+        self.assertEqual(
+            dict(MediaAsset.objects.values_list('name', 'references')),
+            {'post_images/img0.jpg': 3, 'post_images/img2.jpg': 1, 'post_images/stored.jpg': 2},
+        )
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}})
+class QueryPlanTests(TestCase):
+    """
+    Every Post/Comment query a view runs must be served by an index: no full
+    table scan and no temporary B-tree for ORDER BY.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user('writer', password='secret')
+        categories = [choice for choice, _ in Post.CATEGORY_CHOICES]
+        posts = [
+            Post(
+                title=f'Post {i}', slug=f'post-{i}', content='Body text', author=cls.author,
+                status=['draft', 'published'][i % 2], category=categories[i % len(categories)],
+                image='post_images/plan.jpg',
+            )
+            for i in range(30)
+        ]
+        Post.objects.bulk_create(posts)
+        cls.post = Post.objects.get(slug='post-1')
+        Comment.objects.bulk_create(Comment(post=cls.post, name='Reader', body='Hi') for _ in range(5))
+        cls.cursor = KeysetPaginator(Post.objects.all(), 6).page().next_cursor
+
+    def plans(self, queries):
+        for query in queries:
+            sql = query['sql']
+            if not sql.startswith('SELECT') or not ('"main_post"' in sql or '"main_comment"' in sql):
+                continue
+            with connection.cursor() as cursor:
+                cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+                yield sql, [row[-1] for row in cursor.fetchall()]
+
+    def assertIndexed(self, queries):
+        checked = 0
+        for sql, plan in self.plans(queries):
+            checked += 1
+            for step in plan:
+                full_scan = step.startswith('SCAN ') and ' USING ' not in step
+                self.assertFalse(full_scan, f'Full table scan:\n{sql}\n{plan}')
+                self.assertNotIn('TEMP B-TREE', step, f'Sort without an index:\n{sql}\n{plan}')
+        self.assertGreater(checked, 0)
+
+    def assertViewIndexed(self, url):
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.get(url)
+            if response.streaming:
+                b''.join(response.streaming_content)
+        self.assertEqual(response.status_code, 200)
+        self.assertIndexed(captured.captured_queries)
+
+    def test_public_views(self):
+        urls = [
+            reverse('home'),
+            reverse('blog'),
+            reverse('blog') + f'?after={self.cursor}',
+            reverse('blog') + f'?before={self.cursor}',
+            reverse('post_detail', args=[self.post.slug]),
+            reverse('sitemap'),
+            reverse('sitemap_section', args=[1]),
+        ]
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertViewIndexed(url)
+
+    def test_dashboard_filters(self):
+        self.client.login(username='writer', password='secret')
+        filters = ['', '?status=published', '?category=legal', '?status=draft&category=education']
+        for query in filters:
+            for url in [reverse('dashboard') + query, reverse('dashboard') + (query or '?') + f'&after={self.cursor}']:
+                with self.subTest(url=url):
+                    self.assertViewIndexed(url)
+
+    def test_comments_for_post(self):
+        cursor = CommentPaginator(self.post.comments.all(), 2).page().next_cursor
+        url = reverse('post_comments', args=[self.post.slug])
+        for query in ['', f'?after={cursor}', f'?before={cursor}']:
+            with self.subTest(query=query):
+                self.assertViewIndexed(url + query)
+
+
+@override_settings(COMMENTS_PAGE_SIZE=20, CACHES={'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}})
+class CommentPaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create_user('writer')
+        cls.post = Post.objects.create(title='Popular', slug='popular', content='Body', author=author, status='published', image='post_images/p.jpg')
+        # Bulk inserted with the same created_on, so the pages rely on the id tie-break
+        Comment.objects.bulk_create(Comment(post=cls.post, name=f'Reader {i}', body=f'Comment {i}') for i in range(45))
+
+    def test_first_page_rendered_and_rest_fetched(self):
+        response = self.client.get(reverse('post_detail', args=['popular']))
+        first = list(response.context['comments'])
+        self.assertEqual([c.body for c in first], [f'Comment {i}' for i in range(20)])
+        self.assertContains(response, 'id="comments-more"')
+
+        url = reverse('post_comments', args=['popular'])
+        seen, cursor, pages = [c.pk for c in first], response.context['comments'].next_cursor, []
+        while cursor:
+            data = self.client.get(url, {'after': cursor}).json()
+            pages.append(data['html'].count('class="comment"'))
+            seen += [int(pk) for pk in re.findall(r'id="comment-(\d+)"', data['html'])]
+            cursor = data['next']
+        self.assertEqual(pages, [20, 5])
+        self.assertEqual(seen, list(self.post.comments.values_list('pk', flat=True)))
+
+        data = self.client.get(url, {'before': encode_cursor(Comment.objects.get(body='Comment 20'), 'created_on')}).json()
+        self.assertEqual(data['html'].count('class="comment"'), 20)
+        self.assertIn('Comment 19', data['html'])
+        self.assertIsNone(data['previous'])
+
+
+class RelatedPostsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create_user('writer')
+        start = timezone.now() - timedelta(days=30)
+        topics = [
+            ('Menstrual hygiene in schools', 'Sanitary pads and menstrual hygiene keep girls in school.', 'education'),
+            ('Legal aid for survivors', 'A lawyer and the court process for survivors seeking justice.', 'legal'),
+            ('Pads for every schoolgirl', 'Menstrual hygiene kits and sanitary pads for schoolgirls.', 'education'),
+            ('Inside the family court', 'How the court and a lawyer help survivors get justice.', 'legal'),
+            ('Hygiene clubs', 'Clubs meet weekly to talk about menstrual hygiene.', 'awareness'),
+        ]
+        with mock.patch('main.signals.related.relink'):
+            for i, (title, content, category) in enumerate(topics):
+                Post.objects.create(
+                    title=title, content=content, category=category, status='published', author=author,
+                    created_at=start + timedelta(days=i), image='post_images/p.jpg',
+                )
+            Post.objects.create(title='Draft on menstrual hygiene pads', content='Menstrual hygiene pads.',
+                                author=author, created_at=start + timedelta(days=2, hours=12))
+        cls.posts = list(Post.objects.filter(status='published').order_by('created_at'))
+
+    def setUp(self):
+        cache.clear()
+
+    def test_related_by_similarity_and_category(self):
+        related.rebuild_related(count=2)
+        hygiene, legal = self.posts[0], self.posts[1]
+        self.assertEqual(list(related.related_posts(hygiene)), [self.posts[2], self.posts[4]])
+        self.assertEqual(list(related.related_posts(legal)), [self.posts[3]])
+        self.assertFalse(RelatedPost.objects.filter(related__status='draft').exists())
+
+        response = self.client.get(reverse('post_detail', args=[hygiene.slug]))
+        self.assertContains(response, 'Pads for every schoolgirl')
+
+    def test_pages_showing_a_post_refresh_when_it_changes(self):
+        related.rebuild_related(count=2)
+        url = reverse('post_detail', args=[self.posts[0].slug])
+        first = self.client.get(url)
+        self.assertContains(first, 'Pads for every schoolgirl')
+
+        pads = Post.objects.get(pk=self.posts[2].pk)
+        pads.title = 'Pads for every girl'
+        pads.save()
+        second = self.client.get(url, headers={'If-None-Match': first['ETag']})
+        self.assertEqual(second.status_code, 200)
+        self.assertContains(second, 'Pads for every girl')
+
+        third = self.client.get(url, headers={'If-None-Match': second['ETag']})
+        self.assertEqual(third.status_code, 304)
+        Post.objects.get(pk=self.posts[4].pk).delete()
+        response = self.client.get(url, headers={'If-None-Match': second['ETag']})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotContains(response, 'Hygiene clubs')
+
+    def test_previous_next_links(self):
+        related.link_all()
+        links = [(post.previous_post_id, post.next_post_id) for post in Post.objects.filter(status='published').order_by('created_at')]
+        pks = [post.pk for post in self.posts]
+        self.assertEqual(links, [(None, pks[1]), (pks[0], pks[2]), (pks[1], pks[3]), (pks[2], pks[4]), (pks[3], None)])
+
+        # A post published between the 2nd and 3rd is linked in on save, and out again on delete
+        middle = Post.objects.create(title='Middle', content='Body', author=self.posts[0].author, status='published',
+                                     created_at=self.posts[1].created_at + timedelta(hours=1))
+        middle.refresh_from_db()
+        self.assertEqual((middle.previous_post_id, middle.next_post_id), (pks[1], pks[2]))
+        self.assertEqual(Post.objects.get(pk=pks[1]).next_post_id, middle.pk)
+        self.assertEqual(Post.objects.get(pk=pks[2]).previous_post_id, middle.pk)
+
+        middle.status = 'draft'
+        middle.save()
+        self.assertEqual(Post.objects.get(pk=pks[1]).next_post_id, pks[2])
+        self.assertIsNone(Post.objects.get(pk=middle.pk).previous_post_id)
+
+        middle.status = 'published'
+        middle.save()
+        Post.objects.get(pk=middle.pk).delete()
+        self.assertEqual(Post.objects.get(pk=pks[1]).next_post_id, pks[2])
+        self.assertEqual(Post.objects.get(pk=pks[2]).previous_post_id, pks[1])
+
+
+@override_settings(
+    SITEMAP_MAX_URLS=5,
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'sitemap-tests'}},
+)
+class SitemapTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create_user('writer')
+        Post.objects.bulk_create(
+            Post(title=f'Post {i}', slug=f'post-{i}', content='Body', author=author,
+                 status='draft' if i % 4 == 0 else 'published')
+            for i in range(12)
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def locs(self, response):
+        body = b''.join(response.streaming_content) if response.streaming else response.content
+        return re.findall(r'<loc>http://testserver([^<]*)</loc>', body.decode())
+
+    def test_index_and_sections(self):
+        index = self.client.get(reverse('sitemap'))
+        self.assertContains(index, '<sitemapindex')
+        sections = self.locs(index)
+        self.assertEqual(sections, [reverse('sitemap_section', args=[n]) for n in (1, 2, 3)])
+
+        urls = []
+        for path in sections:
+            response = self.client.get(path)
+            self.assertTrue(response.streaming)
+            section = self.locs(response)
+            self.assertLessEqual(len(section), 5)
+            urls += section
+        published = Post.objects.filter(status='published').order_by('id')
+        self.assertEqual(urls[6:], [reverse('post_detail', args=[post.slug]) for post in published])
+        self.assertNotIn('/blog/post-0/', urls)
+        self.assertEqual(self.client.get(reverse('sitemap_section', args=[4])).status_code, 404)
+
+        # Served from the cache until a post changes
+        self.assertFalse(self.client.get(sections[-1]).streaming)
+        post = Post.objects.get(slug='post-4')
+        post.status = 'published'
+        post.save()
+        self.assertIn('/blog/post-4/', self.locs(self.client.get(sections[1])))
+
+    def test_if_modified_since(self):
+        response = self.client.get(reverse('sitemap_section', args=[1]))
+        last_modified = response['Last-Modified']
+        self.assertEqual(self.client.get(reverse('sitemap'), headers={'If-Modified-Since': last_modified}).status_code, 304)
+
+        with mock.patch('django.utils.timezone.now', return_value=timezone.now() + timedelta(minutes=5)):
+            Post.objects.get(slug='post-1').save()
+        response = self.client.get(reverse('sitemap'), headers={'If-Modified-Since': last_modified})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['Last-Modified'], last_modified)
+
+    def test_delete_moves_validators(self):
+        response = self.client.get(reverse('sitemap'))
+        etag, last_modified = response['ETag'], response['Last-Modified']
+        self.assertEqual(self.client.get(reverse('sitemap'), headers={'If-None-Match': etag}).status_code, 304)
+
+        # No remaining post's updated_at changes when one is deleted
+        with mock.patch('main.pagecache.time.time_ns', return_value=time.time_ns() + 300 * 10**9):
+            Post.objects.get(slug='post-1').delete()
+        response = self.client.get(reverse('sitemap'), headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        response = self.client.get(reverse('sitemap'), headers={'If-Modified-Since': last_modified})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('/blog/post-1/', self.locs(self.client.get(reverse('sitemap_section', args=[2]))))
+
+    def test_sections_are_id_ranges(self):
+        self.client.get(reverse('sitemap'))
+        with CaptureQueriesContext(connection) as queries:
+            b''.join(self.client.get(reverse('sitemap_section', args=[3])).streaming_content)
+        self.assertEqual(len(queries), 1)
+        self.assertNotIn('OFFSET', queries[0]['sql'])
+        self.assertIn('"main_post"."id" >=', queries[0]['sql'])
+
+    @override_settings(ROOT_URLCONF='embracingmain.asgi_urls')
+    async def test_async_stream(self):
+        response = await self.async_client.get('/sitemap-2.xml')
+        self.assertTrue(response.streaming)
+        body = b''.join([chunk async for chunk in response.streaming_content]).decode()
+        slugs = [slug async for slug in Post.objects.filter(status='published').order_by('id').values_list('slug', flat=True)[:4]]
+        self.assertEqual(
+            re.findall(r'<loc>http://testserver([^<]*)</loc>', body),
+            ['/blog/'] + [f'/blog/{slug}/' for slug in slugs],
+        )
+
+
+@override_settings(ROOT_URLCONF='embracingmain.asgi_urls')
+class ASGITests(TestCase):
+    """The ASGI app serves the public pages from the async views, on the event loop."""
+
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create_user('writer')
+        Post.objects.create(title='Post', slug='post', content='Body', author=author, status='published',
+                            image='post_images/p.jpg')
+
+    def setUp(self):
+        view_buffer.flush()
+        self.addCleanup(view_buffer.flush)
+
+    async def get(self, path):
+        response = await self.async_client.get(path)
+        if response.streaming:
+            # Static files stream from a sync iterator
+            return response.status_code, b''.join(response.streaming_content)
+        return response.status_code, response.content
+
+    def test_middleware_chain_is_async(self):
+        # With DEBUG on, Django logs every sync middleware it has to run in a thread
+        with self.settings(DEBUG=True), self.assertNoLogs('django.request', 'DEBUG'):
+            ASGIHandler()
+
+    async def test_public_pages(self):
+        for path in ('/', '/blog/', '/blog/post/'):
+            status, body = await self.get(path)
+            self.assertEqual(status, 200, path)
+            self.assertIn(b'Post', body)
+        self.assertEqual((await self.get('/blog/missing/'))[0], 404)
+
+    async def test_static_files(self):
+        status, body = await self.get('/static/css/blog.css')
+        self.assertEqual(status, 200)
+        self.assertEqual(body, (settings.STATIC_ROOT / 'css' / 'blog.css').read_bytes())
+
+
+def image_upload(size=(64, 48), mode='RGB', fmt='JPEG', name='photo.jpg', **save_kwargs):
+    buffer = BytesIO()
+    Image.new(mode, size, 'red' if mode == 'RGB' else (255, 0, 0, 128)).save(buffer, fmt, **save_kwargs)
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type=f'image/{fmt.lower()}')
+
+
+@override_settings(IMAGE_UPLOAD_MAX_DIMENSION=200, IMAGE_UPLOAD_JPEG_QUALITY=82)
+class ImagePreprocessingTests(SimpleTestCase):
+    def test_downscaled_within_bounds(self):
+        for size, expected in [((800, 600), (200, 150)), ((300, 1200), (50, 200))]:
+            processed, report = preprocess_image(image_upload(size, quality=95))
+            with Image.open(processed) as image:
+                self.assertEqual(image.size, expected)
+            self.assertEqual(report['dimensions'], expected)
+            self.assertLess(report['processed_bytes'], report['original_bytes'])
+
+    def test_exif_orientation_applied_and_stripped(self):
+        exif = Image.Exif()
+        exif[0x0112] = 6  # stored sideways; display rotated 90 degrees
+        processed, _ = preprocess_image(image_upload((120, 60), exif=exif))
+        with Image.open(processed) as image:
+            self.assertEqual(image.size, (60, 120))
+            self.assertFalse(image.getexif())
+
+    def test_output_format_and_quality(self):
+        processed, _ = preprocess_image(image_upload((400, 400), mode='RGBA', fmt='PNG', name='logo.png'))
+        self.assertEqual((processed.name, processed.content_type), ('logo.png', 'image/png'))
+        with Image.open(processed) as image:
+            self.assertEqual((image.format, image.mode), ('PNG', 'RGBA'))
+
+        photo = BytesIO()
+        Image.effect_noise((400, 400), 64).convert('RGB').save(photo, 'BMP')
+        upload = SimpleUploadedFile('scan.bmp', photo.getvalue())
+        low, _ = preprocess_image(upload, quality=30)
+        high, _ = preprocess_image(upload, quality=95)
+        self.assertEqual((low.name, low.content_type), ('scan.jpg', 'image/jpeg'))
+        with Image.open(high) as image:
+            self.assertEqual(image.format, 'JPEG')
+        self.assertLess(low.size, high.size)
+
+    def test_small_animated_and_non_image_uploads_pass_through(self):
+        buffer = BytesIO()
+        Image.effect_noise((40, 40), 64).convert('RGB').save(buffer, 'JPEG', quality=20)
+        small = SimpleUploadedFile('small.jpg', buffer.getvalue())
+        gif = BytesIO()
+        frames = [Image.new('RGB', (300, 300), color) for color in ('red', 'blue')]
+        frames[0].save(gif, 'GIF', save_all=True, append_images=frames[1:])
+        uploads = [small, SimpleUploadedFile('a.gif', gif.getvalue()), SimpleUploadedFile('notes.txt', b'not an image')]
+        for upload in uploads:
+            content = upload.read()
+            processed, report = preprocess_image(upload)
+            self.assertIs(processed, upload)
+            self.assertIsNone(report)
+            self.assertEqual(processed.read(), content)
+
+
+class ExcerptTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user('writer')
+
+    def test_computed_on_save(self):
+        post = Post.objects.create(title='Post', slug='post', content='word ' * 50, author=self.author)
+        self.assertEqual(post.excerpt, make_excerpt('word ' * 50))
+        self.assertEqual(len(Post.objects.get(pk=post.pk).excerpt.split()), EXCERPT_WORDS)
+
+    def test_added_to_update_fields_with_content(self):
+        post = Post.objects.create(title='Post', slug='post', content='Old body', author=self.author)
+        post.content = 'New body'
+        post.save(update_fields=['content'])
+        self.assertEqual(Post.objects.get(pk=post.pk).excerpt, 'New body')
+
+        # A save that does not name content leaves the stored excerpt alone
+        Post.objects.filter(pk=post.pk).update(content='Changed behind its back')
+        post.title = 'Renamed'
+        post.save(update_fields=['title'])
+        self.assertEqual(Post.objects.get(pk=post.pk).excerpt, 'New body')
+
+    def test_listing_instance_keeps_its_excerpt(self):
+        Post.objects.create(title='Post', slug='post', content='Body text', author=self.author)
+        post = Post.objects.for_listing().get(slug='post')
+        with CaptureQueriesContext(connection) as ctx:
+            post.title = 'Renamed'
+            post.save()
+        # Neither loaded to recompute the excerpt nor written back
+        self.assertFalse([q['sql'] for q in ctx.captured_queries if '"content"' in q['sql']])
+        self.assertIn('content', post.get_deferred_fields())
+        stored = Post.objects.get(pk=post.pk)
+        self.assertEqual((stored.title, stored.excerpt, stored.content), ('Renamed', 'Body text', 'Body text'))
+
+
+class SlugAllocationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user('writer')
+
+    def create(self, title='Foo', **fields):
+        return Post.objects.create(title=title, content='Body', author=self.author, **fields)
+
+    def test_numbered_after_the_base(self):
+        self.create(title='Foo Bar')
+        self.create(title='Foobar')
+        self.assertEqual([self.create().slug for _ in range(3)], ['foo', 'foo-1', 'foo-2'])
+        self.assertEqual(self.create(title='!!').slug, 'post')
+
+    def test_numbers_are_not_compared_as_text(self):
+        # foo-10 sorts before foo-2, so the highest slug is not the last one
+        for slug in ['foo', *(f'foo-{n}' for n in range(1, 11) if n != 2)]:
+            self.create(slug=slug)
+        self.assertEqual(self.create().slug, 'foo-2')
+        self.assertEqual(self.create().slug, 'foo-11')
+
+    def test_retries_when_a_concurrent_save_takes_the_slug(self):
+        self.create()
+        # The first lookup misses the slug another request saved in the meantime
+        stale = [set(), Post.objects.taken_slugs(['foo'])]
+        with mock.patch.object(PostQuerySet, 'taken_slugs', side_effect=stale) as taken:
+            post = self.create()
+        self.assertEqual(post.slug, 'foo-1')
+        self.assertEqual(taken.call_count, 2)
+
+    def test_bulk_assignment(self):
+        self.create()
+        posts = [Post(title='Foo', content='Body', author=self.author) for _ in range(3)]
+        posts.append(Post(title='Kept', slug='kept', content='Body', author=self.author))
+        with self.assertNumQueries(1):
+            Post.objects.assign_slugs(posts)
+        self.assertEqual([post.slug for post in posts], ['foo-1', 'foo-2', 'foo-3', 'kept'])
+        Post.objects.bulk_create(posts)
+        self.assertEqual(Post.objects.filter(slug__startswith='foo').count(), 4)
+
+
+@override_settings(GALLERY_PAGE_SIZE=3)
+class GalleryImageAPITests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        # Positions repeat, so pages must break ties on id
+        GalleryImage.objects.bulk_create(
+            GalleryImage(title=f'Image {i}', image=f'gallery/{i}.jpg', width=800, height=600, position=i // 2,
+                         category='events' if i % 3 else 'campaigns')
+            for i in range(8)
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def pages(self, **params):
+        pages, after = [], None
+        while True:
+            data = self.client.get(reverse('gallery_images'), {**params, **({'after': after} if after else {})}).json()
+            pages.append([image['title'] for image in data['images']])
+            after = data['next']
+            if after is None:
+                return pages
+
+    def test_cursor_paging_to_the_end(self):
+        expected = list(GalleryImage.objects.values_list('title', flat=True))
+        pages = self.pages()
+        self.assertEqual([title for page in pages for title in page], expected)
+        self.assertEqual([len(page) for page in pages], [3, 3, 2])
+
+    def test_category_filter(self):
+        pages = self.pages(category='campaigns')
+        self.assertEqual(pages, [['Image 0', 'Image 3', 'Image 6']])
+        self.assertEqual(self.pages(category='school-visits'), [[]])
+
+    def test_exact_last_page_has_no_next(self):
+        GalleryImage.objects.filter(title__in=['Image 6', 'Image 7']).delete()
+        self.assertEqual([len(page) for page in self.pages()], [3, 3])
+        self.assertEqual(self.pages(after='not-a-cursor'), self.pages())
+
+
+class KeysetPaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create_user('writer')
+        start = timezone.now() - timedelta(days=30)
+        # Pairs of posts share a created_at, so pages must break ties on id
+        for i in range(11):
+            Post.objects.create(title=f'Post {i}', slug=f'post-{i}', content='Body', author=author,
+                                status='published', image='post_images/p.jpg', created_at=start + timedelta(days=i // 2))
+        cls.expected = list(Post.objects.order_by('-created_at', '-id').values_list('pk', flat=True))
+
+    def setUp(self):
+        cache.clear()
+
+    def test_after_and_before_walk_every_row_once(self):
+        paginator = KeysetPaginator(Post.objects.all(), 3)
+        pages = [paginator.page()]
+        while pages[-1].has_next:
+            pages.append(paginator.page(after=pages[-1].next_cursor))
+        self.assertEqual([post.pk for page in pages for post in page], self.expected)
+        self.assertEqual([len(page) for page in pages], [3, 3, 3, 2])
+        self.assertFalse(pages[0].has_previous)
+        self.assertIsNone(pages[0].previous_cursor)
+
+        # Walking back from the last page gives the same pages
+        page = pages[-1]
+        for earlier in reversed(pages[:-1]):
+            page = paginator.page(before=page.previous_cursor)
+            self.assertEqual([post.pk for post in page], [post.pk for post in earlier])
+        self.assertFalse(page.has_previous)
+        self.assertTrue(page.has_next)
+
+    def test_malformed_cursors_give_the_first_page(self):
+        first = [post.pk for post in self.client.get(reverse('blog')).context['page_obj']]
+        tampered = [
+            'not-a-cursor', '%%%', encode_cursor(Post.objects.first())[:-3],
+            base64.urlsafe_b64encode(b'yesterday|1').decode(),
+            base64.urlsafe_b64encode(b'2024-01-01T00:00:00|1|2').decode(),
+            base64.urlsafe_b64encode(b'2024-01-01T00:00:00|99999999999999999999999').decode(),
+            base64.urlsafe_b64encode(b'\xff\xfe').decode(),
+        ]
+        for cursor in tampered:
+            for param in ('after', 'before'):
+                with self.subTest(cursor=cursor, param=param):
+                    response = self.client.get(reverse('blog'), {param: cursor})
+                    self.assertEqual(response.status_code, 200)
+                    self.assertEqual([post.pk for post in response.context['page_obj']], first)
+
+
+class SearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create_user('writer')
+        cls.title = Post.objects.create(title='Education for every girl', slug='title', author=author,
+                                        content='Schools and teachers in rural communities.')
+        cls.body = Post.objects.create(title='Annual report', slug='body', author=author,
+                                       content='Our programmes keep girls in education through secondary school.')
+        Post.objects.create(title='Legal aid', slug='other', author=author, content='Courts and lawyers.')
+
+    def found(self, query):
+        return [post.slug for post in search.search_posts(query)]
+
+    def test_title_matches_rank_first_and_are_highlighted(self):
+        self.assertEqual(self.found('education'), ['title', 'body'])
+        result = search.search_posts('education')[0]
+        self.assertIn('<mark>Education</mark>', result.search_title)
+
+    def test_whole_words_match_other_forms(self):
+        self.assertEqual(self.found('girls education'), ['title', 'body'])
+        self.assertEqual(self.found('teacher'), ['title'])
+
+    def test_last_word_matches_as_it_is_typed(self):
+        # Each prefix of "education", including ones longer than its stem "educ"
+        for prefix in ('edu', 'educat', 'educati', 'educatio'):
+            with self.subTest(prefix=prefix):
+                self.assertEqual(self.found(prefix), ['title', 'body'])
+        self.assertEqual(self.found('girls secon'), ['body'])
+        self.assertEqual(self.found('secon girls'), [])
+
+    def test_empty_and_punctuation_queries(self):
+        for query in ('', '   ', '?!', '"*()-', '"^:('):
+            with self.subTest(query=query):
+                self.assertEqual(search.match_expression(query), '')
+                self.assertEqual(self.found(query), [])
+                self.assertFalse(search.filter_posts(Post.objects.all(), query).exists())
+        # FTS5 operators typed as words are searched for, not parsed
+        self.assertEqual(self.found('courts AND'), ['other'])
+        self.assertEqual(self.found('courts NOT'), [])
+
+    def test_index_follows_updates_and_deletes(self):
+        Post.objects.filter(slug='other').update(title='Scholarship fund')
+        self.assertEqual(self.found('scholar'), ['other'])
+        self.assertEqual(self.found('legal'), [])
+        post = Post.objects.get(slug='body')
+        post.content = 'Nothing to see.'
+        post.save()
+        self.assertEqual(self.found('secondary'), [])
+        Post.objects.get(slug='title').delete()
+        self.assertEqual(self.found('education'), [])
+        self.assertEqual(search.filter_posts(Post.objects.all(), 'scholarship').get().slug, 'other')
+
+
+class PageCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user('writer')
+        cls.post = Post.objects.create(title='Post', slug='post', content='Body', author=cls.author,
+                                       status='published', image='post_images/p.jpg')
+
+    def setUp(self):
+        cache.clear()
+        view_buffer.flush()
+        self.addCleanup(view_buffer.flush)
+
+    def cached(self, url):
+        return self.client.get(url)['X-Page-Cache']
+
+    def test_miss_then_hit_and_counters(self):
+        pagecache.reset_stats(['home'])
+        self.assertEqual([self.cached(reverse('home')) for _ in range(3)], ['MISS', 'HIT', 'HIT'])
+        self.client.force_login(self.author)
+        self.assertNotIn('X-Page-Cache', self.client.get(reverse('home')))
+        self.assertEqual(pagecache.stats(['home'])['home'], {'hit': 2, 'miss': 1, 'bypass': 1})
+
+    def test_saves_invalidate_tagged_pages(self):
+        home, detail = reverse('home'), reverse('post_detail', args=['post'])
+        for url in (home, detail):
+            self.cached(url)
+            self.assertEqual(self.cached(url), 'HIT')
+
+        Comment.objects.create(post=self.post, name='Ada', body='Hi')
+        self.assertEqual(self.cached(home), 'HIT')
+        self.assertEqual(self.cached(detail), 'MISS')
+
+        post = Post.objects.get(pk=self.post.pk)
+        post.title = 'Renamed'
+        post.save()
+        self.assertEqual(self.cached(home), 'MISS')
+        self.assertContains(self.client.get(detail), 'Renamed')
+
+    def test_renaming_a_neighbour_invalidates_its_previous_next_links(self):
+        Post.objects.create(title='Alpha', slug='alpha', content='Body', author=self.author, status='published',
+                            image='post_images/a.jpg')
+        Post.objects.create(title='Bravo', slug='bravo', content='Body', author=self.author, status='published',
+                            image='post_images/b.jpg')
+        alpha = reverse('post_detail', args=['alpha'])
+        self.assertContains(self.client.get(alpha), 'Bravo')
+        self.assertEqual(self.cached(alpha), 'HIT')
+
+        bravo = Post.objects.get(slug='bravo')
+        bravo.title = 'Charlie'
+        bravo.save()
+        response = self.client.get(alpha)
+        self.assertEqual(response['X-Page-Cache'], 'MISS')
+        self.assertContains(response, 'Charlie')
+        self.assertNotContains(response, 'Bravo')
+
+    def test_responses_setting_cookies_are_not_stored(self):
+        def view(request):
+            response = HttpResponse('Hi')
+            response.set_cookie('seen', '1')
+            return response
+
+        cached_view = pagecache.cache_public_page()(view)
+        for _ in range(2):
+            request = RequestFactory().get('/cookie/')
+            request.user = AnonymousUser()
+            self.assertEqual(cached_view(request)['X-Page-Cache'], 'MISS')
+
+
+class CommentCountTests(TestCase):
+    def test_saving_a_stale_instance_keeps_new_comments(self):
+        author = User.objects.create_user('writer')
+        post = Post.objects.create(title='Post', slug='post', content='Body', author=author)
+        # An editor opens the form, then a reader comments
+        stale = Post.objects.get(pk=post.pk)
+        Comment.objects.create(post=post, name='Ada', body='Hi')
+        form = PostForm({'title': 'Renamed', 'content': 'Body', 'status': 'draft'}, instance=stale)
+        self.assertTrue(form.is_valid(), form.errors)
+        form.save()
+        post.refresh_from_db()
+        self.assertEqual((post.title, post.comment_count), ('Renamed', 1))
+        self.assertEqual(stale.comment_count, 1)
+        self.assertEqual(AuthorStats.objects.get(pk=author.pk).comments, 1)
+
+
+class ViewCounterTests(TestCase):
+    def test_drain_reads_slug_and_post_id_spool_files(self):
+        author = User.objects.create_user('writer')
+        post = Post.objects.create(title='Post', slug='post', content='Body', author=author)
+        numeric = Post.objects.create(title='2024', slug='2024', content='Body', author=author)
+        with tempfile.TemporaryDirectory() as directory:
+            Path(directory, 'new.views').write_text('post 2\n2024 1\n')
+            # Written before views were keyed by slug
+            Path(directory, 'old.views').write_text(f'{post.pk} 3\n')
+            self.assertEqual(drain_spool(directory), 6)
+            self.assertEqual(list(Path(directory).iterdir()), [])
+        self.assertEqual(Post.objects.get(pk=post.pk).views, 5)
+        self.assertEqual(Post.objects.get(pk=numeric.pk).views, 1)
+        self.assertEqual(AuthorStats.objects.get(pk=author.pk).views, 6)
+
+    def test_saving_a_stale_instance_keeps_flushed_views(self):
+        author = User.objects.create_user('writer')
+        post = Post.objects.create(title='Post', slug='post', content='Body', author=author)
+        stale = Post.objects.get(pk=post.pk)
+        apply_counts(Counter({'post': 4}))
+        stale.title = 'Renamed'
+        stale.save()
+        post.refresh_from_db()
+        self.assertEqual((post.title, post.views, stale.views), ('Renamed', 4, 4))
+        self.assertEqual(AuthorStats.objects.get(pk=author.pk).views, 4)
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'conditional-tests'}})
+class ConditionalGetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user('writer')
+        cls.post = Post.objects.create(title='Post', slug='post', content='Body', author=cls.author,
+                                       status='published', image='post_images/p.jpg')
+        cls.url = reverse('post_detail', args=['post'])
+
+    def setUp(self):
+        cache.clear()
+        view_buffer.flush()
+
+    def revalidate(self, url, response, **headers):
+        return self.client.get(url, headers={'If-None-Match': response['ETag'], **headers})
+
+    def test_post_page(self):
+        first = self.client.get(self.url)
+        self.assertIn('ETag', first)
+        self.assertIn('Last-Modified', first)
+        with self.assertNumQueries(1):  # just the validators
+            self.assertEqual(self.revalidate(self.url, first).status_code, 304)
+        self.assertEqual(
+            self.client.get(self.url, headers={'If-Modified-Since': first['Last-Modified']}).status_code, 304
+        )
+        view_buffer.flush()
+        self.assertEqual(Post.objects.get(pk=self.post.pk).views, 3)
+
+        # A new comment changes the page; a visitor's cookies do not
+        with mock.patch('django.utils.timezone.now', return_value=timezone.now() + timedelta(minutes=5)):
+            Comment.objects.create(post=self.post, name='Ada', body='Hi')
+        second = self.revalidate(self.url, first)
+        self.assertEqual(second.status_code, 200)
+        self.assertNotEqual(second['ETag'], first['ETag'])
+        self.assertNotEqual(second['Last-Modified'], first['Last-Modified'])
+        self.client.cookies['csrftoken'] = 'x' * 32
+        self.assertEqual(self.revalidate(self.url, second).status_code, 304)
+
+        self.client.force_login(self.author)
+        response = self.revalidate(self.url, second)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('ETag', response)
+
+    def test_blog_page(self):
+        first = self.client.get(reverse('blog'))
+        self.assertEqual(self.revalidate(reverse('blog'), first).status_code, 304)
+        Post.objects.filter(pk=self.post.pk).update(title='Renamed', updated_at=timezone.now() + timedelta(minutes=5))
+        self.assertEqual(self.revalidate(reverse('blog'), first).status_code, 200)
+
+    def test_renaming_a_neighbour_changes_etag(self):
+        Post.objects.create(title='Bravo', slug='bravo', content='Body', author=self.author, status='published',
+                            image='post_images/b.jpg')
+        first = self.client.get(self.url)
+        self.assertContains(first, 'Bravo')
+        self.assertEqual(self.revalidate(self.url, first).status_code, 304)
+
+        bravo = Post.objects.get(slug='bravo')
+        bravo.title = 'Charlie'
+        bravo.save()
+        second = self.revalidate(self.url, first)
+        self.assertEqual(second.status_code, 200)
+        self.assertContains(second, 'Charlie')
+
+    def test_missing_post(self):
+        self.assertEqual(self.client.get(reverse('post_detail', args=['nope'])).status_code, 404)
+
+    def test_deploy_changes_etag(self):
+        with self.settings(SITE_VERSION='abc123'):
+            first = self.client.get(self.url)
+            self.assertEqual(self.revalidate(self.url, first).status_code, 304)
+        with self.settings(SITE_VERSION='def456'):
+            second = self.revalidate(self.url, first)
+        self.assertEqual(second.status_code, 200)
+        self.assertEqual(second['X-Page-Cache'], 'MISS')
+        self.assertNotEqual(second['ETag'], first['ETag'])
+
+
+@override_settings(
+    COMMENT_THROTTLE_RATE=2, COMMENT_THROTTLE_WINDOW=60,
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'comment-tests'}},
+)
+class CommentSubmissionTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create_user('writer')
+        cls.post = Post.objects.create(title='Post', slug='post', content='Body', author=author, status='published', image='post_images/p.jpg')
+
+    def setUp(self):
+        cache.clear()
+        self.client = self.client_class(enforce_csrf_checks=True)
+        self.url = reverse('post_comment', args=['post'])
+
+    def submit(self, data, **headers):
+        return self.client.post(self.url, data, headers={'X-Requested-With': 'XMLHttpRequest', **headers})
+
+    def test_returns_fragment_and_count(self):
+        response = self.submit({'name': 'Ada', 'body': '<b>Hello</b>'})
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertTrue(data['success'])
+        self.assertEqual(data['count'], 1)
+        self.assertIn('&lt;b&gt;Hello&lt;/b&gt;', data['html'])
+        self.assertNotIn('<html', data['html'])
+        self.assertEqual(self.post.comments.get().name, 'Ada')
+
+    def test_rejects_invalid_and_non_ajax(self):
+        response = self.submit({'name': 'Ada'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('body', response.json()['errors'])
+        self.assertEqual(self.client.post(self.url, {'name': 'Ada', 'body': 'Hi'}).status_code, 400)
+        self.assertFalse(self.post.comments.exists())
+
+    def test_throttled_per_ip(self):
+        for _ in range(2):
+            self.assertEqual(self.submit({'name': 'Ada', 'body': 'Hi'}).status_code, 200)
+        response = self.submit({'name': 'Ada', 'body': 'Hi'})
+        self.assertEqual(response.status_code, 429)
+        self.assertGreater(int(response['Retry-After']), 0)
+        other = self.client.post(self.url, {'name': 'Bo', 'body': 'Hi'}, REMOTE_ADDR='10.0.0.2',
+                                 headers={'X-Requested-With': 'XMLHttpRequest'})
+        self.assertEqual(other.status_code, 200)
+        self.assertEqual(self.post.comments.count(), 3)
+
+    @override_settings(TRUSTED_PROXY_COUNT=1)
+    def test_throttled_per_client_behind_proxy(self):
+        # Every request arrives from the proxy, which appends the client's address
+        def submit(forwarded):
+            return self.submit({'name': 'Ada', 'body': 'Hi'}, **{'X-Forwarded-For': forwarded})
+
+        for forwarded in ('203.0.113.1', '1.2.3.4, 203.0.113.1'):
+            self.assertEqual(submit(forwarded).status_code, 200)
+        # A made-up address on the left does not escape the limit
+        self.assertEqual(submit('5.6.7.8, 203.0.113.1').status_code, 429)
+        self.assertEqual(submit('203.0.113.2').status_code, 200)
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}})
+class BulkActionTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user('writer')
+        cls.other = User.objects.create_user('other')
+        start = timezone.now() - timedelta(days=100)
+        cls.pks = [
+            Post.objects.create(title=f'Post {i}', slug=f'post-{i}', content='Body', author=cls.author,
+                                status='published' if i < 6 else 'draft', created_at=start + timedelta(days=i)).pk
+            for i in range(40)
+        ]
+        cls.foreign = Post.objects.create(title='Theirs', slug='theirs', content='Body', author=cls.other, status='draft')
+        related.link_all()
+
+    def setUp(self):
+        self.client.force_login(self.author)
+
+    def bulk(self, action, pks, **data):
+        return self.client.post(reverse('post_bulk'), {'action': action, 'ids': pks, **data},
+                                headers={'X-Requested-With': 'XMLHttpRequest'})
+
+    def test_query_count_independent_of_selection(self):
+        with CaptureQueriesContext(connection) as few:
+            self.bulk('recategorize', self.pks[6:8], category='legal')
+        with CaptureQueriesContext(connection) as many:
+            self.bulk('recategorize', self.pks[8:40], category='legal')
+        self.assertEqual(len(few), len(many))
+        self.assertEqual(Post.objects.filter(category='legal').count(), 34)
+
+        with CaptureQueriesContext(connection) as few:
+            self.bulk('delete', self.pks[6:8])
+        with CaptureQueriesContext(connection) as many:
+            self.bulk('delete', self.pks[8:40])
+        self.assertEqual(len(few), len(many))
+
+    def test_publish_archive_and_links(self):
+        # The table comes back filtered the way the dashboard is showing it
+        response = self.bulk('publish', [*self.pks[6:9], self.foreign.pk], status='published')
+        self.assertEqual(response.json()['count'], 3)
+        self.assertIn('post-row-%d' % self.pks[8], response.json()['html'])
+        self.assertIn('of 9 posts', response.json()['html'])
+        self.assertEqual(response.json()['stats']['total_posts'], 40)
+        self.assertEqual(Post.objects.get(pk=self.foreign.pk).status, 'draft')
+        self.assertEqual(Post.objects.get(pk=self.pks[5]).next_post_id, self.pks[6])
+        # Publishing again changes nothing
+        self.assertEqual(self.bulk('publish', self.pks[6:9]).json()['count'], 0)
+
+        self.bulk('archive', self.pks[4:7])
+        self.assertEqual(Post.objects.get(pk=self.pks[3]).next_post_id, self.pks[7])
+        self.assertEqual(Post.objects.get(pk=self.pks[7]).previous_post_id, self.pks[3])
+        self.assertIsNone(Post.objects.get(pk=self.pks[5]).next_post_id)
+
+        # Past RELINK_LIMIT every link is recomputed at once
+        self.bulk('publish', self.pks[9:40])
+        self.assertEqual(Post.objects.get(pk=self.pks[39]).previous_post_id, self.pks[38])
+        self.assertEqual(Post.objects.get(pk=self.pks[8]).next_post_id, self.pks[9])
+
+    def test_delete(self):
+        Comment.objects.create(post_id=self.pks[1], name='Ada', body='Hi')
+        Comment.objects.create(post_id=self.pks[2], name='Bo', body='Hi')
+        RelatedPost.objects.create(post_id=self.pks[0], related_id=self.pks[1], rank=0, score=1)
+        # The comments go in one DELETE instead of being loaded for the collector
+        with mock.patch.object(Comment, 'from_db', side_effect=AssertionError('comments were loaded')):
+            self.assertEqual(self.bulk('delete', self.pks[1:3]).json()['count'], 2)
+        self.assertFalse(Post.objects.filter(pk__in=self.pks[1:3]).exists())
+        self.assertFalse(Comment.objects.exists())
+        self.assertFalse(RelatedPost.objects.exists())
+        self.assertEqual(Post.objects.get(pk=self.pks[0]).next_post_id, self.pks[3])
+        self.assertFalse({post.pk for post in search.search_posts('Post', limit=100)} & set(self.pks[1:3]))
+        # The muted receivers did not count the posts or the comment off a second time
+        stats = model_to_dict(authorstats.for_author(self.author))
+        authorstats.rebuild()
+        self.assertEqual(stats, model_to_dict(authorstats.for_author(self.author)))
+
+    def test_rejects_unknown_action(self):
+        self.assertEqual(self.bulk('explode', self.pks[:2]).status_code, 400)
+        self.assertEqual(self.bulk('recategorize', self.pks[:2], category='nonsense').status_code, 400)
+        self.assertEqual(self.client.get(reverse('post_bulk')).status_code, 405)
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}})
+class AuthorStatsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user('writer')
+        cls.other = User.objects.create_user('other')
+
+    def stats(self, author):
+        return model_to_dict(authorstats.for_author(author))
+
+    def assertMatchesRebuild(self, *authors):
+        incremental = [self.stats(author) for author in authors]
+        authorstats.rebuild()
+        self.assertEqual(incremental, [self.stats(author) for author in authors])
+
+    def test_signals_keep_stats_current(self):
+        post = Post.objects.create(title='One', slug='one', content='Body', author=self.author, category='legal')
+        Post.objects.create(title='Two', slug='two', content='Body', author=self.author, status='published')
+        Comment.objects.create(post=post, name='Ada', body='Hi')
+        Comment.objects.create(post=post, name='Bo', body='Hi')
+        stats = self.stats(self.author)
+        self.assertEqual((stats['posts'], stats['draft_posts'], stats['published_posts']), (2, 1, 1))
+        self.assertEqual((stats['legal_posts'], stats['uncategorized_posts'], stats['comments']), (1, 1, 2))
+
+        post = Post.objects.get(pk=post.pk)
+        post.status, post.category = 'published', 'education'
+        post.save()
+        post.comments.first().delete()
+        self.assertMatchesRebuild(self.author)
+
+        post.author = self.other
+        post.save()
+        self.assertMatchesRebuild(self.author, self.other)
+        Post.objects.get(slug='one').delete()
+        self.assertEqual(self.stats(self.other)['posts'], 0)
+        self.assertMatchesRebuild(self.author, self.other)
+
+    def test_view_counter_and_bulk_actions(self):
+        for i in range(4):
+            Post.objects.create(title=f'Post {i}', slug=f'post-{i}', content='Body', author=self.author)
+        apply_counts(Counter({'post-0': 3, 'post-1': 2}))
+        self.assertEqual(self.stats(self.author)['views'], 5)
+
+        bulk.apply(Post.objects.filter(slug__in=['post-0', 'post-1']), 'publish')
+        bulk.apply(Post.objects.filter(slug='post-2'), 'recategorize', 'legal')
+        self.assertMatchesRebuild(self.author)
+        bulk.apply(Post.objects.filter(slug__in=['post-0', 'post-2']), 'delete')
+        self.assertEqual(self.stats(self.author)['views'], 2)
+        self.assertMatchesRebuild(self.author)
+
+    def test_deleting_an_author(self):
+        post = Post.objects.create(title='One', slug='one', content='Body', author=self.author, status='published')
+        Post.objects.create(title='Two', slug='two', content='Body', author=self.author)
+        Comment.objects.create(post=post, name='Ada', body='Hi')
+        self.stats(self.author)
+        self.author.delete()
+        self.assertFalse(AuthorStats.objects.filter(pk=self.author.pk).exists())
+        connection.check_constraints()
+
+    def test_dashboard_header_is_one_lookup(self):
+        for i in range(3):
+            Post.objects.create(title=f'Post {i}', slug=f'post-{i}', content='Body', author=self.author,
+                                status='published' if i else 'draft')
+        self.client.force_login(self.author)
+        self.client.get(reverse('dashboard'))  # builds nothing: the signals already did
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('dashboard'), {'status': 'published'})
+        self.assertEqual(response.context['total_posts'], 3)
+        self.assertEqual(response.context['matching_posts'], 2)
+        stats_queries = [q['sql'] for q in ctx.captured_queries if 'main_authorstats' in q['sql']]
+        self.assertEqual(len(stats_queries), 1)
+        self.assertFalse([q['sql'] for q in ctx.captured_queries if 'COUNT(' in q['sql'] or 'SUM(' in q['sql']])
+
+
+class GenerateDataTests(TestCase):
+    options = {'posts': 7, 'authors': 3, 'comments_per_post': 2, 'chunk_size': 3, 'batch_size': 4, 'seed': 5}
+
+    def generate(self):
+        call_command('generate_data', stdout=StringIO(), **self.options)
+        posts = Post.objects.order_by('slug')
+        return (
+            list(posts.values_list('slug', 'title', 'content', 'status', 'category', 'views', 'comment_count',
+                                   'author__username')),
+            list(Comment.objects.order_by('post__slug', 'name', 'body').values_list('post__slug', 'name', 'body')),
+        )
+
+    def test_seeded_run_creates_the_requested_counts(self):
+        posts, comments = self.generate()
+        self.assertEqual(len(posts), 7)
+        self.assertEqual(User.objects.filter(username__startswith='g5-author-').count(), 3)
+        self.assertEqual(len(comments), sum(post[6] for post in posts))
+        self.assertFalse([post for post in posts if post[3] != 'published' and post[6]])
+        with self.assertRaises(CommandError):
+            call_command('generate_data', stdout=StringIO(), **self.options)
+
+    def test_same_seed_generates_the_same_data(self):
+        first = self.generate()
+        Post.objects.all().delete()
+        User.objects.all().delete()
+        self.assertEqual(self.generate(), first)
+        self.options = {**self.options, 'seed': 6}
+        Post.objects.all().delete()
+        self.assertNotEqual([post[1] for post in self.generate()[0]], [post[1] for post in first[0]])
+
+
+@override_settings(
+    SITE_URL='http://testserver',
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'publishing-tests'}},
+)
+class PublishingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user('writer')
+        for status in ('published', 'draft', 'archived'):
+            Post.objects.create(title=status.title(), slug=status, content='Body', author=cls.author, status=status,
+                                image='post_images/p.jpg')
+
+    def setUp(self):
+        cache.clear()
+        view_buffer.flush()
+        self.addCleanup(view_buffer.flush)
+
+    def test_only_published_posts_are_public(self):
+        self.assertEqual([post.slug for post in self.client.get(reverse('home')).context['posts']], ['published'])
+        self.assertEqual([post.slug for post in self.client.get(reverse('blog')).context['posts']], ['published'])
+        sitemap = b''.join(self.client.get(reverse('sitemap')).streaming_content).decode()
+        self.assertIn('/blog/published/', sitemap)
+        self.assertNotIn('/blog/draft/', sitemap)
+        for slug in ('draft', 'archived'):
+            self.assertEqual(self.client.get(reverse('post_detail', args=[slug])).status_code, 404)
+            self.assertEqual(self.client.get(reverse('post_comments', args=[slug])).status_code, 404)
+        # Authors can still preview their own drafts
+        self.client.force_login(self.author)
+        self.assertEqual(self.client.get(reverse('post_detail', args=['draft'])).status_code, 200)
+
+    def test_publish_due(self):
+        now = timezone.now()
+        Post.objects.filter(slug='draft').update(publish_at=now - timedelta(minutes=1))
+        Post.objects.create(title='Later', slug='later', content='Body', author=self.author, publish_at=now + timedelta(hours=1))
+
+        self.assertEqual(scheduler.publish_due(now), ['draft'])
+        post = Post.objects.get(slug='draft')
+        self.assertEqual((post.status, post.created_at, post.publish_at), ('published', now - timedelta(minutes=1), None))
+        self.assertEqual(Post.objects.get(slug='published').previous_post_id, post.pk)
+        self.assertEqual(Post.objects.get(slug='later').status, 'draft')
+        self.assertEqual(scheduler.publish_due(now), [])
+
+        # Pre-warmed, and the warm-up is not a view
+        for url in (reverse('home'), reverse('blog'), reverse('post_detail', args=['draft'])):
+            self.assertEqual(self.client.get(url)['X-Page-Cache'], 'HIT')
+        view_buffer.flush()
+        self.assertEqual(Post.objects.get(slug='draft').views, 1)
+
+    @override_settings(SITE_URL='https://embracingthegirlchild.org.ng')
+    def test_prewarmed_pages_are_hit_behind_the_proxy(self):
+        Post.objects.filter(slug='draft').update(publish_at=timezone.now() - timedelta(minutes=1))
+        self.assertEqual(scheduler.publish_due(), ['draft'])
+        # Render's proxy forwards plain http, with or without X-Forwarded-Proto
+        for headers in ({}, {'X-Forwarded-Proto': 'https'}):
+            for url in (reverse('home'), reverse('blog'), reverse('post_detail', args=['draft'])):
+                response = self.client.get(url, headers={'Host': 'embracingthegirlchild.org.ng', **headers})
+                self.assertEqual(response['X-Page-Cache'], 'HIT')
+
+    def test_scheduling_form_keeps_post_a_draft(self):
+        form = PostForm({'title': 'Soon', 'content': 'Body', 'status': 'published',
+                         'publish_at': (timezone.localtime() + timedelta(days=1)).strftime('%Y-%m-%dT%H:%M')})
+        self.assertTrue(form.is_valid(), form.errors)
+        self.assertEqual(form.cleaned_data['status'], 'draft')
+        self.assertEqual(scheduler.build_scheduler().get_job('publish_due').trigger.interval, timedelta(seconds=60))
+
+    def test_scheduling_form_does_not_unpublish(self):
+        post = Post.objects.get(slug='published')
+        tomorrow = (timezone.localtime() + timedelta(days=1)).strftime('%Y-%m-%dT%H:%M')
+        form = PostForm({'title': post.title, 'content': post.content, 'status': 'published', 'publish_at': tomorrow},
+                        instance=post)
+        self.assertFalse(form.is_valid())
+        self.assertIn('publish_at', form.errors)
+        self.assertEqual(Post.objects.get(pk=post.pk).status, 'published')
+
+
+class MetricsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user('writer')
+        Post.objects.create(title='Post', slug='post', content='Body', author=cls.author, status='published',
+                            image='post_images/p.jpg')
+
+    def setUp(self):
+        cache.clear()
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.directory = Path(tmp.name)
+        self.registry = metrics.Registry()
+        for patcher in registry_patchers(self.registry):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        override = self.settings(METRICS_DIR=self.directory)
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def record(self, **fields):
+        return {'queries': 0, 'query_seconds': 0.0, 'template_seconds': 0.0, 'bytes': 0, **fields}
+
+    def test_middleware_records_each_route(self):
+        home = self.client.get(reverse('home'))
+        self.client.get(reverse('post_detail', args=['post']))
+        self.client.get('/no-such-page/')
+        snapshot = self.registry.snapshot()
+        self.assertEqual(sorted(map(tuple, snapshot['requests'])), [
+            (metrics.UNMATCHED, 'GET', '404', 1), ('home', 'GET', '200', 1), ('post_detail', 'GET', '200', 1),
+        ])
+        totals = snapshot['routes']['home']
+        self.assertEqual((totals['count'], sum(totals['buckets']), totals['bytes']), (1, 1, len(home.content)))
+        self.assertGreater(totals['queries'], 0)
+        self.assertGreater(totals['template_seconds'], 0)
+
+    def test_snapshots_summed_and_rendered(self):
+        first, second = metrics.Registry(), metrics.Registry()
+        first.observe('home', 'GET', 200, 0.02, self.record(queries=2, bytes=100))
+        second.observe('home', 'GET', 200, 0.3, self.record(queries=3, bytes=50))
+        second.observe('say "hi"', 'POST', 403, 20, self.record())
+        for registry in (first, second):
+            registry.flush(self.directory)
+        self.assertEqual(len(list(self.directory.iterdir())), 2)
+
+        body = metrics.render_prometheus(*metrics.collect(self.directory))
+        for line in [
+            'http_requests_total{route="home",method="GET",status="200"} 2',
+            'http_requests_total{route="say \\"hi\\"",method="POST",status="403"} 1',
+            'http_request_duration_seconds_bucket{route="home",le="0.01"} 0',
+            'http_request_duration_seconds_bucket{route="home",le="0.025"} 1',
+            'http_request_duration_seconds_bucket{route="home",le="0.5"} 2',
+            'http_request_duration_seconds_bucket{route="home",le="+Inf"} 2',
+            'http_request_duration_seconds_count{route="home"} 2',
+            'http_request_duration_seconds_bucket{route="say \\"hi\\"",le="10.0"} 0',
+            'http_request_duration_seconds_bucket{route="say \\"hi\\"",le="+Inf"} 1',
+            'db_queries_total{route="home"} 5',
+            'http_response_bytes_total{route="home"} 150',
+        ]:
+            self.assertIn(line, body.splitlines())
+
+    def write_snapshot(self, pid, route, queries):
+        registry = metrics.Registry()
+        registry.observe(route, 'GET', 200, 0.02, self.record(queries=queries))
+        path = self.directory / f'{pid}-{route}{metrics.SNAPSHOT_SUFFIX}'
+        path.write_text(json.dumps(registry.snapshot()))
+        return path
+
+    @skipIf(os.name == 'nt', 'worker liveness is not checked on Windows')
+    def test_exited_workers_are_adopted(self):
+        exited = subprocess.Popen([sys.executable, '-c', 'pass'])
+        exited.wait()
+        running = subprocess.Popen([sys.executable, '-c', 'import time; time.sleep(60)'])
+        self.addCleanup(running.wait)
+        self.addCleanup(running.kill)
+        old = self.write_snapshot(exited.pid, 'home', 2)
+        live = self.write_snapshot(running.pid, 'blog', 3)
+
+        self.registry.observe('home', 'GET', 200, 0.02, self.record(queries=1))
+        self.registry.flush()
+        self.assertFalse(old.exists())
+        self.assertTrue(live.exists())
+        self.assertEqual(len(list(self.directory.iterdir())), 2)
+        requests, routes = metrics.collect()
+        self.assertEqual((requests[('home', 'GET', '200')], routes['home']['queries']), (2, 3))
+        self.assertEqual(routes['blog']['queries'], 3)
+
+    def test_access(self):
+        url = reverse('metrics')
+        # The test client's REMOTE_ADDR is 127.0.0.1, as every request is behind a local proxy
+        self.assertEqual(self.client.get(url).status_code, 404)
+        self.assertEqual(self.client.get(url, headers={'Authorization': 'Bearer '}).status_code, 404)
+        with self.settings(METRICS_TOKEN='secret'):
+            self.assertEqual(self.client.get(url, headers={'Authorization': 'Bearer wrong'}).status_code, 404)
+            response = self.client.get(url, headers={'Authorization': 'Bearer secret'})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        self.assertIn('http_requests_total{route="metrics",method="GET",status="404"} 3', response.content.decode())
+
+        self.client.force_login(User.objects.create_user('staff', is_staff=True))
+        self.assertEqual(self.client.get(url).status_code, 200)
+
+
+@override_settings(
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}}, METRICS_TOKEN=bench_routes.METRICS_TOKEN,
+)
+class RouteBenchmarkTests(TransactionTestCase):
+    """The bench_routes harness covers every route and each one responds without error."""
+
+    def test_every_route_on_a_small_dataset(self):
+        author = seed_posts(30, authors=2)[0]
+        seed_comments(2)
+        routes = build_routes(author)
+        check_coverage(routes)
+
+        results = run_routes(routes, author, requests=2, concurrency=1)
+        self.assertEqual([row['label'] for row in results], [route.label for route in routes])
+        for row in results:
+            self.assertEqual(row['errors'], 0, row['label'])
+            self.assertEqual(row['requests'], 2)
@@ -0,0 +1,49 @@
+"""
+Fixed-window rate limits counted in the cache, so every worker shares them.
+
+    wait = throttle.hit('comment', client_ip(request), limit=5, window=60)
+    if wait:
+        ...  # over the limit; retry in ``wait`` seconds
+
+Counts live in the default cache under ``throttle:<scope>:<ident>:<window start>``
+and expire with their window. With DummyCache nothing is ever throttled. The
+file-based cache increments with a read and a write, so simultaneous hits
+from several workers can be counted once: the limit is approximate, which is
+enough to slow down a flood. A backend with atomic incr (Redis, Memcached)
+makes it exact.
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+
+def client_ip(request):
+    """
+    The client's address. Behind TRUSTED_PROXY_COUNT proxies every request
+    comes from the nearest proxy, so the address is read from
+    X-Forwarded-For, where each proxy appends the address it was reached
+    from. Entries left of the trusted ones could be made up by the client.
+    """
+    proxies = settings.TRUSTED_PROXY_COUNT
+    forwarded = [ip.strip() for ip in request.META.get('HTTP_X_FORWARDED_FOR', '').split(',') if ip.strip()]
+    if proxies and len(forwarded) >= proxies:
+        return forwarded[-proxies]
+    return request.META.get('REMOTE_ADDR', '')
+
+
+def hit(scope, ident, limit, window):
+    """Count one hit; return the seconds left in the window when over ``limit``, else 0."""
+    now = int(time.time())
+    start = now - now % window
+    key = f'throttle:{scope}:{ident}:{start}'
+    if cache.add(key, 1, window):
+        count = 1
+    else:
+        try:
+            count = cache.incr(key)
+        except ValueError:
+            # Expired between add() and incr()
+            cache.set(key, 1, window)
+            count = 1
+    return start + window - now if count > limit else 0
@@ -6,17 +6,24 @@ urlpatterns = [
     path('', views.home, name='home'),
     path('about/', views.about, name='about'),
     path('gallery/', views.gallery, name='gallery'),
+    path('gallery/images/', views.gallery_images, name='gallery_images'),
     path('videos/', views.videos, name='videos'),
     path('contact/', views.contact, name='contact'),
     path('blog/', views.blog, name='blog'),
+    path('blog/search/', views.post_search, name='post_search'),
     path('blog/<slug:slug>/', views.blog_single, name='post_detail'),
+    path('blog/<slug:slug>/comments/', views.post_comments, name='post_comments'),
+    path('blog/<slug:slug>/comment/', views.post_comment, name='post_comment'),
     path('login/', views.user_login, name='login'),
     path('logout/', views.user_logout, name='logout'),
     path('dashboard/', views.dashboard, name='dashboard'),
     path('post/new/', views.post_new, name='post_new'),
+    path('post/bulk/', views.post_bulk, name='post_bulk'),
     path('post/<slug:slug>/edit/', views.post_edit, name='post_edit'),
     path('post/<slug:slug>/delete/', views.post_delete, name='post_delete'),
     path('sitemap.xml', views.sitemap, name='sitemap'),
+    path('sitemap-<int:section>.xml', views.sitemap_section, name='sitemap_section'),
+    path('metrics', views.metrics, name='metrics'),
 ]
 
 
@@ -0,0 +1,212 @@
+"""
+Buffered Post.views counting.
+
+blog_single records a hit, keyed by slug, in a per-worker in-memory Counter
+(no queries or I/O on the request path, so it also counts page-cache hits).
+Every VIEW_COUNTER_FLUSH_HITS hits or VIEW_COUNTER_FLUSH_SECONDS seconds the
+worker spills its counts to its own spool file and then applies every pending
+spool file to the database with one UPDATE per batch of posts. Updates use F()
+expressions through queryset.update(), so concurrent workers never lose
+increments and Post.updated_at is not touched.
+
+Spool files written before views were keyed by slug hold post ids instead; a
+numeric key that is not the slug of any post is read as an id.
+
+If the database is busy (e.g. SQLite "database is locked") the spool files are
+left in place and picked up by the next flush or by ``manage.py flush_views``.
+"""
+import atexit
+import os
+import threading
+import time
+import uuid
+from collections import Counter
+from functools import wraps
+from pathlib import Path
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import DatabaseError, transaction
+from django.db.models import Case, F, IntegerField, Value, When
+
+from . import authorstats
+from .models import Post
+
+SPOOL_SUFFIX = '.views'
+CLAIM_SUFFIX = '.claimed'
+UPDATE_BATCH_SIZE = 500
+
+
+def spool_dir():
+    return Path(getattr(settings, 'VIEW_COUNTER_SPOOL_DIR', settings.BASE_DIR / 'var' / 'views'))
+
+
+def apply_counts(counts):
+    """
+    Add ``{slug: hits}`` to Post.views, one UPDATE per batch of posts, and
+    to their authors' AuthorStats, one UPDATE per author.
+    """
+    slugs = list(counts)
+    by_author = Counter()
+    for start in range(0, len(slugs), UPDATE_BATCH_SIZE):
+        batch = slugs[start:start + UPDATE_BATCH_SIZE]
+        increment = Case(
+            *[When(slug=slug, then=Value(counts[slug])) for slug in batch],
+            default=Value(0),
+            output_field=IntegerField(),
+        )
+        Post.objects.filter(slug__in=batch).update(views=F('views') + increment)
+        for slug, author_id in Post.objects.filter(slug__in=batch).values_list('slug', 'author_id'):
+            by_author[author_id] += counts[slug]
+    authorstats.add_views(by_author)
+
+
+def _read_spool(path):
+    counts = Counter()
+    with open(path) as f:
+        for line in f:
+            slug, _, hits = line.partition(' ')
+            if slug and hits:
+                counts[slug] += int(hits)
+    return counts
+
+
+def _resolve_post_ids(counts):
+    """Re-key counts from older spool files, which were keyed by post id, by slug."""
+    numeric = [key for key in counts if key.isdigit()]
+    if not numeric:
+        return counts
+    slugs = set(Post.objects.filter(slug__in=numeric).values_list('slug', flat=True))
+    ids = {str(pk): slug for pk, slug in Post.objects.filter(
+        pk__in=[int(key) for key in numeric if key not in slugs]
+    ).values_list('pk', 'slug')}
+    resolved = Counter()
+    for key, hits in counts.items():
+        resolved[ids.get(key, key)] += hits
+    return resolved
+
+
+def drain_spool(directory=None):
+    """
+    Apply every pending spool file to the database.
+
+    Files are claimed with an atomic rename so two workers (or a worker and the
+    management command) never apply the same file twice. Returns the number of
+    hits written.
+    """
+    directory = Path(directory or spool_dir())
+    if not directory.is_dir():
+        return 0
+
+    claimed = []
+    for path in directory.glob(f'*{SPOOL_SUFFIX}'):
+        target = path.with_name(f'{path.name}.{uuid.uuid4().hex}{CLAIM_SUFFIX}')
+        try:
+            os.replace(path, target)
+        except FileNotFoundError:
+            continue  # claimed by someone else
+        claimed.append(target)
+
+    if not claimed:
+        return 0
+
+    counts = Counter()
+    for path in claimed:
+        counts.update(_read_spool(path))
+
+    try:
+        with transaction.atomic():
+            apply_counts(_resolve_post_ids(counts))
+    except DatabaseError:
+        # Hand the files back so the next flush retries them
+        for path in claimed:
+            os.replace(path, directory / f'{uuid.uuid4().hex}{SPOOL_SUFFIX}')
+        raise
+
+    for path in claimed:
+        path.unlink(missing_ok=True)
+    return sum(counts.values())
+
+
+class ViewBuffer:
+    def __init__(self, directory=None, flush_hits=None, flush_seconds=None):
+        self.directory = directory
+        self.flush_hits = flush_hits or getattr(settings, 'VIEW_COUNTER_FLUSH_HITS', 200)
+        self.flush_seconds = flush_seconds or getattr(settings, 'VIEW_COUNTER_FLUSH_SECONDS', 30)
+        self._hits = Counter()
+        self._pending = 0
+        self._last_flush = time.monotonic()
+        self._lock = threading.Lock()
+
+    def record(self, slug, flush=True):
+        """Count a hit; returns True when a flush is due (and, by default, does it)."""
+        with self._lock:
+            self._hits[slug] += 1
+            self._pending += 1
+            due = (
+                self._pending >= self.flush_hits
+                or time.monotonic() - self._last_flush >= self.flush_seconds
+            )
+        if due and flush:
+            self.flush()
+        return due
+
+    def spill(self):
+        """Move the in-memory counts to this worker's spool file."""
+        with self._lock:
+            hits, self._hits = self._hits, Counter()
+            self._pending = 0
+            self._last_flush = time.monotonic()
+        if not hits:
+            return
+        directory = Path(self.directory or spool_dir())
+        directory.mkdir(parents=True, exist_ok=True)
+        path = directory / f'{os.getpid()}-{uuid.uuid4().hex}{SPOOL_SUFFIX}'
+        with open(path, 'w') as f:
+            f.writelines(f'{slug} {n}\n' for slug, n in hits.items())
+
+    def flush(self):
+        self.spill()
+        try:
+            return drain_spool(self.directory)
+        except DatabaseError:
+            return 0
+
+
+view_buffer = ViewBuffer()
+
+
+def count_post_view(view):
+    """
+    Record a view for every successful GET of a ``slug`` detail view,
+    including a 304 to a reader revalidating their cached copy.
+    """
+    if iscoroutinefunction(view):
+        flush = sync_to_async(view_buffer.flush)
+
+        @wraps(view)
+        async def async_wrapper(request, *args, **kwargs):
+            response = await view(request, *args, **kwargs)
+            if request.method == 'GET' and response.status_code in (200, 304):
+                # The flush writes to the database, so it must leave the event loop
+                if view_buffer.record(kwargs['slug'], flush=False):
+                    await flush()
+            return response
+
+        return async_wrapper
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        response = view(request, *args, **kwargs)
+        if request.method == 'GET' and response.status_code in (200, 304):
+            view_buffer.record(kwargs['slug'])
+        return response
+
+    return wrapper
+
+
+@atexit.register
+def _spill_on_exit():
+    # Only spill on shutdown; the database may already be gone. The next
+    # worker flush or `manage.py flush_views` applies the file.
+    view_buffer.spill()
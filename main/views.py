@@ -1,69 +1,216 @@
-from django.http import HttpResponse
-from django.urls import reverse
+import hmac
+
+from django.http import Http404, HttpResponse
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.forms import AuthenticationForm
-from .models import Post
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
+from django.conf import settings
+from django.db.models import OuterRef, Q, Subquery
+from .models import Comment, Post, GalleryImage
 from .forms import PostForm, CommentForm
-from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
+from .viewcounter import count_post_view
+from .conditional import conditional_page
+from .pagecache import GALLERY, POSTS, RELATED, cache_public_page, post_tag, tag_versions
+from .pagination import CommentPaginator, KeysetPaginator
+from .metrics import collect, registry, render_prometheus
+from .related import related_posts
+from .sitemap import response as sitemap_response
+from . import authorstats, bulk, search, throttle
 from django.http import JsonResponse, HttpResponseBadRequest
 from django.template.loader import render_to_string
 
 # Create your views here.
 
+@cache_public_page(POSTS)
 def home(request):
-    post_list = Post.objects.all()[:3]
+    post_list = Post.published.for_listing()[:3]
 
     return render(request, 'index.html', {'posts': post_list})
 
 
 
+@cache_public_page()
 def about(request):
     return render(request, 'about.html')
 
 
 
-def gallery(request):
-    return render(request, 'gallery.html')
-
+def _gallery_page(request):
+    """One page of gallery images after the ``after`` cursor ("position-id")."""
+    images = GalleryImage.objects.all()
+    category = request.GET.get('category')
+    if category:
+        images = images.filter(category=category)
+    position, _, pk = request.GET.get('after', '').partition('-')
+    if position.isdigit() and pk.isdigit():
+        images = images.filter(Q(position__gt=position) | Q(position=position, id__gt=pk))
+    page_size = settings.GALLERY_PAGE_SIZE
+    images = list(images[:page_size + 1])
+    next_cursor = images[page_size - 1].cursor if len(images) > page_size else None
+    return images[:page_size], next_cursor
 
 
+@cache_public_page(GALLERY)
+def gallery(request):
+    images, next_cursor = _gallery_page(request)
+    return render(request, 'gallery.html', {
+        'images': images,
+        'next_cursor': next_cursor,
+        'categories': GalleryImage.CATEGORY_CHOICES,
+    })
+
+
+@cache_public_page(GALLERY)
+def gallery_images(request):
+    images, next_cursor = _gallery_page(request)
+    return JsonResponse({
+        'images': [
+            {
+                'id': image.pk,
+                'title': image.title,
+                'category': image.category,
+                'category_label': image.get_category_display(),
+                'width': image.width,
+                'height': image.height,
+                'placeholder': image.placeholder_color,
+                'thumbnail': image.thumbnail_url,
+                'full': image.full_url,
+            }
+            for image in images
+        ],
+        'next': next_cursor,
+    })
+
+
+
+@cache_public_page()
 def videos(request):
     return render(request, 'videos.html')
 
 
 
+@cache_public_page()
 def contact(request):
     return render(request, 'contact.html')
 
 
 
+def blog_paginator():
+    return KeysetPaginator(Post.published.for_listing(), 6)  # Show 6 posts per page
+
+
+def blog_validators(request):
+    """``id`` and ``updated_at`` of the rows on the requested page (see main/conditional.py)."""
+    rows = blog_paginator().page_values('id', 'updated_at', after=request.GET.get('after'), before=request.GET.get('before'))
+    return rows, max((updated_at for _, updated_at in rows), default=None)
+
+
+@conditional_page(blog_validators)
+@cache_public_page(POSTS)
 def blog(request):
-    post_list = Post.objects.all()
-    paginator = Paginator(post_list, 6)  # Show 6 posts per page
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    paginator = blog_paginator()
+    page_obj = paginator.page(after=request.GET.get('after'), before=request.GET.get('before'))
     return render(request, 'blog.html', {'posts': page_obj.object_list, 'page_obj': page_obj, 'paginator': paginator})
 
 
 
 
-def blog_single(request, slug):
-    post = get_object_or_404(Post, slug=slug)
-    comments = post.comments.all()
+def post_search(request):
+    query = request.GET.get('q', '').strip()
+    results = search.search_posts(query, Post.published.for_listing()) if query else []
+    return render(request, 'blog.html', {'posts': results, 'query': query, 'is_search': True})
+
+
+def detail_queryset(user=None):
+    """
+    The post with its author and previous/next posts (without their bodies) in
+    one query. Readers only get published posts; a logged-in ``user`` can also
+    preview their own drafts (those requests bypass the page cache).
+    """
+    posts = Post.published.all()
+    if user is not None and user.is_authenticated:
+        posts = Post.objects.filter(Q(status='published') | Q(author=user))
+    return posts.select_related('author', 'previous_post', 'next_post').defer(
+        'previous_post__content', 'next_post__content'
+    )
+
+
+def comment_paginator(post):
+    return CommentPaginator(post.comments.all(), settings.COMMENTS_PAGE_SIZE, count_tags=(post_tag(post.slug),))
 
-    if request.method == 'POST':
-        form = CommentForm(request.POST)
-        if form.is_valid():
-            comment = form.save(commit=False)
-            comment.post = post
-            comment.save()
-            return redirect('post_detail', slug=post.slug)
-    else:
-        form = CommentForm()
 
-    return render(request, 'single-blog.html', {'post': post, 'comments': comments, 'form': form})
+def post_validators(request, slug):
+    """
+    The post's own fields, its links and its newest comment in one query, and
+    the page cache tags its page is invalidated by (see main/conditional.py).
+    """
+    newest_comment = Comment.objects.filter(post=OuterRef('pk')).order_by('-created_on').values('created_on')[:1]
+    row = (
+        Post.published.filter(slug=slug)
+        .annotate(newest_comment=Subquery(newest_comment))
+        .values_list('updated_at', 'comment_count', 'previous_post_id', 'next_post_id', 'newest_comment')
+        .first()
+    )
+    if row is None:
+        return None
+    updated_at, *_, newest_comment = row
+    return [*row, *tag_versions([post_tag(slug), RELATED])], max(filter(None, [updated_at, newest_comment]))
+
+
+@count_post_view
+@conditional_page(post_validators)
+@cache_public_page(post_tag('{slug}'), RELATED)
+def blog_single(request, slug):
+    """A post, its first page of comments and its related posts (as of the last rebuild, see main/related.py)."""
+    post = get_object_or_404(detail_queryset(request.user), slug=slug)
+    comments = comment_paginator(post).page(after=request.GET.get('after'), before=request.GET.get('before'))
+    return render(request, 'single-blog.html', {
+        'post': post,
+        'comments': comments,
+        'related_posts': related_posts(post),
+    })
+
+
+@cache_public_page(post_tag('{slug}'))
+def post_comments(request, slug):
+    """A page of comments as an HTML fragment, for "Load more comments"."""
+    post = get_object_or_404(Post.published.only('id', 'slug'), slug=slug)
+    comments = comment_paginator(post).page(after=request.GET.get('after'), before=request.GET.get('before'))
+    html = render_to_string('partials/_comments.html', {'comments': comments}, request=request)
+    return JsonResponse({'html': html, 'next': comments.next_cursor, 'previous': comments.previous_cursor})
+
+
+# The page is served from the page cache without a CSRF token; requiring the
+# X-Requested-With header (which a cross-site form cannot send) guards it instead.
+@csrf_exempt
+@require_POST
+def post_comment(request, slug):
+    """Save a comment sent by the comment form and return just the new comment."""
+    if request.headers.get('x-requested-with') != 'XMLHttpRequest':
+        return HttpResponseBadRequest('Comments are posted with AJAX.')
+    post = get_object_or_404(Post.published.only('id', 'slug'), slug=slug)
+
+    wait = throttle.hit('comment', throttle.client_ip(request), settings.COMMENT_THROTTLE_RATE, settings.COMMENT_THROTTLE_WINDOW)
+    if wait:
+        response = JsonResponse(
+            {'success': False, 'errors': {'__all__': ['You are commenting too fast. Please try again shortly.']}},
+            status=429,
+        )
+        response['Retry-After'] = str(wait)
+        return response
+
+    form = CommentForm(request.POST)
+    if not form.is_valid():
+        return JsonResponse({'success': False, 'errors': form.errors}, status=400)
+    comment = form.save(commit=False)
+    comment.post = post
+    comment.save()
+    html = render_to_string('partials/_comments.html', {'comments': [comment]}, request=request)
+    count = Post.objects.values_list('comment_count', flat=True).get(pk=post.pk)
+    return JsonResponse({'success': True, 'html': html, 'count': count})
 
    
 
@@ -73,39 +220,45 @@ def blog_single(request, slug):
 
 
     
-@login_required
-def dashboard(request):
-    qs = Post.objects.filter(author=request.user)
+def dashboard_context(user, params):
+    """The posts table and stats for ``user``, filtered and paged by ``params``."""
+    qs = Post.objects.for_listing().filter(author=user)
 
     # Filters
-    status = request.GET.get('status')
-    category = request.GET.get('category')
+    status = params.get('status')
+    category = params.get('category')
     if status:
         qs = qs.filter(status=status)
     if category:
         qs = qs.filter(category=category)
+    query = params.get('q', '').strip()
+    if query:
+        qs = search.filter_posts(qs, query)
 
     # Pagination
-    page = request.GET.get('page', 1)
-    paginator = Paginator(qs, 10)
-    try:
-        posts = paginator.page(page)
-    except PageNotAnInteger:
-        posts = paginator.page(1)
-    except EmptyPage:
-        posts = paginator.page(paginator.num_pages)
-
-    total_posts = qs.count()
-    total_views = sum(getattr(p, 'views', 0) for p in qs)
-    total_comments = sum(p.comments.count() for p in qs)
+    paginator = KeysetPaginator(qs, 10)
+    posts = paginator.page(after=params.get('after'), before=params.get('before'))
+
+    # The header is one primary-key lookup in the materialized AuthorStats;
+    # so is the table's count unless a search or both filters narrow it
+    stats = authorstats.for_author(user)
+    matching_posts = None if query else stats.count(status=status, category=category)
 
     context = {
         'posts': posts,
-        'total_posts': total_posts,
-        'total_views': total_views,
-        'total_comments': total_comments,
+        'total_posts': stats.posts,
+        'total_views': stats.views,
+        'total_comments': stats.comments,
+        'matching_posts': qs.count() if matching_posts is None else matching_posts,
         'paginator': paginator,
+        'category_choices': Post.CATEGORY_CHOICES,
     }
+    return context
+
+
+@login_required
+def dashboard(request):
+    context = dashboard_context(request.user, request.GET)
 
     # If AJAX request for a page (used by pagination/filter UI), return HTML fragment
     if request.headers.get('x-requested-with') == 'XMLHttpRequest':
@@ -125,7 +278,7 @@ def post_new(request):
             # AJAX response with rendered row
             if request.headers.get('x-requested-with') == 'XMLHttpRequest':
                 html = render_to_string('partials/_post_row.html', {'post': post}, request=request)
-                return JsonResponse({'success': True, 'html': html})
+                return JsonResponse({'success': True, 'html': html, 'image': form.image_report})
             return redirect('dashboard')
         else:
             if request.headers.get('x-requested-with') == 'XMLHttpRequest':
@@ -143,12 +296,35 @@ def post_edit(request, slug):
             form.save()
             if request.headers.get('x-requested-with') == 'XMLHttpRequest':
                 html = render_to_string('partials/_post_row.html', {'post': post}, request=request)
-                return JsonResponse({'success': True, 'html': html})
+                return JsonResponse({'success': True, 'html': html, 'image': form.image_report})
             return redirect('dashboard')
     else:
         form = PostForm(instance=post)
     return render(request, 'post_form.html', {'form': form})
 
+@login_required
+@require_POST
+def post_bulk(request):
+    """
+    Apply a dashboard bulk action to the ticked posts (see main/bulk.py) and
+    return the refreshed table for the filters the dashboard is showing.
+    """
+    action = request.POST.get('action')
+    category = request.POST.get('category') or None
+    if action not in bulk.ACTIONS or (action == 'recategorize' and category not in dict(Post.CATEGORY_CHOICES)):
+        return JsonResponse({'success': False, 'error': 'Unknown action.'}, status=400)
+    ids = [int(pk) for pk in request.POST.getlist('ids') if pk.isdigit()]
+    count = bulk.apply(Post.objects.filter(author=request.user, pk__in=ids), action, category)
+
+    context = dashboard_context(request.user, request.POST)
+    html = render_to_string('partials/_posts_table.html', context, request=request)
+    return JsonResponse({
+        'success': True,
+        'count': count,
+        'html': html,
+        'stats': {key: context[key] for key in ('total_posts', 'total_views', 'total_comments')},
+    })
+
 @login_required
 def post_delete(request, slug):
     post = get_object_or_404(Post, slug=slug, author=request.user)
@@ -183,27 +359,20 @@ def user_logout(request):
 
 
 def sitemap(request):
-    posts = Post.objects.all().order_by('-created_at')
-    xml = '<?xml version="1.0" encoding="UTF-8"?>\n'
-    xml += '<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n'
-    # Static pages
-    static_views = [
-        ('home', None),
-        ('about', None),
-        ('gallery', None),
-        ('videos', None),
-        ('contact', None),
-        ('blog', None),
-        ('dashboard', None),
-        ('login', None),
-        ('logout', None),
-    ]
-    for name, args in static_views:
-        url = request.build_absolute_uri(reverse(name))
-        xml += f'<url><loc>{url}</loc></url>\n'
-    # Blog posts
-    for post in posts:
-        post_url = request.build_absolute_uri(reverse('post_detail', args=[post.slug]))
-        xml += f'<url><loc>{post_url}</loc><lastmod>{post.updated_at.date()}</lastmod></url>\n'
-    xml += '</urlset>'
-    return HttpResponse(xml, content_type='application/xml')
\ No newline at end of file
+    return sitemap_response(request)
+
+
+def sitemap_section(request, section):
+    return sitemap_response(request, section)
+
+
+def metrics(request):
+    """Prometheus scrape endpoint, for staff or a scraper sending ``Authorization: Bearer <METRICS_TOKEN>``."""
+    token = settings.METRICS_TOKEN
+    authorization = request.headers.get('Authorization', '')
+    # REMOTE_ADDR is no guide here: behind a proxy every request looks local
+    if not (request.user.is_staff or (token and hmac.compare_digest(authorization, f'Bearer {token}'))):
+        raise Http404
+    registry.flush()
+    body = render_prometheus(*collect())
+    return HttpResponse(body, content_type='text/plain; version=0.0.4; charset=utf-8')